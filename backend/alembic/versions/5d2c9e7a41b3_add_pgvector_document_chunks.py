@@ -0,0 +1,59 @@
+"""Add pgvector document_chunks table
+
+Revision ID: 5d2c9e7a41b3
+Revises: 12ac9c8bd490
+Create Date: 2026-10-19 09:12:44.381205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2c9e7a41b3'
+down_revision: Union[str, None] = '12ac9c8bd490'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+
+    op.create_table('document_chunks',
+    sa.Column('document_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('chunk_index', sa.Integer(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('embedding', Vector(1536), nullable=False),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_document_chunks_document_id', 'document_chunks', ['document_id'])
+    op.create_index('ix_document_chunks_user_id', 'document_chunks', ['user_id'])
+    op.create_index(
+        'ix_document_chunks_embedding_hnsw',
+        'document_chunks',
+        ['embedding'],
+        postgresql_using='hnsw',
+        postgresql_ops={'embedding': 'vector_cosine_ops'},
+    )
+
+    # Lets the planner pre-filter a user's documents by type/date before joining chunks
+    op.create_index('ix_documents_user_type_created', 'documents', ['user_id', 'ai_document_type', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_documents_user_type_created', table_name='documents')
+    op.drop_index('ix_document_chunks_embedding_hnsw', table_name='document_chunks')
+    op.drop_index('ix_document_chunks_user_id', table_name='document_chunks')
+    op.drop_index('ix_document_chunks_document_id', table_name='document_chunks')
+    op.drop_table('document_chunks')
+    # The vector extension is left installed; other objects may depend on it
@@ -0,0 +1,45 @@
+"""Add full-text and trigram keyword search indexes
+
+Revision ID: 8f3b1c6d2e90
+Revises: 5d2c9e7a41b3
+Create Date: 2026-10-19 11:02:17.502913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3b1c6d2e90'
+down_revision: Union[str, None] = '5d2c9e7a41b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # File name weighted above body text; STORED so it is maintained on every insert/update
+    op.execute("""
+        ALTER TABLE documents ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(file_name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(extracted_text, '')), 'B')
+        ) STORED
+    """)
+    op.create_index('ix_documents_search_vector', 'documents', ['search_vector'], postgresql_using='gin')
+    op.create_index(
+        'ix_documents_file_name_trgm',
+        'documents',
+        ['file_name'],
+        postgresql_using='gin',
+        postgresql_ops={'file_name': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_documents_file_name_trgm', table_name='documents')
+    op.drop_index('ix_documents_search_vector', table_name='documents')
+    op.drop_column('documents', 'search_vector')
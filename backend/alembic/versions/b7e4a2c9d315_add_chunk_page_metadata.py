@@ -0,0 +1,31 @@
+"""Add page range and token count to document_chunks
+
+Revision ID: b7e4a2c9d315
+Revises: 8f3b1c6d2e90
+Create Date: 2026-10-19 14:20:41.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e4a2c9d315'
+down_revision: Union[str, None] = '8f3b1c6d2e90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Nullable: existing rows were chunked without page awareness and are filled in on re-ingestion
+    op.add_column('document_chunks', sa.Column('page_start', sa.Integer(), nullable=True))
+    op.add_column('document_chunks', sa.Column('page_end', sa.Integer(), nullable=True))
+    op.add_column('document_chunks', sa.Column('token_count', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('document_chunks', 'token_count')
+    op.drop_column('document_chunks', 'page_end')
+    op.drop_column('document_chunks', 'page_start')
@@ -0,0 +1,32 @@
+"""Add keyset pagination indexes on documents
+
+Revision ID: c4a9e2f7b610
+Revises: b7e4a2c9d315
+Create Date: 2026-10-19 16:05:52.331870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a9e2f7b610'
+down_revision: Union[str, None] = 'b7e4a2c9d315'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # id as the last column lets (created_at, id) < (:created_at, :id) seek straight to the next page
+    op.create_index('ix_documents_user_created_id', 'documents', ['user_id', 'created_at', 'id'])
+    # Supersedes ix_documents_user_type_created, which it covers as a prefix
+    op.create_index('ix_documents_user_type_created_id', 'documents', ['user_id', 'ai_document_type', 'created_at', 'id'])
+    op.drop_index('ix_documents_user_type_created', table_name='documents')
+
+
+def downgrade() -> None:
+    op.create_index('ix_documents_user_type_created', 'documents', ['user_id', 'ai_document_type', 'created_at'])
+    op.drop_index('ix_documents_user_type_created_id', table_name='documents')
+    op.drop_index('ix_documents_user_created_id', table_name='documents')
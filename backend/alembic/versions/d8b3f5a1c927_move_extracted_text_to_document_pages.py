@@ -0,0 +1,151 @@
+"""Move extracted text into compressed document_pages
+
+Revision ID: d8b3f5a1c927
+Revises: c4a9e2f7b610
+Create Date: 2026-10-19 17:31:08.904215
+
+"""
+from typing import Sequence, Union
+import re
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8b3f5a1c927'
+down_revision: Union[str, None] = 'c4a9e2f7b610'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same marker the extractor wrote inline (app/services/chunking.py); copied so the migration doesn't import app code
+PAGE_MARKER = re.compile(r"^--- Page (\d+) ---[ \t]*$", re.MULTILINE)
+BACKFILL_BATCH = 200
+
+
+def split_pages(text):
+    """(page_number, text) pairs as app.services.document_text.pages_from_text produces them"""
+    markers = list(PAGE_MARKER.finditer(text))
+    if not markers:
+        return [(None, text)]
+    segments = []
+    if text[:markers[0].start()].strip():
+        segments.append((None, text[:markers[0].start()]))
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        segments.append((int(marker.group(1)), text[marker.end():end]))
+
+    pages = []
+    for i, (page_number, segment) in enumerate(segments):
+        if page_number is not None and segment.startswith("\n"):
+            segment = segment[1:]
+        if i + 1 < len(segments) and segment.endswith("\n\n"):
+            segment = segment[:-2]
+        pages.append((page_number, segment))
+    return pages
+
+
+def upgrade() -> None:
+    op.create_table('document_pages',
+    sa.Column('document_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('page_number', sa.Integer(), nullable=True),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('char_count', sa.Integer(), nullable=False),
+    sa.Column('extraction_method', sa.String(length=50), nullable=True),
+    sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed("to_tsvector('english', text)", persisted=True), nullable=True),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Compress page text with lz4, and try compressing any row over 512 bytes rather than the default ~2 kB
+    op.execute("ALTER TABLE document_pages ALTER COLUMN text SET COMPRESSION lz4")
+    op.execute("ALTER TABLE document_pages SET (toast_tuple_target = 512)")
+
+    # Backfill from documents.extracted_text in keyset batches so large tables don't load into memory at once
+    bind = op.get_bind()
+    pages_table = sa.table(
+        'document_pages',
+        sa.column('id', sa.UUID()), sa.column('document_id', sa.UUID()), sa.column('user_id', sa.UUID()),
+        sa.column('position', sa.Integer()), sa.column('page_number', sa.Integer()),
+        sa.column('text', sa.Text()), sa.column('char_count', sa.Integer()),
+        sa.column('created_at', sa.DateTime()), sa.column('updated_at', sa.DateTime()), sa.column('is_active', sa.Boolean()),
+    )
+    last_id = None
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT id, user_id, created_at, extracted_text FROM documents "
+            "WHERE extracted_text IS NOT NULL AND user_id IS NOT NULL"
+            + (" AND id > :last_id" if last_id else "") +
+            " ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BACKFILL_BATCH}).all()
+        if not rows:
+            break
+        values = []
+        for row in rows:
+            for position, (page_number, text) in enumerate(split_pages(row.extracted_text)):
+                values.append({
+                    "id": uuid.uuid4(), "document_id": row.id, "user_id": row.user_id,
+                    "position": position, "page_number": page_number,
+                    "text": text, "char_count": len(text),
+                    "created_at": row.created_at, "updated_at": row.created_at, "is_active": True,
+                })
+        if values:
+            op.bulk_insert(pages_table, values)
+        last_id = rows[-1].id
+
+    op.create_index('ix_document_pages_document_position', 'document_pages', ['document_id', 'position'], unique=True)
+    op.create_index('ix_document_pages_user_id', 'document_pages', ['user_id'])
+    op.create_index('ix_document_pages_search_vector', 'document_pages', ['search_vector'], postgresql_using='gin')
+
+    # documents.search_vector depends on extracted_text: rebuild it over the file name only
+    op.drop_index('ix_documents_search_vector', table_name='documents')
+    op.drop_column('documents', 'search_vector')
+    op.drop_column('documents', 'extracted_text')
+    op.execute("""
+        ALTER TABLE documents ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (setweight(to_tsvector('simple', coalesce(file_name, '')), 'A')) STORED
+    """)
+    op.create_index('ix_documents_search_vector', 'documents', ['search_vector'], postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.add_column('documents', sa.Column('extracted_text', sa.Text(), nullable=True))
+    op.execute("""
+        UPDATE documents d
+        SET extracted_text = p.text
+        FROM (
+            SELECT document_id,
+                   string_agg(
+                       CASE WHEN page_number IS NULL THEN text
+                            ELSE '--- Page ' || page_number || ' --- ' || E'\\n' || text END,
+                       E'\\n\\n' ORDER BY position
+                   ) AS text
+            FROM document_pages
+            GROUP BY document_id
+        ) p
+        WHERE p.document_id = d.id
+    """)
+
+    op.drop_index('ix_documents_search_vector', table_name='documents')
+    op.drop_column('documents', 'search_vector')
+    op.execute("""
+        ALTER TABLE documents ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(file_name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(extracted_text, '')), 'B')
+        ) STORED
+    """)
+    op.create_index('ix_documents_search_vector', 'documents', ['search_vector'], postgresql_using='gin')
+
+    op.drop_index('ix_document_pages_search_vector', table_name='document_pages')
+    op.drop_index('ix_document_pages_user_id', table_name='document_pages')
+    op.drop_index('ix_document_pages_document_position', table_name='document_pages')
+    op.drop_table('document_pages')
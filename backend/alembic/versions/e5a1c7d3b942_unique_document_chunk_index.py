@@ -0,0 +1,43 @@
+"""Make (document_id, chunk_index) unique in document_chunks
+
+Revision ID: e5a1c7d3b942
+Revises: d8b3f5a1c927
+Create Date: 2026-10-19 21:40:17.562914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a1c7d3b942'
+down_revision: Union[str, None] = 'd8b3f5a1c927'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Concurrent retries of the old delete-then-insert could leave duplicates; keep the newest row of each
+    op.execute("""
+        DELETE FROM document_chunks
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY document_id, chunk_index
+                    ORDER BY created_at DESC NULLS LAST, id
+                ) AS rn
+                FROM document_chunks
+            ) ranked
+            WHERE rn > 1
+        )
+    """)
+    op.create_unique_constraint('uq_document_chunks_document_chunk', 'document_chunks', ['document_id', 'chunk_index'])
+    # The constraint's index has document_id as its prefix
+    op.drop_index('ix_document_chunks_document_id', table_name='document_chunks')
+
+
+def downgrade() -> None:
+    op.create_index('ix_document_chunks_document_id', 'document_chunks', ['document_id'])
+    op.drop_constraint('uq_document_chunks_document_chunk', 'document_chunks', type_='unique')
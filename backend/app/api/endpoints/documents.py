@@ -1,21 +1,40 @@
-from fastapi import APIRouter, UploadFile, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, UploadFile, HTTPException, Depends, Query, Path as PathParam, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_, select, func
+from sqlalchemy.orm import Session, load_only
+import base64
 import datetime
+import json
 import os
+import time
+import uuid
 from pathlib import Path
-from app.models import Document, FileType, User, ProcessingJob, JobStatus
+from typing import Optional
+from urllib.parse import quote
+from app.models import Document, DocumentPage, FileType, DocumentType, User, ProcessingJob, JobStatus
 from app.database import get_db
 from app.core.config import settings
+from app.core.metrics import SEARCH_SECONDS, corpus_bucket
+from app.core.tracing import tracer
 from app.utils.jwt import get_current_user
 from app.models import User
 from app.tasks.document_processing import process_document
+from app.tasks.vector_maintenance import reconcile_vector_stores
 from app.services.llm_service import llm_service
+from app.services.answer_cache import answer_cache
+from app.services.search_cache import search_result_cache
+from app.services.storage import storage
+from app.services.previews import get_preview, preview_key, delete_previews
+from app.services.keyword_search import keyword_search
+from app.services.workflow_engine import SearchMode, WorkflowEngineFactory, run_in_engine_pool
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 MAX_FILE_SIZE = 10 * 1024 * 1024 # 10MB
+MAX_PAGES_PER_REQUEST = 50
 
 @router.post("/upload")
 async def upload_document(
@@ -27,107 +46,187 @@ async def upload_document(
         raise HTTPException(status_code=400, detail="File size exceeds the maximum allowed size of 10MB")
     
 
-    upload_dir = Path(settings.UPLOAD_DIR)
-    upload_dir.mkdir(exist_ok=True)
+    # Root of the document's trace; process_document continues it from the Celery task headers
+    with tracer.start_as_current_span("upload_document", attributes={
+        "document.file_name": file.filename,
+        "document.bytes": file.size or 0,
+        "user.id": str(current_user.id),
+    }) as span:
+        timestamp = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        # Keys keep the original name last so the extension survives; workers rely on it for temp files
+        storage_key = f"{current_user.id}/{timestamp}_{uuid.uuid4().hex[:8]}_{Path(file.filename).name}"
+        stored = False
 
-    timestamp = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    unique_filename = f"{file.filename}_{timestamp}"
-    file_path = upload_dir / unique_filename
-
-    # try to save file to disk
-    try:
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # stream the upload to storage without reading it into memory
+        try:
+            with tracer.start_as_current_span("storage.save", attributes={"storage.backend": storage.name, "document.bytes": file.size or 0}):
+                await run_in_threadpool(storage.save, storage_key, file.file)
+            stored = True
         
-        file_type = FileType.NOT_SPECIFIED
-        if (file.content_type == "application/pdf"):
-            file_type = FileType.PDF
-        elif file.content_type == "image/png":
-            file_type = FileType.PNG
-        elif file.content_type == "image/jpeg":
-            file_type = FileType.JPG
-        elif file.content_type == "text/plain":
-            file_type = FileType.TXT
-        else:
-            if file.filename.lower().endswith('.pdf'):
+            file_type = FileType.NOT_SPECIFIED
+            if (file.content_type == "application/pdf"):
                 file_type = FileType.PDF
-            elif file.filename.lower().endswith('.png'):
+            elif file.content_type == "image/png":
                 file_type = FileType.PNG
-            elif file.filename.lower().endswith('.jpg') or file.filename.lower().endswith('.jpeg'):
+            elif file.content_type == "image/jpeg":
                 file_type = FileType.JPG
-            elif file.filename.lower().endswith('.txt'):
+            elif file.content_type == "text/plain":
                 file_type = FileType.TXT
             else:
-                file_type = FileType.NOT_SPECIFIED
+                if file.filename.lower().endswith('.pdf'):
+                    file_type = FileType.PDF
+                elif file.filename.lower().endswith('.png'):
+                    file_type = FileType.PNG
+                elif file.filename.lower().endswith('.jpg') or file.filename.lower().endswith('.jpeg'):
+                    file_type = FileType.JPG
+                elif file.filename.lower().endswith('.txt'):
+                    file_type = FileType.TXT
+                else:
+                    file_type = FileType.NOT_SPECIFIED
         
 
 
-        new_doc = Document(
-            user_id=current_user.id,
-            file_name=file.filename,
-            file_size=file.size,
-            file_path=str(file_path),
-            file_type=file_type
-        )
+            new_doc = Document(
+                user_id=current_user.id,
+                file_name=file.filename,
+                file_size=file.size,
+                file_path=storage_key,
+                file_type=file_type
+            )
 
-        db.add(new_doc)
-        db.commit()
-        db.refresh(new_doc)
+            db.add(new_doc)
+            db.commit()
+            db.refresh(new_doc)
+            span.set_attribute("document.id", str(new_doc.id))
+            span.set_attribute("document.file_type", file_type.value)
 
-        # create processing job
-        processing_job = ProcessingJob(
-            user_id=current_user.id,
-            document_id=new_doc.id,
-            job_status=JobStatus.PENDING
-        )
-        db.add(processing_job)
-        db.commit()
-        db.refresh(processing_job)
+            # create processing job
+            processing_job = ProcessingJob(
+                user_id=current_user.id,
+                document_id=new_doc.id,
+                job_status=JobStatus.PENDING
+            )
+            db.add(processing_job)
+            db.commit()
+            db.refresh(processing_job)
 
-        # trigger background processing
-        task = process_document.delay(str(new_doc.id), str(current_user.id))
+            # trigger background processing
+            task = process_document.delay(str(new_doc.id), str(current_user.id))
 
-        return {
-            "message": "Document uploaded successfully",
-            "document_id": str(new_doc.id),
-            "processing_job_id": str(processing_job.id),
-            "task_id": str(task.id),
-            "file_path": str(file_path),
-            "status": "processing_started",
-            "file_name": file.filename,
-            "file_size": file.size,
-            "file_type": file_type,
-            "user_id": str(current_user.id),
-            "username": current_user.username,
-            "created_at": new_doc.created_at,
-        }
+            return {
+                "message": "Document uploaded successfully",
+                "document_id": str(new_doc.id),
+                "processing_job_id": str(processing_job.id),
+                "task_id": str(task.id),
+                "file_path": storage_key,
+                "status": "processing_started",
+                "file_name": file.filename,
+                "file_size": file.size,
+                "file_type": file_type,
+                "user_id": str(current_user.id),
+                "username": current_user.username,
+                "created_at": new_doc.created_at,
+            }
     
-    except Exception as e:
-        if file_path.exists():
-            file_path.unlink()
-        raise HTTPException(status_code=500, detail=f"Failed to upload document: {str(e)}")
+        except Exception as e:
+            if stored:
+                try:
+                    storage.delete(storage_key)
+                except Exception as cleanup_error:
+                    logger.warning(f"⚠️ Failed to remove {storage_key} after a failed upload: {str(cleanup_error)}")
+            raise HTTPException(status_code=500, detail=f"Failed to upload document: {str(e)}")
+
+# Fields /list can return, mapped to the columns each one needs; extracted_text is never loaded here
+LIST_FIELDS = {
+    "id": Document.id,
+    "file_name": Document.file_name,
+    "file_size": Document.file_size,
+    "file_type": Document.file_type,
+    "created_at": Document.created_at,
+    "ai_document_type": Document.ai_document_type,
+    "ai_confidence": Document.ai_confidence,
+    "ai_key_information": Document.ai_key_information,
+    "ai_analysis_method": Document.ai_analysis_method,
+    "ai_model_used": Document.ai_model_used,
+}
+
+def _encode_cursor(created_at: datetime.datetime, document_id) -> str:
+    raw = json.dumps([created_at.isoformat(), str(document_id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, document_id = json.loads(raw)
+        return datetime.datetime.fromisoformat(created_at), uuid.UUID(document_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @router.get("/list")
 async def list_documents(
+    request: Request,
+    response: Response,
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor value from the previous page"),
+    fields: Optional[str] = Query(default=None, description=f"Comma-separated subset of: {', '.join(LIST_FIELDS)}"),
+    document_type: Optional[str] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    documents = db.query(Document).filter(Document.user_id == current_user.id).all()
+    """
+    Newest first, keyset-paginated on (created_at, id). The body stays a plain
+    array; the next page's cursor is in X-Next-Cursor and a Link rel="next" header.
+    """
+    selected = list(LIST_FIELDS) if not fields else [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in LIST_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {unknown}. Available: {list(LIST_FIELDS)}")
+    if document_type and document_type.lower() not in [t.value for t in DocumentType]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid document type. Available: {[t.value for t in DocumentType]}"
+        )
+
+    # id and created_at are always loaded: they form the cursor
+    columns = {Document.id, Document.created_at} | {LIST_FIELDS[f] for f in selected}
+    query = (
+        db.query(Document)
+        .options(load_only(*columns, raiseload=True))
+        .filter(Document.user_id == current_user.id)
+    )
+    if document_type:
+        query = query.filter(Document.ai_document_type == DocumentType(document_type.lower()))
+    if created_after:
+        query = query.filter(Document.created_at >= created_after)
+    if created_before:
+        query = query.filter(Document.created_at < created_before)
+    if cursor:
+        cursor_created_at, cursor_id = _decode_cursor(cursor)
+        query = query.filter(tuple_(Document.created_at, Document.id) < tuple_(cursor_created_at, cursor_id))
+
+    # Served by ix_documents_user_created_id / ix_documents_user_type_created_id; one extra row tells us if there is a next page
+    documents = query.order_by(Document.created_at.desc(), Document.id.desc()).limit(limit + 1).all()
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+
+    if has_more:
+        next_cursor = _encode_cursor(documents[-1].created_at, documents[-1].id)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+
     document_list = []
     for doc in documents:
-        document_list.append({
-            "id": str(doc.id),
-            "file_name": doc.file_name,
-            "file_size": doc.file_size,
-            "file_type": doc.file_type,
-            "created_at": doc.created_at,
-            "ai_document_type": doc.ai_document_type.value if doc.ai_document_type else None,
-            "ai_confidence": doc.ai_confidence,
-            "ai_key_information": doc.ai_key_information,
-            "ai_analysis_method": doc.ai_analysis_method,
-            "ai_model_used": doc.ai_model_used,
-        })
+        item = {}
+        for field in selected:
+            value = getattr(doc, field)
+            if field == "id":
+                value = str(value)
+            elif field == "ai_document_type":
+                value = value.value if value else None
+            item[field] = value
+        document_list.append(item)
     return document_list
 
 @router.get("/engines/status")
@@ -188,81 +287,17 @@ async def switch_engine(
 
 @router.post("/cleanup-vectors")
 async def cleanup_orphaned_vectors(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
-    """Clean up orphaned vector entries that reference deleted documents"""
+    """Queue a reconciliation of this user's vectors against their documents"""
     try:
-        # Get all valid document IDs for this user
-        valid_doc_ids = set(
-            str(doc.id) for doc in 
-            db.query(Document).filter(Document.user_id == current_user.id).all()
-        )
-        
-        cleanup_results = []
-        
-        # Clean up each engine's vector store
-        from app.services.workflow_engine import WorkflowEngineFactory, WorkflowEngineType
-        
-        for engine_type in WorkflowEngineType:
-            try:
-                engine = WorkflowEngineFactory.get_engine(engine_type)
-                if not engine or not hasattr(engine, 'search_documents'):
-                    logger.info(f"⏭️ Skipping {engine_type.value}: engine not available or no search support")
-                    continue
-                
-                # Get all documents in vector store for this user
-                all_results = engine.search_documents(
-                    query="*",  # Match everything
-                    user_id=str(current_user.id),
-                    documents=[]
-                )
-                
-                orphaned_docs = []
-                for result in all_results:
-                    doc_id = result.get("doc_id")
-                    if doc_id and doc_id not in valid_doc_ids:
-                        orphaned_docs.append(doc_id)
-                
-                # Remove orphaned documents
-                removed_count = 0
-                if hasattr(engine, 'remove_document_from_vectorstore'):
-                    for orphaned_doc_id in set(orphaned_docs):  # Remove duplicates
-                        try:
-                            removed = engine.remove_document_from_vectorstore(
-                                doc_id=orphaned_doc_id,
-                                user_id=str(current_user.id)
-                            )
-                            if removed:
-                                removed_count += 1
-                        except Exception as e:
-                            logger.error(f"Failed to remove orphaned doc {orphaned_doc_id}: {str(e)}")
-                
-                cleanup_results.append({
-                    "engine": engine_type.value,
-                    "total_vector_docs": len(all_results),
-                    "orphaned_found": len(set(orphaned_docs)),
-                    "orphaned_removed": removed_count,
-                    "success": True
-                })
-                
-                logger.info(f"🧹 Vector cleanup for {engine_type.value}: found {len(set(orphaned_docs))} orphaned, removed {removed_count}")
-                
-            except Exception as engine_error:
-                logger.error(f"❌ Vector cleanup failed for {engine_type.value}: {str(engine_error)}")
-                cleanup_results.append({
-                    "engine": engine_type.value,
-                    "error": str(engine_error),
-                    "success": False
-                })
-        
+        task = reconcile_vector_stores.delay(str(current_user.id), compact=False)
         return {
-            "message": "Vector cleanup completed",
+            "message": "Vector cleanup queued",
             "user_id": str(current_user.id),
-            "valid_documents": len(valid_doc_ids),
-            "cleanup_results": cleanup_results
+            "task_id": str(task.id),
+            "status_url": f"/api/v1/documents/cleanup-vectors/{task.id}"
         }
-        
     except Exception as e:
         logger.error(f"Vector cleanup failed for user {current_user.id}: {str(e)}")
         raise HTTPException(
@@ -270,9 +305,28 @@ async def cleanup_orphaned_vectors(
             detail=f"Vector cleanup failed: {str(e)}"
         )
 
+@router.get("/cleanup-vectors/{task_id}")
+async def get_cleanup_status(
+    task_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Progress (per engine) and final counts / reclaimed bytes of a cleanup task"""
+    result = reconcile_vector_stores.AsyncResult(task_id)
+    info = result.info if isinstance(result.info, dict) else {}
+    if info and info.get("user_id") != str(current_user.id):
+        raise HTTPException(status_code=404, detail="Cleanup task not found")
+
+    response = {"task_id": task_id, "state": result.state}
+    if result.state == "FAILURE":
+        response["error"] = str(result.info)
+    else:
+        response.update(info)
+    return response
+
 @router.get("/{document_id}")
 async def get_document(
     document_id: str,
+    include_text: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -280,13 +334,16 @@ async def get_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
+    page_count = db.scalar(select(func.count()).select_from(DocumentPage).where(DocumentPage.document_id == document.id))
     return {
         "id": str(document.id),
         "file_name": document.file_name,
         "file_size": document.file_size,
         "file_type": document.file_type,
         "created_at": document.created_at,
-        "extracted_text": document.extracted_text,
+        # Full text is assembled from every page, so it is opt-in; /pages serves it a range at a time
+        "extracted_text": document.extracted_text if include_text else None,
+        "page_count": page_count,
         "ai_document_type": document.ai_document_type.value if document.ai_document_type else None,
         "ai_confidence": document.ai_confidence,
         "ai_key_information": document.ai_key_information,
@@ -294,9 +351,111 @@ async def get_document(
         "ai_model_used": document.ai_model_used,
     }
 
+@router.get("/{document_id}/pages")
+async def get_document_pages(
+    document_id: str,
+    start: int = Query(1, ge=1),
+    end: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Extracted text for pages start..end (inclusive, 1-based) without assembling the whole document"""
+    end = end or start
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if end - start + 1 > MAX_PAGES_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGES_PER_REQUEST} pages per request")
+
+    document = db.query(Document).options(load_only(Document.id)).filter(
+        Document.id == document_id, Document.user_id == current_user.id
+    ).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    display_number = func.coalesce(DocumentPage.page_number, DocumentPage.position + 1)
+    pages = db.scalars(
+        select(DocumentPage)
+        .where(DocumentPage.document_id == document.id, display_number.between(start, end))
+        .order_by(DocumentPage.position)
+    ).all()
+    page_count = db.scalar(select(func.count()).select_from(DocumentPage).where(DocumentPage.document_id == document.id))
+
+    return {
+        "document_id": str(document.id),
+        "page_count": page_count,
+        "pages": [
+            {
+                "page_number": page.display_number,
+                "text": page.text,
+                "char_count": page.char_count,
+                "extraction_method": page.extraction_method,
+            }
+            for page in pages
+        ],
+    }
+
+@router.get("/{document_id}/pages/{page_number}/preview")
+async def get_page_preview(
+    document_id: str,
+    page_number: int = PathParam(..., ge=1),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """WebP thumbnail of one page; rendered on first request for documents processed before previews existed"""
+    document = db.query(Document).options(load_only(Document.id, Document.file_path, Document.file_type)).filter(
+        Document.id == document_id, Document.user_id == current_user.id
+    ).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    display_number = func.coalesce(DocumentPage.page_number, DocumentPage.position + 1)
+    page_exists = db.scalar(select(
+        select(DocumentPage.id).where(DocumentPage.document_id == document.id, display_number == page_number).exists()
+    ))
+    if not page_exists:
+        raise HTTPException(status_code=404, detail="Page not found")
+
+    etag = f'"{preview_key(document.id, page_number).rsplit("/", 1)[-1]}"'
+    headers = {
+        # Private: previews sit behind auth, but a page's preview never changes once rendered
+        "Cache-Control": f"private, max-age={settings.PREVIEW_CACHE_MAX_AGE_SECONDS}, immutable",
+        "ETag": etag,
+    }
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        data = await run_in_threadpool(get_preview, document, page_number)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found in storage")
+    if data is None:
+        raise HTTPException(status_code=404, detail="No preview available for this page")
+
+    return Response(content=data, media_type="image/webp", headers=headers)
+
+def _parse_range(header: str, size: int) -> Optional[tuple]:
+    """(start, end) inclusive for a single "bytes=" range; None means serve the whole file"""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None  # multipart ranges are rare for downloads; a full 200 is a valid answer
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(0, size - int(last)), size - 1  # "bytes=-N": the last N bytes
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
 @router.get("/{document_id}/download")
 async def download_document(
     document_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -304,18 +463,77 @@ async def download_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    file_path = Path(document.file_path)
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found on disk")
+    disposition = f"attachment; filename*=UTF-8''{quote(document.file_name)}"
+    accel_path = storage.relative_path(document.file_path) if settings.DOWNLOAD_ACCEL_REDIRECT else None
+    if accel_path:
+        # nginx serves the bytes (sendfile, Range included); the worker is free as soon as this returns
+        return Response(
+            media_type="application/octet-stream",
+            headers={
+                "X-Accel-Redirect": settings.DOWNLOAD_ACCEL_PREFIX + quote(accel_path),
+                "Content-Disposition": disposition,
+            },
+        )
+
+    try:
+        size = await run_in_threadpool(storage.size, document.file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found in storage")
 
-    from fastapi.responses import FileResponse
-    return FileResponse(
-        path=file_path,
-        filename=document.file_name,
-        media_type="application/octet-stream"
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": disposition,
+    }
+    byte_range = _parse_range(range_header, size) if range_header else None
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        storage.iter_range(document.file_path, start, end) if size else iter(()),
+        status_code=status_code,
+        media_type="application/octet-stream",
+        headers=headers,
     )
 
 
+def _remove_document_vectors(document_id: str, user_id: str):
+    """
+    Remove a document's vectors from the active engine and any other engine
+    already built in this process (blocking; run in the engine pool). Engines
+    that were never loaded here aren't built just for this: the vector
+    reconcile task removes any vectors of deleted documents they still hold.
+    """
+    engines = WorkflowEngineFactory.initialized_engines()
+    current = llm_service.current_engine
+    if current is not None:
+        engines[current.engine_type] = current
+
+    results = []
+    for engine_type, engine in engines.items():
+        if not hasattr(engine, 'remove_document_from_vectorstore'):
+            logger.info(f"⏭️ Skipping {engine_type.value}: no vector storage support")
+            continue
+        try:
+            removed = engine.remove_document_from_vectorstore(doc_id=document_id, user_id=user_id)
+            results.append({"engine": engine_type.value, "removed": removed})
+            logger.info(f"🗑️ Vector cleanup for {engine_type.value}: {'✅' if removed else '❌'}")
+        except Exception as vector_error:
+            logger.error(f"❌ Vector cleanup failed for {engine_type.value}: {str(vector_error)}")
+            results.append({"engine": engine_type.value, "removed": False, "error": str(vector_error)})
+    return results
+
+
+def _invalidate_user_caches(user_id: str, doc_ids):
+    """Drop cached answers citing the documents and move search results to a new corpus version (sync Redis)"""
+    answer_cache.invalidate_documents(user_id, doc_ids)
+    search_result_cache.bump_corpus_version(user_id)
+
+
 @router.delete("/{document_id}")
 async def delete_document(
     document_id: str,
@@ -328,41 +546,10 @@ async def delete_document(
 
     try:
         # 🆕 NEW: Clean up vector databases before deleting from main database
-        vector_cleanup_results = []
-        
-        # Get all available engines and clean up their vector stores
-        from app.services.llm_service import llm_service
-        from app.services.workflow_engine import WorkflowEngineFactory, WorkflowEngineType
-        
-        for engine_type in WorkflowEngineType:
-            try:
-                engine = WorkflowEngineFactory.get_engine(engine_type)
-                if engine and hasattr(engine, 'remove_document_from_vectorstore'):
-                    removed = engine.remove_document_from_vectorstore(
-                        doc_id=str(document_id),
-                        user_id=str(current_user.id)
-                    )
-                    vector_cleanup_results.append({
-                        "engine": engine_type.value,
-                        "removed": removed
-                    })
-                    logger.info(f"🗑️ Vector cleanup for {engine_type.value}: {'✅' if removed else '❌'}")
-                else:
-                    # Skip engines that aren't available or don't support vector storage
-                    if engine is None:
-                        logger.info(f"⏭️ Skipping {engine_type.value}: engine not available")
-                    else:
-                        logger.info(f"⏭️ Skipping {engine_type.value}: no vector storage support")
-                    continue
-            except Exception as vector_error:
-                logger.error(f"❌ Vector cleanup failed for {engine_type.value}: {str(vector_error)}")
-                vector_cleanup_results.append({
-                    "engine": engine_type.value,
-                    "removed": False,
-                    "error": str(vector_error)
-                })
-        
+        vector_cleanup_results = await run_in_engine_pool(_remove_document_vectors, str(document_id), str(current_user.id))
+
         # Delete from main database
+        file_key = document.file_path
         db.delete(document)
         
         # 🆕 NEW: Update user's documents processed count
@@ -371,6 +558,15 @@ async def delete_document(
             user.documents_processed = db.query(Document).filter(Document.user_id == current_user.id).count()
         
         db.commit()
+
+        # After the commit, so a concurrent search can't re-cache pre-delete results under the new version
+        await run_in_threadpool(_invalidate_user_caches, str(current_user.id), [str(document_id)])
+
+        try:
+            await run_in_threadpool(storage.delete, file_key)
+            await run_in_threadpool(delete_previews, document_id)
+        except Exception as storage_error:
+            logger.warning(f"⚠️ Document {document_id} deleted but its file was not: {str(storage_error)}")
         
         return {
             "message": "Document deleted successfully",
@@ -407,11 +603,20 @@ async def get_processing_status(
 @router.post("/search")
 async def search_documents(
     query: str,
+    response: Response,
     limit: int = Query(default=4, ge=1, le=20),
+    mode: SearchMode = Query(default=SearchMode.DENSE, description="dense, lexical (BM25) or hybrid (reciprocal rank fusion)"),
+    document_type: Optional[str] = None,
+    created_after: Optional[datetime.datetime] = None,
+    created_before: Optional[datetime.datetime] = None,
+    if_none_match: Optional[str] = Header(default=None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Search documents using semantic similarity"""
+    """
+    Search documents using semantic similarity. Results are cached per corpus
+    version and carry an ETag; If-None-Match with a current ETag returns 304.
+    """
     try:
         if not query.strip():
             raise HTTPException(
@@ -419,20 +624,76 @@ async def search_documents(
                 detail="Search query cannot be empty"
             )
         
-        # Use current engine to search documents
-        search_results = llm_service.current_engine.search_documents(
-            query=query.strip(),
-            user_id=str(current_user.id),
-            documents=[]  # Could add document filtering here
-        )
+        filters = {
+            key: value for key, value in {
+                "document_type": document_type,
+                "created_after": created_after,
+                "created_before": created_before,
+            }.items() if value is not None
+        }
+        engine = llm_service.current_engine
+        if engine is None:
+            raise HTTPException(status_code=503, detail="No AI engine available")
+        if mode not in engine.supported_search_modes:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Engine {engine.engine_type.value} does not support {mode.value} search"
+            )
+        if filters and not engine.supports_search_filters:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Engine {engine.engine_type.value} does not support search filters"
+            )
+        if document_type and document_type.lower() not in [t.value for t in DocumentType]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid document type. Available: {[t.value for t in DocumentType]}"
+            )
+        
+        user_id = str(current_user.id)
+        search_results = None
+
+        # The ETag is derived from the request and the user's corpus version, so it can be checked before searching
+        etag = None
+        version = await search_result_cache.corpus_version(user_id)
+        if version is not None:
+            etag = search_result_cache.make_etag(user_id, engine.engine_type.value, version, query, limit, mode.value, filters)
+            if if_none_match and etag in [tag.strip().strip('"') for tag in if_none_match.split(",")]:
+                return Response(status_code=304, headers={"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"})
+            search_results = await search_result_cache.get(etag)
+
+        if search_results is None:
+            # Use current engine to search documents; awaited so embedding calls don't block the event loop
+            started = time.perf_counter()
+            search_results = await engine.asearch_documents(
+                query=query.strip(),
+                user_id=user_id,
+                documents=[],  # Could add document filtering here
+                filters=filters or None,
+                mode=mode,
+                k=limit
+            )
+            SEARCH_SECONDS.labels(
+                engine.engine_type.value, mode.value, corpus_bucket(current_user.documents_processed)
+            ).observe(time.perf_counter() - started)
+            # Engines return [] on failure too, so only non-empty results are cached or validated
+            if etag and search_results:
+                await search_result_cache.put(etag, search_results)
+
+        if etag and search_results:
+            response.headers["ETag"] = f'"{etag}"'
+            response.headers["Cache-Control"] = "private, no-cache"
         
         return {
             "query": query,
+            "mode": mode.value,
             "results": search_results,
-            "engine_used": llm_service.current_engine.engine_type.value if llm_service.current_engine else "none",
+            "engine_used": engine.engine_type.value,
             "total_results": len(search_results)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Search failed for user {current_user.id}: {str(e)}")
         raise HTTPException(
@@ -440,6 +701,39 @@ async def search_documents(
             detail=f"Search failed: {str(e)}"
         )
 
+@router.post("/keyword-search")
+async def keyword_search_documents(
+    query: str,
+    limit: int = Query(default=10, ge=1, le=50),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Search documents by exact terms, identifiers and file names using Postgres full-text search"""
+    try:
+        if not query.strip():
+            raise HTTPException(
+                status_code=400,
+                detail="Search query cannot be empty"
+            )
+        
+        results = keyword_search(db, str(current_user.id), query.strip(), limit)
+        
+        return {
+            "query": query,
+            "results": results,
+            "engine_used": "postgres_fts",
+            "total_results": len(results)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Keyword search failed for user {current_user.id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Keyword search failed: {str(e)}"
+        )
+
 @router.post("/question")
 async def ask_question(
     question: str,
@@ -454,11 +748,10 @@ async def ask_question(
                 detail="Question cannot be empty"
             )
         
-        # Use current engine to answer question
-        answer_result = llm_service.current_engine.answer_question(
+        # Current engine answers unless a near-identical question was answered before (context is retrieved automatically)
+        answer_result = await llm_service.aanswer_question(
             question=question.strip(),
-            user_id=str(current_user.id),
-            context=""  # Context will be retrieved automatically
+            user_id=str(current_user.id)
         )
         
         return {
@@ -467,7 +760,8 @@ async def ask_question(
             "confidence": answer_result.get("confidence", 0.0),
             "sources": answer_result.get("sources", []),
             "method": answer_result.get("method", "unknown"),
-            "engine_used": llm_service.current_engine.engine_type.value if llm_service.current_engine else "none"
+            "engine_used": llm_service.current_engine.engine_type.value if llm_service.current_engine else "none",
+            "cached": answer_result.get("cached", False)
         }
         
     except Exception as e:
@@ -476,3 +770,49 @@ async def ask_question(
             status_code=500,
             detail=f"Question answering failed: {str(e)}"
         )
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/question/stream")
+async def ask_question_stream(
+    question: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Server-sent events variant of /question: a "sources" event as soon as
+    retrieval finishes, "token" events as the model generates, then "done"
+    with confidence and time-to-first-token.
+    """
+    if not question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    engine = llm_service.current_engine
+    if engine is None:
+        raise HTTPException(status_code=503, detail="No AI engine available")
+
+    user_id = str(current_user.id)
+    started = time.perf_counter()
+
+    async def events():
+        first_token_ms = None
+        try:
+            async for item in llm_service.astream_answer(question=question.strip(), user_id=user_id):
+                event, data = item["event"], item["data"]
+                if event == "token" and first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                if event == "done":
+                    total_ms = (time.perf_counter() - started) * 1000
+                    data = {**data, "ttft_ms": first_token_ms, "total_ms": total_ms}
+                    logger.info(f"💬 Streamed answer for user {user_id} via {engine.engine_type.value}: "
+                                f"first token {first_token_ms or 0:.0f} ms, total {total_ms:.0f} ms")
+                yield _sse(event, data)
+        except Exception as e:
+            logger.error(f"Streaming question answering failed for user {user_id}: {str(e)}")
+            yield _sse("error", {"message": f"Question answering failed: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,4 +1,6 @@
 from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from app.core.config import settings
 from datetime import datetime
 
@@ -13,3 +15,12 @@ async def health_check():
         "timestamp": datetime.now().isoformat(),
         "environment": settings.ENVIRONMENT,
     }
+
+@router.get("/ready")
+async def readiness_check():
+    """Checks the active engine's dependencies without writing anything; 503 until ready"""
+    from app.services.llm_service import llm_service
+
+    result = await run_in_threadpool(llm_service.check_readiness)
+    result["timestamp"] = datetime.now().isoformat()
+    return JSONResponse(status_code=200 if result["ready"] else 503, content=result)
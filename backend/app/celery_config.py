@@ -1,11 +1,13 @@
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown, before_task_publish, task_prerun, task_postrun
 from app.core.config import settings
+from app.core.tracing import inject_task_headers, start_task_span, end_task_span
 
 celery_app = Celery(
     "docproc",
     broker=settings.REDIS_URL,
     backend=settings.REDIS_URL,
-    include=["app.tasks.document_processing"]
+    include=["app.tasks.document_processing", "app.tasks.vector_maintenance"]
 )
 
 celery_app.conf.update(
@@ -17,4 +19,32 @@ celery_app.conf.update(
     task_track_started=True,
     task_time_limit=30*60, # 30 minutes
     task_soft_time_limit=25*60, # 25 minutes
-)
\ No newline at end of file
+)
+
+# Periodic jobs, run by `celery -A app.celery_config beat`
+celery_app.conf.beat_schedule = {
+    "reconcile-vector-stores": {
+        "task": "app.tasks.vector_maintenance.reconcile_vector_stores",
+        "schedule": settings.VECTOR_RECONCILE_INTERVAL_SECONDS,
+    },
+}
+
+# Prometheus exporter per worker (app/core/metrics.py) and tracing (app/core/tracing.py)
+@worker_init.connect
+def start_metrics_exporter(**kwargs):
+    from app.core.metrics import start_worker_exporter
+    from app.core.tracing import setup_tracing
+    start_worker_exporter(settings.CELERY_METRICS_PORT)
+    setup_tracing("docproc-worker")
+
+@worker_process_shutdown.connect
+def release_process_metrics(pid=None, **kwargs):
+    from app.core.metrics import mark_process_dead
+    from app.core.tracing import shutdown_tracing
+    mark_process_dead(pid)
+    shutdown_tracing()
+
+# Trace context travels in task headers: the API's upload span is the parent of process_document's spans
+before_task_publish.connect(inject_task_headers)
+task_prerun.connect(start_task_span)
+task_postrun.connect(end_task_span)
@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 from pathlib import Path
@@ -24,8 +25,34 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
     # File Storage
+    STORAGE_BACKEND: str = "local"  # local (UPLOAD_DIR) or s3 (any S3-compatible store, e.g. MinIO)
     UPLOAD_DIR: str = "./uploads"
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10 MB
+    STORAGE_STREAM_CHUNK_BYTES: int = 256 * 1024  # read/write unit when copying and serving files
+    STORAGE_MULTIPART_CHUNK_BYTES: int = 8 * 1024 * 1024  # S3 multipart part size (5 MB minimum)
+    S3_ENDPOINT_URL: Optional[str] = None  # e.g. http://minio:9000; None = AWS
+    S3_BUCKET: str = "docproc-uploads"
+    S3_ACCESS_KEY_ID: str = ""
+    S3_SECRET_ACCESS_KEY: str = ""
+    S3_REGION: str = "us-east-1"
+    DOWNLOAD_ACCEL_REDIRECT: bool = False  # let nginx serve local files (X-Accel-Redirect); needs its internal location
+    DOWNLOAD_ACCEL_PREFIX: str = "/protected-uploads/"  # that location, aliased to UPLOAD_DIR
+
+    # Page previews (WebP thumbnails stored next to the upload)
+    PREVIEW_MAX_WIDTH: int = 320
+    PREVIEW_QUALITY: int = 60
+    PREVIEW_DPI: int = 50  # when a page has to be rasterized just for its preview (older documents)
+    PREVIEW_CACHE_MAX_AGE_SECONDS: int = 365 * 24 * 60 * 60  # previews never change once rendered
+
+    # Metrics (Prometheus): API at /metrics, each Celery worker on CELERY_METRICS_PORT
+    CELERY_METRICS_PORT: int = 9808
+    METRICS_CELERY_QUEUES: str = "celery"  # comma-separated broker queues reported as docproc_celery_queue_depth
+
+    # Tracing (OpenTelemetry): upload -> Celery task -> extraction / classification / embedding spans
+    TRACING_EXPORTER: str = "none"  # none, file (JSON lines, offline), otlp (HTTP collector), console
+    TRACING_FILE_PATH: str = "./traces/spans.jsonl"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACING_SAMPLE_RATIO: float = 1.0  # share of new traces recorded; children follow their parent
 
     # Environment
     ENVIRONMENT: str = "development"
@@ -36,7 +63,51 @@ class Settings(BaseSettings):
     OPENAI_MAX_TOKENS: int = 1000
     OPENAI_TEMPERATURE: float = 0.1
 
-    WORKFLOW_ENGINE: str = "langchain" # Options: langchain, openai_direct, llamaindex, haystack
+    WORKFLOW_ENGINE: str = "langchain" # Options: langchain, openai_direct, pgvector, llamaindex, haystack
+    ENGINE_RETRY_SECONDS: int = 30  # wait before rebuilding an engine whose construction failed
+
+    # Chunking (shared by every engine)
+    CHUNK_SIZE_TOKENS: int = 400  # max model tokens per embedded chunk
+    CHUNK_OVERLAP_TOKENS: int = 60  # trailing paragraphs/sentences repeated at the start of the next chunk
+    CHUNK_MIN_CHARS: int = 50  # shorter chunks are dropped as noise
+    CHUNK_ENCODING_MODEL: str = "text-embedding-ada-002"  # tokenizer used to measure chunk size
+    EMBEDDING_BATCH_MAX_TEXTS: int = 256  # chunks per embeddings API call (OpenAI Direct / pgvector); ~100k tokens at CHUNK_SIZE_TOKENS
+
+    # Classification prompt
+    CLASSIFICATION_INPUT_TOKENS: int = 1500  # document tokens sent to the classifier after compression
+    CLASSIFICATION_WINDOWS: int = 8  # budget / windows = size of head, tail and keyword windows
+    CLASSIFICATION_MAX_OUTPUT_TOKENS: int = 350  # the JSON answer (type, confidence, a few fields) fits well within this
+
+    # Local classifier (first tier ahead of the LLM)
+    LOCAL_CLASSIFIER_ENABLED: bool = True
+    LOCAL_CLASSIFIER_DIR: str = "./classifier_models"  # versioned artifacts + current.json, written by train_local_classifier.py
+    LOCAL_CLASSIFIER_THRESHOLD: Optional[float] = None  # None = use the threshold recommended at training time
+
+    # Search
+    HYBRID_CANDIDATE_POOL: int = 20  # dense and BM25 candidates fused per hybrid search
+    ENGINE_THREAD_POOL_SIZE: int = 8  # threads for blocking engine work (vector math, Chroma, SQL) on the async request path
+    QUERY_EMBEDDING_CACHE_SIZE: int = 2048  # per-process LRU of query embeddings
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_TTL_SECONDS: int = 10 * 60  # Redis search results; a corpus change makes them unreachable sooner
+
+    # Answer cache (Redis, per user and engine)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY: float = 0.95  # cosine similarity between questions to reuse an answer
+    ANSWER_CACHE_MAX_ENTRIES: int = 200  # per user and engine; oldest answers are evicted first
+    ANSWER_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+
+    # LangChain
+    VECTOR_DELETE_BATCH_SIZE: int = 500  # doc_ids / chunk ids per Chroma get/delete call (SQLite variable limit)
+
+    # Vector maintenance
+    VECTOR_RECONCILE_INTERVAL_SECONDS: int = 6 * 60 * 60  # Celery beat: orphan cleanup + compaction
+    VECTOR_RECONCILE_SQL_BATCH_SIZE: int = 1000  # document ids per IN (...) lookup
+
+    # OpenAI Direct vector store
+    OPENAI_DIRECT_SHARD_CACHE_BYTES: int = 512 * 1024 * 1024  # 512 MB of per-user shards kept in memory
+
+    # pgvector engine
+    PGVECTOR_EF_SEARCH: int = 100  # HNSW candidate list size; raise it when filters are very selective
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,144 @@
+from typing import Any, Optional
+import glob
+import logging
+import os
+
+# Celery's prefork children each keep their own values; with PROMETHEUS_MULTIPROC_DIR set they write them to
+# files that the exporter aggregates. prometheus_client reads the variable once, when it is first imported, so
+# it has to come from the process environment (docker-compose sets it for the workers), not be set at runtime.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+if MULTIPROCESS:
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess, start_http_server
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+# Document processing (Celery)
+OCR_PAGE_SECONDS = Histogram("docproc_ocr_page_seconds", "Tesseract time per page", buckets=SLOW_BUCKETS)
+TEXT_EXTRACTIONS = Counter("docproc_text_extractions_total", "Documents by text extraction method", ["method", "file_type"])
+CLASSIFICATION_SECONDS = Histogram("docproc_classification_seconds", "Document classification latency", ["method"], buckets=SLOW_BUCKETS)
+EMBEDDING_SECONDS = Histogram("docproc_embedding_seconds", "Latency of one embedding API call", ["model", "kind"])
+EMBEDDING_BATCH_SIZE = Histogram(
+    "docproc_embedding_batch_size", "Texts per embedding API call", ["model", "kind"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+)
+
+# Query path (API)
+SEARCH_SECONDS = Histogram("docproc_search_seconds", "Vector search latency (cache misses)", ["engine", "mode", "corpus"])
+QA_SECONDS = Histogram("docproc_qa_seconds", "Q&A end-to-end latency", ["engine", "cached", "streamed"], buckets=SLOW_BUCKETS)
+
+# OpenAI
+OPENAI_TOKENS = Counter("docproc_openai_tokens_total", "OpenAI tokens billed", ["model", "operation", "kind"])
+OPENAI_ERRORS = Counter("docproc_openai_errors_total", "Failed OpenAI calls", ["model", "operation", "error"])
+
+def corpus_bucket(documents: Optional[int]) -> str:
+    """Bounded label for a user's corpus size (documents), so latency can be compared across sizes"""
+    if documents is None:
+        return "unknown"
+    for limit in (10, 100, 1000, 10000):
+        if documents <= limit:
+            return f"<={limit}"
+    return ">10000"
+
+def _field(usage: Any, name: str) -> Optional[int]:
+    return usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+
+def record_openai_usage(model: str, operation: str, usage: Any):
+    """Token counts from an OpenAI usage object or LangChain's token_usage dict; missing usage is ignored"""
+    if not usage:
+        return
+    for kind in ("prompt", "completion"):
+        tokens = _field(usage, f"{kind}_tokens")
+        if tokens:
+            OPENAI_TOKENS.labels(model, operation, kind).inc(tokens)
+
+def record_openai_error(model: str, operation: str, error: BaseException):
+    OPENAI_ERRORS.labels(model, operation, type(error).__name__).inc()
+
+
+class QueueDepthCollector:
+    """Messages waiting in each Celery queue; read from the Redis broker at scrape time"""
+
+    def describe(self):
+        return []  # keeps register() from calling collect(), i.e. Redis, at startup
+
+    def collect(self):
+        depth = GaugeMetricFamily("docproc_celery_queue_depth", "Messages waiting in a Celery queue", labels=["queue"])
+        try:
+            import redis
+            client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=2)
+            for queue in filter(None, (q.strip() for q in settings.METRICS_CELERY_QUEUES.split(","))):
+                depth.add_metric([queue], client.llen(queue))
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read Celery queue depth: {str(e)}")
+        yield depth
+
+
+class CacheStatsCollector:
+    """Answer cache (shared, Redis) and this process's query embedding LRU"""
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        from app.services.answer_cache import answer_cache
+        from app.services.search_cache import query_embedding_cache
+
+        answers = answer_cache.stats()
+        if "error" not in answers:
+            lookups = CounterMetricFamily("docproc_answer_cache_lookups", "Answer cache lookups", labels=["result"])
+            lookups.add_metric(["hit"], answers["hits"])
+            lookups.add_metric(["miss"], answers["misses"])
+            yield lookups
+            yield CounterMetricFamily("docproc_answer_cache_stores", "Answers stored", value=answers["stores"])
+            yield CounterMetricFamily("docproc_answer_cache_invalidated", "Answers dropped by document changes", value=answers["invalidated"])
+            yield CounterMetricFamily("docproc_answer_cache_saved_seconds", "Latency saved by cache hits", value=answers["saved_ms_total"] / 1000)
+
+        embeddings = query_embedding_cache.stats()
+        lookups = CounterMetricFamily("docproc_query_embedding_cache_lookups", "Query embedding LRU lookups", labels=["result"])
+        lookups.add_metric(["hit"], embeddings["hits"])
+        lookups.add_metric(["miss"], embeddings["misses"])
+        yield lookups
+        yield GaugeMetricFamily("docproc_query_embedding_cache_entries", "Query embeddings held", value=embeddings["entries"])
+
+
+def _collecting_registry() -> CollectorRegistry:
+    if not MULTIPROCESS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+_api_registry = None
+
+def render_api_metrics():
+    """(body, content type) for the API's /metrics: process metrics plus queue depth and cache stats"""
+    global _api_registry
+    if _api_registry is None:
+        registry = _collecting_registry()
+        registry.register(QueueDepthCollector())
+        registry.register(CacheStatsCollector())
+        _api_registry = registry
+    return generate_latest(_api_registry), CONTENT_TYPE_LATEST
+
+def start_worker_exporter(port: int):
+    """Serve the Celery worker's metrics; called once in the main worker process before the pool forks"""
+    if MULTIPROCESS:
+        # Files left by a previous run would be aggregated as if they were live
+        for stale in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+            os.remove(stale)
+    try:
+        start_http_server(port, registry=_collecting_registry())
+        logger.info(f"📈 Worker metrics on :{port}/metrics{' (multiprocess)' if MULTIPROCESS else ''}")
+    except OSError as e:
+        logger.warning(f"⚠️ Worker metrics exporter not started on :{port}: {str(e)}")
+
+def mark_process_dead(pid: int):
+    if MULTIPROCESS and pid:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,124 @@
+from typing import Dict, Optional, Sequence
+from pathlib import Path
+import logging
+import threading
+
+from opentelemetry import context, propagate, trace
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Spans are no-ops until setup_tracing() installs a provider, so instrumented code never checks whether tracing is on
+tracer = trace.get_tracer("docproc")
+
+
+def _file_exporter(path: str):
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+    class JsonLinesSpanExporter(SpanExporter):
+        """One JSON span per line, appended to a local file: needs no collector and works offline"""
+
+        def __init__(self, path: str):
+            self.path = Path(path)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._lock = threading.Lock()
+
+        def export(self, spans: Sequence) -> "SpanExportResult":
+            lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+            try:
+                with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)  # one write per batch, so processes sharing the file don't interleave lines
+                return SpanExportResult.SUCCESS
+            except OSError as e:
+                logger.warning(f"⚠️ Failed to write spans to {self.path}: {str(e)}")
+                return SpanExportResult.FAILURE
+
+        def shutdown(self):
+            pass
+
+    return JsonLinesSpanExporter(path)
+
+
+def setup_tracing(service_name: str) -> bool:
+    """
+    Install the tracer provider for this process. Celery calls it once in the
+    main worker process before the pool forks; the batch processor restarts
+    its export thread in each child.
+    """
+    exporter_name = settings.TRACING_EXPORTER.lower()
+    if exporter_name == "none":
+        return False
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if exporter_name == "file":
+        exporter = _file_exporter(settings.TRACING_FILE_PATH)
+    elif exporter_name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+    elif exporter_name == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        logger.warning(f"⚠️ Unknown TRACING_EXPORTER {settings.TRACING_EXPORTER!r}, tracing disabled")
+        return False
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name, "deployment.environment": settings.ENVIRONMENT}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    logger.info(f"🔭 Tracing {service_name} with the {exporter_name} exporter")
+    return True
+
+
+def shutdown_tracing():
+    """Flush spans still queued in the batch processor"""
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+
+# Celery: the publisher injects W3C trace context into the message headers, and the
+# worker continues the trace from them, so a task span is a child of the request that queued it
+
+class _RequestGetter:
+    """Reads propagation fields from a Celery task request; custom message headers become its attributes"""
+
+    def get(self, carrier, key: str) -> Optional[list]:
+        value = getattr(carrier, key, None)
+        if value is None and isinstance(getattr(carrier, "headers", None), dict):
+            value = carrier.headers.get(key)
+        return [value] if value is not None else None
+
+    def keys(self, carrier):
+        return []
+
+_task_spans: Dict[str, tuple] = {}
+
+def inject_task_headers(headers: Optional[dict] = None, **kwargs):
+    if headers is not None:
+        propagate.inject(headers)
+
+def start_task_span(task_id: str = None, task=None, **kwargs):
+    parent = propagate.extract(task.request, getter=_RequestGetter())
+    span = tracer.start_span(f"celery.task {task.name}", context=parent, kind=trace.SpanKind.CONSUMER)
+    span.set_attribute("celery.task_id", task_id or "")
+    token = context.attach(trace.set_span_in_context(span))
+    _task_spans[task_id] = (span, token)
+
+def end_task_span(task_id: str = None, retval=None, state: str = None, **kwargs):
+    span, token = _task_spans.pop(task_id, (None, None))
+    if span is None:
+        return
+    span.set_attribute("celery.state", state or "")
+    # Tasks here report failures in their return value rather than raising
+    if state == "FAILURE" or (isinstance(retval, dict) and "error" in retval):
+        error = retval.get("error") if isinstance(retval, dict) else str(retval)
+        span.set_status(trace.Status(trace.StatusCode.ERROR, str(error)))
+    span.end()
+    context.detach(token)
@@ -1,6 +1,8 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.metrics import render_api_metrics
+from app.core.tracing import setup_tracing, shutdown_tracing
 from app.api.endpoints import auth, documents, health
 
 app = FastAPI(
@@ -9,6 +11,12 @@ app = FastAPI(
     version="1.0.0"
 )
 
+setup_tracing("docproc-api")
+
+@app.on_event("shutdown")
+def flush_traces():
+    shutdown_tracing()
+
 # Configure CORS origins based on environment
 cors_origins = [
     "http://localhost:3000",  # Docker frontend (dev)
@@ -34,6 +42,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Link", "X-Next-Cursor"],  # search revalidation and /list pagination
 )
 
 # include routers
@@ -41,6 +50,12 @@ app.include_router(health.router, prefix="/api/v1/health", tags=["health"])
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["authentication"])
 app.include_router(documents.router, prefix="/api/v1/documents", tags=["documents"])
 
+# Prometheus scrape target; not routed through nginx, scraped from inside the backend network
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_api_metrics()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -2,5 +2,7 @@ from .base import BaseModel
 from .user import User
 from .document import Document, FileType, DocumentType
 from .processing_job import ProcessingJob, JobStatus
+from .document_chunk import DocumentChunk
+from .document_page import DocumentPage
 
-__all__ = ["BaseModel", "User", "Document", "DocumentType", "FileType", "ProcessingJob", "JobStatus"]
+__all__ = ["BaseModel", "User", "Document", "DocumentType", "FileType", "ProcessingJob", "JobStatus", "DocumentChunk", "DocumentPage"]
@@ -1,9 +1,10 @@
 from .base import BaseModel
-from sqlalchemy import Column, String, Integer, LargeBinary, ForeignKey, Text, Float
-from sqlalchemy.dialects.postgresql import UUID, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Integer, LargeBinary, ForeignKey, Text, Float, Index, Computed
+from sqlalchemy.dialects.postgresql import UUID, JSON, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy import Enum
 import enum
+from .document_page import DocumentPage, assemble_pages
 
 class FileType(enum.Enum):
     PDF = "pdf"
@@ -34,7 +35,6 @@ class Document(BaseModel):
     file_size = Column(Integer)
     file_path = Column(String(255)) # in the future will point to s3
     file_type = Column(Enum(FileType), nullable=False, default=FileType.NOT_SPECIFIED)
-    extracted_text = Column(Text, nullable=True)
     
     # AI Analysis Fields
     ai_document_type = Column(Enum(DocumentType), nullable=True)
@@ -43,9 +43,34 @@ class Document(BaseModel):
     ai_analysis_method = Column(String(50), nullable=True)  # "openai" or "mock"
     ai_model_used = Column(String(100), nullable=True)  # "gpt-4o-mini" etc.
 
+    # Keyword search on the file name; page text has its own vector on document_pages (see app/services/keyword_search.py)
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed("setweight(to_tsvector('simple', coalesce(file_name, '')), 'A')", persisted=True)
+    ))
+
     # python relationships
     user = relationship("User", back_populates="documents")
     processing_jobs = relationship("ProcessingJob", back_populates="document")
+    pages = relationship(
+        "DocumentPage", back_populates="document", order_by=DocumentPage.position,
+        cascade="all, delete-orphan", passive_deletes=True
+    )
+
+    @property
+    def extracted_text(self):
+        """Full text assembled from the page rows on access; None until the document has been processed"""
+        if not self.pages:
+            return None
+        return assemble_pages((page.page_number, page.text) for page in self.pages)
+
+    __table_args__ = (
+        # Keyset pagination on (created_at, id), with and without a type filter
+        Index("ix_documents_user_created_id", "user_id", "created_at", "id"),
+        Index("ix_documents_user_type_created_id", "user_id", "ai_document_type", "created_at", "id"),
+        Index("ix_documents_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_documents_file_name_trgm", "file_name", postgresql_using="gin", postgresql_ops={"file_name": "gin_trgm_ops"}),
+    )
 
 
     
\ No newline at end of file
@@ -0,0 +1,29 @@
+from .base import BaseModel
+from sqlalchemy import Column, Integer, ForeignKey, Text, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from pgvector.sqlalchemy import Vector
+
+EMBEDDING_DIMENSIONS = 1536  # text-embedding-ada-002
+
+class DocumentChunk(BaseModel):
+    __tablename__ = "document_chunks"
+
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    content = Column(Text, nullable=False)
+    page_start = Column(Integer, nullable=True)  # None when the text had no page markers
+    page_end = Column(Integer, nullable=True)
+    token_count = Column(Integer, nullable=True)
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS), nullable=False)
+
+    __table_args__ = (
+        # Upserts conflict on it, so concurrent attempts at the same document cannot duplicate chunks
+        UniqueConstraint("document_id", "chunk_index", name="uq_document_chunks_document_chunk"),
+        Index(
+            "ix_document_chunks_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
@@ -0,0 +1,50 @@
+from typing import Iterable, List, Optional, Tuple
+from .base import BaseModel
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, Index, Computed
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
+
+# The extractor's page header; text assembled from pages must match what it used to write inline
+PAGE_HEADER = "--- Page {} --- \n"
+PAGE_SEPARATOR = "\n\n"
+
+def assemble_pages(pages: Iterable[Tuple[Optional[int], str]]) -> str:
+    """Full document text from (page_number, text) pairs in order; None = text outside any page marker"""
+    return PAGE_SEPARATOR.join(
+        text if page_number is None else PAGE_HEADER.format(page_number) + text
+        for page_number, text in pages
+    )
+
+class DocumentPage(BaseModel):
+    """
+    One page of a document's extracted text. Kept out of the documents row so
+    listing and filtering never touch text; the text column is compressed by
+    Postgres (lz4 TOAST, see migration d8b3f5a1c927).
+    """
+    __tablename__ = "document_pages"
+
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    position = Column(Integer, nullable=False)  # 0-based order within the document
+    page_number = Column(Integer, nullable=True)  # from the page marker; None for unpaginated text (images, TXT)
+    text = Column(Text, nullable=False)
+    char_count = Column(Integer, nullable=False)
+    extraction_method = Column(String(50), nullable=True)  # ocr, pypdf2, pdfplumber, text; None for backfilled rows
+
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed("to_tsvector('english', text)", persisted=True)
+    ))
+
+    document = relationship("Document", back_populates="pages")
+
+    __table_args__ = (
+        Index("ix_document_pages_document_position", "document_id", "position", unique=True),
+        Index("ix_document_pages_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_document_pages_user_id", "user_id"),
+    )
+
+    @property
+    def display_number(self) -> int:
+        """Page number shown to clients: unpaginated text counts as page 1"""
+        return self.page_number if self.page_number is not None else self.position + 1
@@ -0,0 +1,211 @@
+from typing import Dict, Any, Iterable, List, Optional
+import hashlib
+import json
+import logging
+import time
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Redis layout, per user and engine (answers from different engines cite different chunks):
+#   answer_cache:{user}:{engine}:vectors  hash  entry_id -> float16 question embedding
+#   answer_cache:{user}:{engine}:answers  hash  entry_id -> JSON answer, sources, cited doc_ids
+#   answer_cache:{user}:{engine}:order    zset  entry_id scored by store time, for eviction
+#   answer_cache:{user}:doc:{doc_id}      set   "{engine}:{entry_id}" of entries citing the document
+#   answer_cache:stats                    hash  hits / misses / stores / invalidated / saved_ms
+STATS_KEY = "answer_cache:stats"
+
+def _prefix(user_id: str, engine: str) -> str:
+    return f"answer_cache:{user_id}:{engine}"
+
+def _doc_key(user_id: str, doc_id: str) -> str:
+    return f"answer_cache:{user_id}:doc:{doc_id}"
+
+def _entry_id(question: str) -> str:
+    return hashlib.sha1(" ".join(question.lower().split()).encode("utf-8")).hexdigest()[:16]
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    """
+    Semantic cache of Q&A answers: a new question reuses a stored answer when
+    its embedding is within ANSWER_CACHE_SIMILARITY of a previously answered
+    one. Entries are dropped when any document they cite is re-added or
+    deleted. Lives in Redis so API workers and Celery share invalidations;
+    Redis errors degrade to a cache miss.
+    """
+
+    def __init__(self):
+        self._sync_client = None
+        self._async_client = None
+
+    def _redis(self):
+        if self._sync_client is None:
+            import redis
+            self._sync_client = redis.Redis.from_url(settings.REDIS_URL)
+        return self._sync_client
+
+    def _aredis(self):
+        if self._async_client is None:
+            import redis.asyncio
+            self._async_client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+        return self._async_client
+
+    async def lookup(self, user_id: str, engine: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Cached answer for the closest unexpired previous question above the threshold, or None"""
+        if not settings.ANSWER_CACHE_ENABLED or not embedding:
+            return None
+
+        started = time.perf_counter()
+        client = self._aredis()
+        prefix = _prefix(user_id, engine)
+        try:
+            vectors = await client.hgetall(f"{prefix}:vectors")
+            candidates = []
+            if vectors:
+                entry_ids = list(vectors)
+                matrix = np.stack([np.frombuffer(vectors[i], dtype=np.float16) for i in entry_ids]).astype(np.float32)
+                similarities = matrix @ _unit(embedding)
+                # Every entry above the threshold, most similar first: the best one may have expired
+                above = np.flatnonzero(similarities >= settings.ANSWER_CACHE_SIMILARITY)
+                candidates = [(entry_ids[i], float(similarities[i])) for i in above[np.argsort(-similarities[above])]]
+
+            entry, best_similarity, expired = None, 0.0, []
+            if candidates:
+                raws = await client.hmget(f"{prefix}:answers", [entry_id for entry_id, _ in candidates])
+                for (entry_id, similarity), raw in zip(candidates, raws):
+                    candidate = json.loads(raw) if raw else None
+                    if candidate is None:
+                        continue
+                    if time.time() - candidate["stored_at"] > settings.ANSWER_CACHE_TTL_SECONDS:
+                        expired.append(entry_id)
+                        continue
+                    entry, best_similarity = candidate, similarity
+                    break
+
+            if expired:
+                pipe = client.pipeline()
+                pipe.hdel(f"{prefix}:vectors", *expired)
+                pipe.hdel(f"{prefix}:answers", *expired)
+                pipe.zrem(f"{prefix}:order", *expired)
+                await pipe.execute()
+
+            if entry is None:
+                await client.hincrby(STATS_KEY, "misses", 1)
+                return None
+
+            lookup_ms = (time.perf_counter() - started) * 1000
+            saved_ms = max(0.0, entry["latency_ms"] - lookup_ms)
+            pipe = client.pipeline()
+            pipe.hincrby(STATS_KEY, "hits", 1)
+            pipe.hincrbyfloat(STATS_KEY, "saved_ms", saved_ms)
+            await pipe.execute()
+            logger.info(f"♻️ Answer cache hit for user {user_id} (similarity {best_similarity:.3f}, saved {saved_ms:.0f} ms)")
+            return {
+                **entry["result"],
+                "cached": True,
+                "cache_similarity": best_similarity,
+                "cached_question": entry["question"],
+            }
+        except Exception as e:
+            logger.warning(f"⚠️ Answer cache lookup failed: {str(e)}")
+            return None
+
+    async def store(self, user_id: str, engine: str, question: str, embedding: List[float], result: Dict[str, Any], latency_ms: float):
+        """Remember an answer; answers without sources or from failed calls are never cached"""
+        sources = result.get("sources") or []
+        if not settings.ANSWER_CACHE_ENABLED or not embedding or not sources or result.get("method") == "error":
+            return
+
+        client = self._aredis()
+        prefix = _prefix(user_id, engine)
+        entry_id = _entry_id(question)
+        now = time.time()
+        doc_ids = sorted({source["doc_id"] for source in sources})
+        entry = {
+            "question": question,
+            "result": {key: result.get(key) for key in ("answer", "confidence", "sources", "method", "engine")},
+            "doc_ids": doc_ids,
+            "latency_ms": latency_ms,
+            "stored_at": now,
+        }
+        ttl = settings.ANSWER_CACHE_TTL_SECONDS
+        try:
+            pipe = client.pipeline()
+            pipe.hset(f"{prefix}:vectors", entry_id, _unit(embedding).astype(np.float16).tobytes())
+            pipe.hset(f"{prefix}:answers", entry_id, json.dumps(entry))
+            pipe.zadd(f"{prefix}:order", {entry_id: now})
+            for doc_id in doc_ids:
+                pipe.sadd(_doc_key(user_id, doc_id), f"{engine}:{entry_id}")
+                pipe.expire(_doc_key(user_id, doc_id), ttl)
+            for suffix in ("vectors", "answers", "order"):
+                pipe.expire(f"{prefix}:{suffix}", ttl)
+            pipe.hincrby(STATS_KEY, "stores", 1)
+            pipe.zcard(f"{prefix}:order")
+            size = (await pipe.execute())[-1]
+
+            overflow = size - settings.ANSWER_CACHE_MAX_ENTRIES
+            if overflow > 0:
+                evicted = [member for member, _ in await client.zpopmin(f"{prefix}:order", overflow)]
+                pipe = client.pipeline()
+                pipe.hdel(f"{prefix}:vectors", *evicted)
+                pipe.hdel(f"{prefix}:answers", *evicted)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Answer cache store failed: {str(e)}")
+
+    def invalidate_documents(self, user_id: str, doc_ids: Iterable[str]) -> int:
+        """Drop every cached answer citing one of these documents; called when they are re-added or deleted"""
+        if not settings.ANSWER_CACHE_ENABLED:
+            return 0
+
+        client = self._redis()
+        removed = 0
+        try:
+            for doc_id in doc_ids:
+                doc_key = _doc_key(user_id, str(doc_id))
+                members = client.smembers(doc_key)
+                pipe = client.pipeline()
+                for member in members:
+                    engine, entry_id = member.decode().split(":", 1)
+                    prefix = _prefix(user_id, engine)
+                    pipe.hdel(f"{prefix}:vectors", entry_id)
+                    pipe.hdel(f"{prefix}:answers", entry_id)
+                    pipe.zrem(f"{prefix}:order", entry_id)
+                pipe.delete(doc_key)
+                results = pipe.execute()
+                # Every third reply is the answers HDEL: 1 if the entry was still cached
+                removed += sum(results[1:-1:3])
+            if removed:
+                client.hincrby(STATS_KEY, "invalidated", removed)
+                logger.info(f"♻️ Invalidated {removed} cached answers for user {user_id}")
+        except Exception as e:
+            logger.warning(f"⚠️ Answer cache invalidation failed: {str(e)}")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            raw = {key.decode(): float(value) for key, value in self._redis().hgetall(STATS_KEY).items()}
+        except Exception as e:
+            return {"enabled": settings.ANSWER_CACHE_ENABLED, "error": str(e)}
+        hits, misses = int(raw.get("hits", 0)), int(raw.get("misses", 0))
+        return {
+            "enabled": settings.ANSWER_CACHE_ENABLED,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "stores": int(raw.get("stores", 0)),
+            "invalidated": int(raw.get("invalidated", 0)),
+            "saved_ms_total": raw.get("saved_ms", 0.0),
+            "saved_ms_per_hit": raw.get("saved_ms", 0.0) / hits if hits else 0.0,
+        }
+
+
+answer_cache = AnswerCache()
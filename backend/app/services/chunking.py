@@ -0,0 +1,148 @@
+from typing import Dict, Any, List, Optional, Tuple
+from functools import lru_cache
+import hashlib
+import re
+
+from app.core.config import settings
+
+# The extractor writes "--- Page N --- " before each page's text
+PAGE_MARKER = re.compile(r"^--- Page (\d+) ---[ \t]*$", re.MULTILINE)
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Placeholders the extractor emits instead of text; never worth an embedding
+EMPTY_PAGE_PATTERNS = ("[no extractable text]", "[error extracting text")
+FAILED_EXTRACTION_PREFIXES = (
+    "pdf processing failed",
+    "ocr failed to extract text",
+    "error processing image:",
+    "error reading text file:",
+    "unsupported file type:",
+)
+
+def make_chunk_id(doc_id: str, chunk_index: int, text: str) -> str:
+    """Deterministic chunk id: the same document text always yields the same ids, so ingestion can upsert"""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    return f"{doc_id}:{chunk_index}:{digest}"
+
+@lru_cache(maxsize=4)
+def _encoding(model: str):
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    return len(_encoding(model or settings.CHUNK_ENCODING_MODEL).encode(text))
+
+def split_pages(text: str) -> List[Tuple[Optional[int], str]]:
+    """(page number, page text) pairs; text without markers is one page numbered None"""
+    markers = list(PAGE_MARKER.finditer(text))
+    if not markers:
+        return [(None, text)]
+
+    pages = []
+    preamble = text[:markers[0].start()]
+    if preamble.strip():
+        pages.append((None, preamble))
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        pages.append((int(marker.group(1)), text[marker.end():end]))
+    return pages
+
+def _is_empty_page(page_text: str) -> bool:
+    stripped = page_text.strip().lower()
+    return not stripped or any(stripped.startswith(pattern) for pattern in EMPTY_PAGE_PATTERNS)
+
+def _units(page_text: str, max_tokens: int, encoding) -> List[Tuple[str, str, int]]:
+    """
+    Split a page into (joiner, text, tokens) units no larger than max_tokens:
+    paragraphs, then sentences of oversized paragraphs, then token windows of oversized sentences.
+    """
+    units = []
+    for paragraph in PARAGRAPH_BREAK.split(page_text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = len(encoding.encode(paragraph))
+        if tokens <= max_tokens:
+            units.append(("\n\n", paragraph, tokens))
+            continue
+
+        joiner = "\n\n"
+        for sentence in SENTENCE_END.split(paragraph):
+            sentence_tokens = encoding.encode(sentence)
+            for start in range(0, len(sentence_tokens), max_tokens):
+                window = sentence_tokens[start:start + max_tokens]
+                units.append((joiner, encoding.decode(window), len(window)))
+                joiner = " "
+    return units
+
+def chunk_document(
+    text: str,
+    chunk_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None,
+    model: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Split extracted text into chunks of at most ~chunk_tokens model tokens.
+
+    Page markers are structure, not content: they are stripped, placeholder pages
+    are skipped, and a chunk closes at a page boundary once it is at least half
+    full. Consecutive chunks share up to overlap_tokens of trailing paragraphs /
+    sentences. Each chunk is {text, chunk_index, page_start, page_end, token_count}.
+    """
+    chunk_tokens = chunk_tokens or settings.CHUNK_SIZE_TOKENS
+    overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    encoding = _encoding(model or settings.CHUNK_ENCODING_MODEL)
+
+    if not text or text.strip().lower().startswith(FAILED_EXTRACTION_PREFIXES):
+        return []
+
+    chunks: List[Dict[str, Any]] = []
+    current: List[Tuple[str, str, int, Optional[int]]] = []  # (joiner, text, tokens, page)
+    current_tokens = 0
+
+    def flush(carry_overlap: bool):
+        nonlocal current, current_tokens
+        if not current:
+            return
+        body = current[0][1] + "".join(joiner + unit for joiner, unit, _, _ in current[1:])
+        pages = [page for _, _, _, page in current if page is not None]
+        if len(body.strip()) >= settings.CHUNK_MIN_CHARS:
+            chunks.append({
+                "text": body,
+                "chunk_index": len(chunks),
+                "page_start": min(pages) if pages else None,
+                "page_end": max(pages) if pages else None,
+                "token_count": len(encoding.encode(body)),
+            })
+
+        carried, carried_tokens = [], 0
+        if carry_overlap:
+            for unit in reversed(current):
+                if carried_tokens + unit[2] > overlap_tokens:
+                    break
+                carried.insert(0, unit)
+                carried_tokens += unit[2]
+        # Overlap that is the whole previous chunk would just repeat it
+        if len(carried) == len(current):
+            carried, carried_tokens = [], 0
+        current, current_tokens = carried, carried_tokens
+
+    for page, page_text in split_pages(text):
+        if _is_empty_page(page_text):
+            continue
+        if current and current_tokens >= chunk_tokens // 2:
+            flush(carry_overlap=False)  # pages are natural boundaries; don't bleed across them
+        for joiner, unit, tokens in _units(page_text, chunk_tokens, encoding):
+            if current and current_tokens + tokens > chunk_tokens:
+                flush(carry_overlap=True)
+                while current and current_tokens + tokens > chunk_tokens:
+                    current_tokens -= current.pop(0)[2]
+            current.append((joiner, unit, tokens, page))
+            current_tokens += tokens
+    flush(carry_overlap=False)
+
+    return chunks
@@ -0,0 +1,59 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from collections import defaultdict
+
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+
+from app.models import Document, DocumentPage
+from app.models.document_page import assemble_pages, PAGE_SEPARATOR
+from app.services.chunking import split_pages
+
+Page = Tuple[Optional[int], str]
+
+def pages_from_text(text: str) -> List[Page]:
+    """
+    Inverse of assemble_pages for text written with inline page markers:
+    strips the newline after each header and the separator before the next one.
+    """
+    pages = []
+    segments = split_pages(text)
+    for i, (page_number, segment) in enumerate(segments):
+        if page_number is not None and segment.startswith("\n"):
+            segment = segment[1:]
+        if i + 1 < len(segments) and segment.endswith(PAGE_SEPARATOR):
+            segment = segment[:-len(PAGE_SEPARATOR)]
+        pages.append((page_number, segment))
+    return pages
+
+def replace_pages(db: Session, document: Document, pages: List[Page], extraction_method: Optional[str] = None):
+    """Store a document's pages, replacing any from an earlier extraction (flushes, does not commit)"""
+    # Old rows must be gone before the new ones take their (document_id, position) slots
+    db.execute(delete(DocumentPage).where(DocumentPage.document_id == document.id))
+    db.expire(document, ["pages"])
+    db.add_all(
+        DocumentPage(
+            document_id=document.id,
+            user_id=document.user_id,
+            position=position,
+            page_number=page_number,
+            text=text,
+            char_count=len(text),
+            extraction_method=extraction_method,
+        )
+        for position, (page_number, text) in enumerate(pages)
+    )
+    db.flush()
+
+def load_texts(db: Session, document_ids: Iterable, batch_size: int = 500) -> Dict[str, str]:
+    """Assembled full text for many documents in a few queries; documents without pages are omitted"""
+    document_ids = list(document_ids)
+    pages_by_document = defaultdict(list)
+    for start in range(0, len(document_ids), batch_size):
+        rows = db.execute(
+            select(DocumentPage.document_id, DocumentPage.page_number, DocumentPage.text)
+            .where(DocumentPage.document_id.in_(document_ids[start:start + batch_size]))
+            .order_by(DocumentPage.document_id, DocumentPage.position)
+        ).all()
+        for row in rows:
+            pages_by_document[str(row.document_id)].append((row.page_number, row.text))
+    return {doc_id: assemble_pages(pages) for doc_id, pages in pages_by_document.items()}
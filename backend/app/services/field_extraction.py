@@ -0,0 +1,68 @@
+from typing import Dict, Any, Optional
+import re
+
+from app.services.prompt_compression import normalize_text
+
+# Cheap, rule-based key_information for documents the local classifier labels on its own.
+# Covers the labelled, well-formatted fields (amounts, dates, numbers, payment method) the
+# LLM prompt asks for; names and free-text fields (vendor, parties, conclusions) need the LLM.
+
+# A currency marker or a cents part, so counts like "Total items: 3" are not taken for amounts
+MONEY = (
+    r"(?:[$€£]|USD|EUR|GBP)\s?\d{1,3}(?:[,.\s]?\d{3})*(?:[.,]\d{2})?"
+    r"|\d{1,3}(?:[,.\s]?\d{3})*[.,]\d{2}(?:\s?(?:USD|EUR|GBP))?"
+)
+MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+DATE = (
+    rf"\d{{4}}-\d{{2}}-\d{{2}}"
+    rf"|\d{{1,2}}[/.-]\d{{1,2}}[/.-]\d{{2,4}}"
+    rf"|{MONTHS}\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+\d{{4}}"
+    rf"|\d{{1,2}}(?:st|nd|rd|th)?\s+{MONTHS},?\s+\d{{4}}"
+)
+
+TOTAL = re.compile(rf"\b(?:grand\s+total|total\s+due|amount\s+due|balance\s+due|total)\b[^\n\d$€£]{{0,20}}({MONEY})", re.IGNORECASE)
+INVOICE_NUMBER = re.compile(r"\binvoice\s*(?:no\.?|number|num\.?|#)\s*[:.]?\s*([A-Z0-9][A-Z0-9\-_/]{2,})", re.IGNORECASE)
+DUE_DATE = re.compile(rf"\b(?:due\s+date|payment\s+due|due\s+by|due\s+on)\b\s*[:.]?\s*({DATE})", re.IGNORECASE)
+EFFECTIVE_DATE = re.compile(rf"\beffective\s+(?:date|as\s+of|from|on)\b\s*[:.]?\s*({DATE})", re.IGNORECASE)
+ANY_DATE = re.compile(rf"\b({DATE})\b", re.IGNORECASE)
+SUBJECT = re.compile(r"^\s*(?:re|subject)\s*:\s*(.{3,120})$", re.IGNORECASE | re.MULTILINE)
+PAYMENT_METHOD = re.compile(r"\b(visa|mastercard|master\s+card|amex|american\s+express|debit|credit\s+card|cash|paypal|apple\s+pay|google\s+pay)\b", re.IGNORECASE)
+
+
+def _first(pattern: re.Pattern, text: str) -> Optional[str]:
+    match = pattern.search(text)
+    return match.group(1).strip() if match else None
+
+
+def _last(pattern: re.Pattern, text: str) -> Optional[str]:
+    # Totals: the last labelled amount is the grand total, after subtotals and tax lines
+    matches = pattern.findall(text)
+    return matches[-1].strip() if matches else None
+
+
+def extract_key_information(document_type: str, text: str) -> Dict[str, Any]:
+    """Fields found by pattern for this document type; fields not found are left out"""
+    text = normalize_text(text)
+    if document_type == "invoice":
+        fields = {
+            "total_amount": _last(TOTAL, text),
+            "invoice_number": _first(INVOICE_NUMBER, text),
+            "due_date": _first(DUE_DATE, text),
+        }
+    elif document_type == "receipt":
+        payment = _first(PAYMENT_METHOD, text)
+        fields = {
+            "total_amount": _last(TOTAL, text),
+            "transaction_date": _first(ANY_DATE, text),
+            "payment_method": payment.lower() if payment else None,
+        }
+    elif document_type == "contract":
+        fields = {"effective_date": _first(EFFECTIVE_DATE, text) or _first(ANY_DATE, text)}
+    elif document_type == "letter":
+        fields = {"date": _first(ANY_DATE, text), "subject": _first(SUBJECT, text)}
+    else:
+        fields = {}
+
+    key_information = {key: value for key, value in fields.items() if value}
+    key_information["extraction_method"] = "local_rules"
+    return key_information
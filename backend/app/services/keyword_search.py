@@ -0,0 +1,81 @@
+from typing import Dict, Any, List
+import logging
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Pages match through their GIN-indexed tsvector and file names through the
+# trigram index; a document's text rank is its best page's rank. Each tsquery
+# uses the config its vector was built with: 'english' (stemmed) for pages,
+# 'simple' for documents.search_vector (file names). Headlines are
+# built only for the best page of rows that survive the LIMIT (ts_headline
+# re-parses the text, so it must not run for every match).
+KEYWORD_SEARCH_SQL = text("""
+    WITH q AS (
+        SELECT websearch_to_tsquery('english', :query) AS tsq,
+               websearch_to_tsquery('simple', :query) AS name_tsq
+    ),
+    page_hits AS (
+        SELECT DISTINCT ON (p.document_id)
+               p.document_id,
+               p.position,
+               ts_rank_cd(p.search_vector, q.tsq, 32) AS page_rank
+        FROM document_pages p, q
+        WHERE p.user_id = :user_id
+          AND p.search_vector @@ q.tsq
+        ORDER BY p.document_id, ts_rank_cd(p.search_vector, q.tsq, 32) DESC
+    ),
+    ranked AS (
+        SELECT d.id,
+               d.file_name,
+               d.file_type,
+               d.ai_document_type,
+               d.created_at,
+               coalesce(ph.page_rank, 0) + ts_rank_cd(d.search_vector, q.name_tsq, 32) AS text_rank,
+               similarity(d.file_name, :query) AS name_similarity,
+               coalesce(ph.position, 0) AS best_position
+        FROM documents d
+        CROSS JOIN q
+        LEFT JOIN page_hits ph ON ph.document_id = d.id
+        WHERE d.user_id = :user_id
+          AND (ph.document_id IS NOT NULL OR d.search_vector @@ q.name_tsq OR d.file_name % :query)
+        ORDER BY coalesce(ph.page_rank, 0) + ts_rank_cd(d.search_vector, q.name_tsq, 32) + similarity(d.file_name, :query) DESC, d.created_at DESC
+        LIMIT :limit
+    )
+    SELECT r.*,
+           coalesce(p.page_number, p.position + 1) AS page,
+           ts_headline(
+               'english',
+               coalesce(p.text, ''),
+               q.tsq,
+               'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=25, MinWords=8, FragmentDelimiter=" … "'
+           ) AS snippet
+    FROM ranked r
+    CROSS JOIN q
+    LEFT JOIN document_pages p ON p.document_id = r.id AND p.position = r.best_position
+    ORDER BY r.text_rank + r.name_similarity DESC, r.created_at DESC
+""")
+
+def keyword_search(db: Session, user_id: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Full-text + file name trigram search over a user's documents. No embedding calls."""
+    rows = db.execute(KEYWORD_SEARCH_SQL, {"query": query, "user_id": user_id, "limit": limit}).mappings().all()
+
+    results = []
+    for row in rows:
+        results.append({
+            "doc_id": str(row["id"]),
+            "file_name": row["file_name"],
+            "file_type": row["file_type"].lower() if row["file_type"] else None,
+            "ai_document_type": row["ai_document_type"].lower() if row["ai_document_type"] else None,
+            "created_at": row["created_at"],
+            "score": float(row["text_rank"]) + float(row["name_similarity"]),
+            "text_rank": float(row["text_rank"]),
+            "name_similarity": float(row["name_similarity"]),
+            "snippet": row["snippet"],
+            "page": row["page"],
+            "engine": "postgres_fts"
+        })
+
+    logger.info(f"🔎 Keyword search found {len(results)} documents for user {user_id}")
+    return results
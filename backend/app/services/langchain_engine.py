@@ -1,21 +1,23 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Set
 import json
 import logging
+import threading
+import time
+from collections import defaultdict
 from pathlib import Path
 from pydantic import BaseModel, Field
 
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser, PydanticOutputParser
-from langchain.chains import LLMChain, RetrievalQA
-from langchain_core.exceptions import OutputParserException
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
-from langchain.schema import Document
+# langchain / chromadb are imported inside the methods that need them: they take
+# seconds to import and most processes (API workers, Celery) may never use this engine.
 
 from app.core.config import settings
-from app.services.workflow_engine import WorkflowEngine, WorkflowEngineType, WorkflowEngineFactory
+from app.core.metrics import EMBEDDING_SECONDS, EMBEDDING_BATCH_SIZE, record_openai_usage, record_openai_error
+from app.core.tracing import tracer
+from app.services.workflow_engine import WorkflowEngine, WorkflowEngineType, WorkflowEngineFactory, SearchMode, run_in_engine_pool
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.services.chunking import make_chunk_id, chunk_document
+from app.services.prompt_compression import compress_for_classification
+from app.services.search_cache import query_embedding_cache, search_result_cache
 
 logger = logging.getLogger(__name__)
 
@@ -25,19 +27,47 @@ class DocumentClassification(BaseModel):
     key_information: Dict[str, Any] = Field(description="Extracted key information based on document type")
     reasoning: str = Field(description="Brief explanation of the classification decision")
 
+def _openai_metrics_handler():
+    """Callback recording token usage and errors of every chat call made through self.llm"""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class OpenAIMetricsHandler(BaseCallbackHandler):
+        def on_llm_end(self, response, **kwargs):
+            llm_output = response.llm_output or {}
+            record_openai_usage(llm_output.get("model_name") or settings.OPENAI_MODEL, "chat", llm_output.get("token_usage"))
+
+        def on_llm_error(self, error, **kwargs):
+            record_openai_error(settings.OPENAI_MODEL, "chat", error)
+
+    return OpenAIMetricsHandler()
+
 class LangChainEngine(WorkflowEngine):
+    # Stamp of an index built while Redis was unreachable: kept current by this process's own writes only
+    _LOCAL_STAMP = "local"
+
     def __init__(self):
         self.llm = None
         self.classification_chain = None
         self.embeddings = None
         self.vectorstore = None
-        self.qa_chain = None
+        self.vector_db_path = Path("./langchain_vector_db")
         self._is_available = False
-        self.initialize()
+        # Per-user BM25 indexes over Chroma chunks, built on first lexical/hybrid search
+        self._lexical_indexes: Dict[str, BM25Index] = {}
+        self._lexical_stamps: Dict[str, Any] = {}  # user's corpus version (search_cache) each index is current for, or _LOCAL_STAMP
+        self._lexical_lock = threading.Lock()
+        # "stuff" QA prompt | llm, built once; the user filter is applied at retrieval, so every user and path shares it
+        self.qa_chain = None
+        self._qa_chain_build_seconds = 0.0
+        self._qa_chain_uses = 0  # questions answered with the shared chain instead of building one
+        self._qa_chain_lock = threading.Lock()
 
     def initialize(self) -> bool:
+        """Build clients, vector store and chains. Makes no network calls and writes nothing."""
         try:
             logger.info("🚀 Starting LangChain engine initialization...")
+            from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+            from langchain_chroma import Chroma
             
             if not settings.OPENAI_API_KEY or not settings.OPENAI_API_KEY.strip().startswith('sk-'):
                 logger.error("❌ OpenAI API key is not found or invalid for LangChain")
@@ -50,7 +80,8 @@ class LangChainEngine(WorkflowEngine):
                 model=settings.OPENAI_MODEL,
                 temperature=settings.OPENAI_TEMPERATURE,
                 max_tokens=settings.OPENAI_MAX_TOKENS,
-                openai_api_key=settings.OPENAI_API_KEY.strip()
+                openai_api_key=settings.OPENAI_API_KEY.strip(),
+                callbacks=[_openai_metrics_handler()]
             )
             logger.info("✅ LLM initialized")
 
@@ -61,7 +92,7 @@ class LangChainEngine(WorkflowEngine):
             logger.info("✅ Embeddings initialized")
             
             # Setup LangChain vector store
-            vector_db_path = Path("./langchain_vector_db")
+            vector_db_path = self.vector_db_path
             vector_db_path.mkdir(exist_ok=True)
             logger.info(f"✅ Vector DB directory created: {vector_db_path.absolute()}")
             
@@ -74,11 +105,6 @@ class LangChainEngine(WorkflowEngine):
                 )
                 logger.info("✅ Chroma vector store initialized successfully")
                 
-                # Test the vector store
-                test_doc = Document(page_content="test", metadata={"test": "true"})
-                self.vectorstore.add_documents([test_doc])
-                logger.info("✅ Vector store test successful")
-                
             except Exception as vector_error:
                 logger.error(f"❌ Failed to initialize Chroma vector store: {str(vector_error)}")
                 logger.error(f"❌ Vector error type: {type(vector_error)}")
@@ -87,33 +113,14 @@ class LangChainEngine(WorkflowEngine):
                 # Don't fail the whole engine, just set vectorstore to None
                 self.vectorstore = None
             
-            # Setup Q&A chain only if vector store is available
-            if self.vectorstore:
-                try:
-                    logger.info("🔍 Setting up Q&A chain...")
-                    self.qa_chain = RetrievalQA.from_chain_type(
-                        llm=self.llm,
-                        chain_type="stuff",
-                        retriever=self.vectorstore.as_retriever(
-                            search_type="similarity",
-                            search_kwargs={"k": 4}
-                        ),
-                        return_source_documents=True
-                    )
-                    logger.info("✅ Q&A chain initialized")
-                except Exception as qa_error:
-                    logger.error(f"❌ Failed to setup Q&A chain: {str(qa_error)}")
-                    self.qa_chain = None
-            else:
-                logger.warning("⚠️ Skipping Q&A chain setup - no vector store available")
-                self.qa_chain = None
-
             self._setup_classification_chain()
             logger.info("✅ Classification chain setup")
 
-            # Test connection
-            test_result = self.llm.invoke("Test connection")
-            logger.info("✅ LLM connection test successful")
+            started = time.perf_counter()
+            from langchain.chains.question_answering.stuff_prompt import PROMPT_SELECTOR
+            self.qa_chain = PROMPT_SELECTOR.get_prompt(self.llm) | self.llm
+            self._qa_chain_build_seconds = time.perf_counter() - started
+            logger.info(f"✅ Q&A chain setup in {self._qa_chain_build_seconds * 1000:.1f} ms")
             
             self._is_available = True
             logger.info("🎉 LangChain engine initialized successfully!")
@@ -128,7 +135,31 @@ class LangChainEngine(WorkflowEngine):
             self._is_available = False
             return False
     
+    def check_readiness(self) -> Dict[str, Any]:
+        """Side-effect-free connectivity check: OpenAI model lookup and Chroma heartbeat"""
+        checks = {}
+        try:
+            from openai import OpenAI
+            OpenAI(api_key=settings.OPENAI_API_KEY.strip()).models.retrieve(settings.OPENAI_MODEL)
+            checks["openai"] = "ok"
+        except Exception as e:
+            checks["openai"] = f"error: {str(e)}"
+        try:
+            if not self.vectorstore:
+                raise RuntimeError("vector store not initialized")
+            self.vectorstore._client.heartbeat()
+            checks["chroma"] = "ok"
+        except Exception as e:
+            checks["chroma"] = f"error: {str(e)}"
+        return {
+            "ready": self._is_available and all(v == "ok" for v in checks.values()),
+            "checks": checks
+        }
+
     def _setup_classification_chain(self):
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import JsonOutputParser
+
         # Escape the JSON structure with double curly braces
         classification_prompt = ChatPromptTemplate.from_messages([
             ("system", """You are an expert document classifier. You MUST return a JSON object with exactly these fields:
@@ -158,7 +189,9 @@ Return ONLY the JSON object, no additional text."""),
         # Use JsonOutputParser instead of PydanticOutputParser for more flexibility
         parser = JsonOutputParser()
 
-        self.classification_chain = classification_prompt | self.llm | parser
+        # The JSON answer is short; a tight cap bounds latency and cost if the model rambles
+        classification_llm = self.llm.bind(max_tokens=settings.CLASSIFICATION_MAX_OUTPUT_TOKENS)
+        self.classification_chain = classification_prompt | classification_llm | parser
 
     def classify_document(self, text: str) -> Dict[str, Any]:
         if not self._is_available:
@@ -174,14 +207,12 @@ Return ONLY the JSON object, no additional text."""),
             }
         
         try:
-            # Truncate for cost control
-            max_chars = 8000
-            if len(text) > max_chars:
-                text = text[:max_chars] + "\n\n[Document truncated for analysis...]"
-                logger.info(f"Document truncated to {max_chars} characters for cost control")
+            # Token-budgeted input: normalized text, head + tail + keyword-dense windows
+            compressed = compress_for_classification(text)
+            logger.info(f"🗜️ Classification input {compressed['original_tokens']} -> {compressed['compressed_tokens']} tokens")
             
             # Use the chain
-            result = self.classification_chain.invoke({"text": text})
+            result = self.classification_chain.invoke({"text": compressed["text"]})
             
             # Validate and normalize the result
             classification_result = self._normalize_result(result)
@@ -252,36 +283,208 @@ Return ONLY the JSON object, no additional text."""),
             "reasoning": "Used fallback classification due to LangChain error"
         }
     
-    def search_documents(self, query: str, user_id: str, documents: List[str]) -> List[Dict[str, Any]]:
-        """Search documents using LangChain's vector search"""
+    def search_documents(self, query: str, user_id: str, documents: List[str], filters: Optional[Dict[str, Any]] = None, mode: SearchMode = SearchMode.DENSE, k: int = 4) -> List[Dict[str, Any]]:
+        """Search documents using LangChain's vector search, BM25, or both fused with reciprocal rank fusion"""
         if not self._is_available or not self.vectorstore:
             logger.error("LangChain vector store not available")
             return []
         
         try:
-            docs = self.vectorstore.similarity_search(
-                query, 
-                k=4,
-                filter={"user_id": user_id}
-            )
-            
-            results = []
-            for doc in docs:
-                results.append({
-                    "content": doc.page_content,
-                    "metadata": doc.metadata,
-                    "doc_id": doc.metadata.get("doc_id", "unknown"),
-                    "chunk_id": doc.metadata.get("chunk_id", "unknown"),
-                    "engine": "langchain"
-                })
+            dense_docs = None
+            if mode in (SearchMode.DENSE, SearchMode.HYBRID):
+                dense_docs = self.vectorstore.similarity_search_by_vector(
+                    self._embed_query(query),
+                    k=self._candidate_pool(mode, k),
+                    filter={"user_id": user_id}
+                )
+            return self._rank_hits(query, user_id, dense_docs, mode, k)
             
-            logger.info(f"🔍 LangChain found {len(results)} relevant documents")
-            return results
+        except Exception as e:
+            logger.error(f"❌ LangChain search failed: {str(e)}")
+            return []
+
+    async def asearch_documents(self, query: str, user_id: str, documents: List[str], filters: Optional[Dict[str, Any]] = None, mode: SearchMode = SearchMode.DENSE, k: int = 4) -> List[Dict[str, Any]]:
+        """search_documents with the query embedding awaited; Chroma and BM25 run in the engine pool"""
+        if not self._is_available or not self.vectorstore:
+            logger.error("LangChain vector store not available")
+            return []
+        
+        try:
+            dense_docs = None
+            if mode in (SearchMode.DENSE, SearchMode.HYBRID):
+                dense_docs = await self._aretrieve(query, user_id, self._candidate_pool(mode, k))
+            return await run_in_engine_pool(self._rank_hits, query, user_id, dense_docs, mode, k)
             
         except Exception as e:
             logger.error(f"❌ LangChain search failed: {str(e)}")
             return []
 
+    def _embed_query(self, query: str) -> List[float]:
+        embedding = query_embedding_cache.get(self.embeddings.model, query)
+        if embedding is None:
+            with EMBEDDING_SECONDS.labels(self.embeddings.model, "query").time():
+                embedding = self.embeddings.embed_query(query)
+            EMBEDDING_BATCH_SIZE.labels(self.embeddings.model, "query").observe(1)
+            query_embedding_cache.put(self.embeddings.model, query, embedding)
+        return embedding
+
+    async def aembed_query(self, text: str) -> Optional[List[float]]:
+        if not self._is_available:
+            return None
+        embedding = query_embedding_cache.get(self.embeddings.model, text)
+        if embedding is None:
+            with EMBEDDING_SECONDS.labels(self.embeddings.model, "query").time():
+                embedding = await self.embeddings.aembed_query(text)
+            EMBEDDING_BATCH_SIZE.labels(self.embeddings.model, "query").observe(1)
+            query_embedding_cache.put(self.embeddings.model, text, embedding)
+        return embedding
+
+    async def _aretrieve(self, query: str, user_id: str, k: int):
+        embedding = await self.aembed_query(query)
+        return await run_in_engine_pool(
+            self.vectorstore.similarity_search_by_vector, embedding, k=k, filter={"user_id": user_id}
+        )
+
+    @staticmethod
+    def _candidate_pool(mode: SearchMode, k: int) -> int:
+        # Hybrid fuses two deeper candidate lists; single-mode searches only need k
+        return max(k, settings.HYBRID_CANDIDATE_POOL) if mode == SearchMode.HYBRID else k
+
+    def _rank_hits(self, query: str, user_id: str, dense_docs, mode: SearchMode, k: int) -> List[Dict[str, Any]]:
+        """BM25 and fusion over the dense hits (if any); returns search results"""
+        pool = self._candidate_pool(mode, k)
+        rankings = []
+        hits = {}
+        
+        if dense_docs is not None:
+            ranking = []
+            for doc in dense_docs:
+                key = (doc.metadata.get("doc_id", "unknown"), doc.metadata.get("chunk_index", 0))
+                hits[key] = {"content": doc.page_content, "metadata": doc.metadata}
+                ranking.append(key)
+            rankings.append(ranking)
+        
+        if mode in (SearchMode.LEXICAL, SearchMode.HYBRID):
+            index = self._lexical_index(user_id)
+            ranking = []
+            for key, bm25 in index.search(query, pool):
+                hit = hits.setdefault(key, {
+                    "content": index.chunk_text[key],
+                    "metadata": {
+                        "doc_id": key[0],
+                        "chunk_id": make_chunk_id(key[0], key[1], index.chunk_text[key]),
+                        "chunk_index": key[1],
+                        "engine": "langchain",
+                        "user_id": user_id
+                    }
+                })
+                hit["bm25_score"] = bm25
+                ranking.append(key)
+            rankings.append(ranking)
+        
+        if mode == SearchMode.HYBRID:
+            fused = reciprocal_rank_fusion(rankings)[:k]
+            for key, rrf in fused:
+                hits[key]["rrf_score"] = rrf
+            top_keys = [key for key, _ in fused]
+        else:
+            top_keys = rankings[0][:k]
+        
+        results = []
+        for key in top_keys:
+            hit = hits[key]
+            result = {
+                "content": hit["content"],
+                "metadata": hit["metadata"],
+                "doc_id": hit["metadata"].get("doc_id", "unknown"),
+                "chunk_id": hit["metadata"].get("chunk_id", "unknown"),
+                "engine": "langchain",
+                "search_mode": mode.value
+            }
+            for score in ("bm25_score", "rrf_score"):
+                if score in hit:
+                    result[score] = hit[score]
+            results.append(result)
+        
+        logger.info(f"🔍 LangChain {mode.value} search found {len(results)} relevant documents")
+        return results
+
+    def _lexical_index(self, user_id: str) -> BM25Index:
+        """
+        The user's BM25 index. Writes in this process patch it in place (see
+        _update_lexical_index); it is rebuilt from Chroma only when the user's
+        corpus version has moved past its stamp, i.e. another process wrote.
+        Without Redis the index carries a local stamp and follows this
+        process's writes until Redis is reachable again.
+        """
+        collection = self.vectorstore._collection
+        # Read before Chroma: a write landing during the rebuild bumps the version after it, forcing another rebuild
+        version = search_result_cache.current_corpus_version(user_id)
+        stamp = version if version is not None else self._LOCAL_STAMP
+        with self._lexical_lock:
+            index = self._lexical_indexes.get(user_id)
+            if index is not None and self._lexical_stamps.get(user_id) == stamp:
+                return index
+        
+        chunks_by_doc = defaultdict(list)
+        page_size = 1000
+        offset = 0
+        while True:
+            page = collection.get(
+                where={"user_id": user_id},
+                include=["documents", "metadatas"],
+                limit=page_size,
+                offset=offset
+            )
+            for text, metadata in zip(page["documents"], page["metadatas"]):
+                chunks_by_doc[metadata.get("doc_id", "unknown")].append((metadata.get("chunk_index", 0), text))
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+        
+        index = BM25Index()
+        for doc_id, chunks in chunks_by_doc.items():
+            index.add_document(doc_id, chunks)
+        
+        with self._lexical_lock:
+            self._lexical_indexes[user_id] = index
+            self._lexical_stamps[user_id] = stamp
+        logger.info(f"📇 Built BM25 index for user {user_id} ({len(index)} chunks)")
+        return index
+
+    def _update_lexical_index(self, user_id: str, version_before: Optional[int], apply):
+        """
+        Apply a write just made to Chroma to the user's resident BM25 index
+        instead of rebuilding it. version_before is the corpus version read
+        before the write; the caller bumps it once afterwards, so an index that
+        was current then is stamped one ahead. If the version moved during the
+        write, another process wrote too and the index is dropped instead.
+        """
+        version_after = search_result_cache.current_corpus_version(user_id)
+        with self._lexical_lock:
+            index = self._lexical_indexes.get(user_id)
+            if index is None:
+                return
+            stamp = self._lexical_stamps.get(user_id)
+            if version_before is None and version_after is None and stamp == self._LOCAL_STAMP:
+                apply(index)
+            elif version_before is not None and version_after == version_before and stamp == version_before:
+                apply(index)
+                self._lexical_stamps[user_id] = version_before + 1
+            else:
+                self._lexical_indexes.pop(user_id, None)
+                self._lexical_stamps.pop(user_id, None)
+
+    def _discard_lexical_index(self, user_id: Optional[str] = None):
+        """Drop the user's BM25 index (every index when user_id is None) after a write that can't be applied in place"""
+        with self._lexical_lock:
+            if user_id is None:
+                self._lexical_indexes.clear()
+                self._lexical_stamps.clear()
+            else:
+                self._lexical_indexes.pop(user_id, None)
+                self._lexical_stamps.pop(user_id, None)
+
     def answer_question(self, question: str, user_id: str, context: str) -> Dict[str, Any]:
         """Answer questions using LangChain's RAG pipeline with user filtering"""
         if not self._is_available or not self.vectorstore:
@@ -289,35 +492,14 @@ Return ONLY the JSON object, no additional text."""),
             return {"answer": "LangChain Q&A not available", "confidence": 0.0, "sources": []}
         
         try:
-            # Create user-specific retriever
-            user_retriever = self.vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 4, "filter": {"user_id": user_id}}
-            )
-            
-            # Create temporary Q&A chain with user-filtered retriever
-            user_qa_chain = RetrievalQA.from_chain_type(
-                llm=self.llm,
-                chain_type="stuff",
-                retriever=user_retriever,
-                return_source_documents=True
-            )
-            
-            result = user_qa_chain.invoke({"query": question})
-            
-            sources = []
-            if "source_documents" in result:
-                for doc in result["source_documents"]:
-                    sources.append({
-                        "doc_id": doc.metadata.get("doc_id", "unknown"),
-                        "chunk_id": doc.metadata.get("chunk_id", "unknown"),
-                        "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
-                    })
+            source_documents = self._retrieve(question, user_id, 4)
+            sources, inputs = self._stuff_inputs(question, source_documents)
+            message = self._shared_qa_chain().invoke(inputs)
             
             confidence = min(1.0, len(sources) * 0.25) if sources else 0.3
             
             return {
-                "answer": result.get("result", "No answer found"),
+                "answer": message.content or "No answer found",
                 "confidence": confidence,
                 "sources": sources,
                 "method": "langchain_rag",
@@ -334,6 +516,104 @@ Return ONLY the JSON object, no additional text."""),
                 "engine": "langchain"
             }
     
+    def _retrieve(self, query: str, user_id: str, k: int):
+        return self.vectorstore.similarity_search_by_vector(self._embed_query(query), k=k, filter={"user_id": user_id})
+
+    def _shared_qa_chain(self):
+        """The chain built in initialize(), counting the reuse for get_engine_info"""
+        with self._qa_chain_lock:
+            self._qa_chain_uses += 1
+        return self.qa_chain
+
+    def _qa_chain_info(self) -> Dict[str, Any]:
+        with self._qa_chain_lock:
+            uses = self._qa_chain_uses
+        build_ms = self._qa_chain_build_seconds * 1000
+        return {
+            "build_ms": build_ms,
+            "reuses": uses,
+            # Each question used to build its own chain (a per-user RetrievalQA before that)
+            "estimated_build_ms_saved": uses * build_ms
+        }
+
+    def _stuff_inputs(self, question: str, source_documents):
+        """Sources for the response plus the inputs of the "stuff" QA prompt (what RetrievalQA would have sent)"""
+        sources = [{
+            "doc_id": doc.metadata.get("doc_id", "unknown"),
+            "chunk_id": doc.metadata.get("chunk_id", "unknown"),
+            "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
+        } for doc in source_documents]
+        inputs = {"context": "\n\n".join(doc.page_content for doc in source_documents), "question": question}
+        return sources, inputs
+
+    def stream_answer(self, question: str, user_id: str) -> Iterator[Dict[str, Any]]:
+        """Same retrieval and "stuff" chain as answer_question, but the LLM call is streamed"""
+        if not self._is_available or not self.vectorstore:
+            yield {"event": "error", "data": {"message": "LangChain Q&A not available"}}
+            return
+
+        source_documents = self._retrieve(question, user_id, 4)
+        sources, inputs = self._stuff_inputs(question, source_documents)
+        yield {"event": "sources", "data": {"sources": sources}}
+
+        for chunk in self._shared_qa_chain().stream(inputs):
+            if chunk.content:
+                yield {"event": "token", "data": {"text": chunk.content}}
+
+        yield {"event": "done", "data": {
+            "confidence": min(1.0, len(sources) * 0.25) if sources else 0.3,
+            "method": "langchain_rag",
+            "engine": "langchain"
+        }}
+
+    async def aanswer_question(self, question: str, user_id: str, context: str) -> Dict[str, Any]:
+        """answer_question with the embedding and completion awaited and the Chroma lookup in the engine pool"""
+        if not self._is_available or not self.vectorstore:
+            logger.error("LangChain Q&A not available")
+            return {"answer": "LangChain Q&A not available", "confidence": 0.0, "sources": []}
+        
+        try:
+            source_documents = await self._aretrieve(question, user_id, 4)
+            sources, inputs = self._stuff_inputs(question, source_documents)
+            message = await self._shared_qa_chain().ainvoke(inputs)
+            
+            return {
+                "answer": message.content or "No answer found",
+                "confidence": min(1.0, len(sources) * 0.25) if sources else 0.3,
+                "sources": sources,
+                "method": "langchain_rag",
+                "engine": "langchain"
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ LangChain Q&A failed: {str(e)}")
+            return {
+                "answer": f"Error: {str(e)}",
+                "confidence": 0.0,
+                "sources": [],
+                "method": "error",
+                "engine": "langchain"
+            }
+
+    async def astream_answer(self, question: str, user_id: str) -> AsyncIterator[Dict[str, Any]]:
+        if not self._is_available or not self.vectorstore:
+            yield {"event": "error", "data": {"message": "LangChain Q&A not available"}}
+            return
+
+        source_documents = await self._aretrieve(question, user_id, 4)
+        sources, inputs = self._stuff_inputs(question, source_documents)
+        yield {"event": "sources", "data": {"sources": sources}}
+
+        async for chunk in self._shared_qa_chain().astream(inputs):
+            if chunk.content:
+                yield {"event": "token", "data": {"text": chunk.content}}
+
+        yield {"event": "done", "data": {
+            "confidence": min(1.0, len(sources) * 0.25) if sources else 0.3,
+            "method": "langchain_rag",
+            "engine": "langchain"
+        }}
+
     def add_document_to_vectorstore(self, doc_id: str, text: str, user_id: str) -> bool:
         """Add document to LangChain vector store"""
         if not self._is_available or not self.vectorstore:
@@ -341,131 +621,192 @@ Return ONLY the JSON object, no additional text."""),
             return False
             
         try:
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
-            )
+            # Page-aware, token-sized chunks; placeholder pages and extraction errors are already dropped
+            chunks = chunk_document(text)
+            chunk_texts = [chunk["text"] for chunk in chunks]
+            
+            if not chunk_texts:
+                logger.warning(f"No indexable text found for document {doc_id}")
+                return False
             
-            chunks = text_splitter.split_text(text)
+            ids = [make_chunk_id(doc_id, i, chunk) for i, chunk in enumerate(chunk_texts)]
+            collection = self.vectorstore._collection
+            version_before = search_result_cache.current_corpus_version(user_id)
             
-            # Filter out meaningless chunks
-            meaningful_chunks = []
-            for chunk in chunks:
-                # Skip chunks that are mostly empty or contain only extraction failure messages
-                if self._is_meaningful_chunk(chunk):
-                    meaningful_chunks.append(chunk)
+            # Ids are content-derived, so any id already stored holds exactly this chunk's text and embedding
+            existing = set(collection.get(where={"$and": [{"doc_id": doc_id}, {"user_id": user_id}]}, include=[])["ids"])
+            new_ids = set(ids)
+            stale = [chunk_id for chunk_id in existing if chunk_id not in new_ids]
+            missing = [i for i, chunk_id in enumerate(ids) if chunk_id not in existing]
             
-            if not meaningful_chunks:
-                logger.warning(f"No meaningful chunks found for document {doc_id}")
-                return False
+            if not missing and not stale:
+                # Nothing to patch, but the caller still bumps the version
+                self._update_lexical_index(user_id, version_before, lambda index: None)
+                logger.info(f"⏭️ LangChain document {doc_id} unchanged ({len(ids)} chunks), skipping re-embedding")
+                return True
             
-            documents = []
-            for i, chunk in enumerate(meaningful_chunks):
-                doc_metadata = {
+            def chunk_metadata(i):
+                metadata = {
                     "doc_id": doc_id,
-                    "chunk_id": f"{doc_id}_{i}",
+                    "chunk_id": ids[i],
                     "chunk_index": i,
-                    "total_chunks": len(meaningful_chunks),
+                    "total_chunks": len(chunk_texts),
+                    "token_count": chunks[i]["token_count"],
                     "engine": "langchain",
                     "user_id": user_id
                 }
-                
-                documents.append(Document(
-                    page_content=chunk,
-                    metadata=doc_metadata
-                ))
+                # Chroma rejects None metadata values; text without page markers has no page numbers
+                if chunks[i]["page_start"] is not None:
+                    metadata["page_start"] = chunks[i]["page_start"]
+                    metadata["page_end"] = chunks[i]["page_end"]
+                return metadata
             
-            self.vectorstore.add_documents(documents)
+            if missing:
+                # Embedded here rather than inside Chroma so the embedding call is measured on its own
+                texts = [chunk_texts[i] for i in missing]
+                try:
+                    with EMBEDDING_SECONDS.labels(self.embeddings.model, "document").time(), tracer.start_as_current_span(
+                        "embedding.batch", attributes={"embedding.model": self.embeddings.model, "embedding.kind": "document", "embedding.batch_size": len(texts)}
+                    ):
+                        embeddings = self.embeddings.embed_documents(texts)
+                except Exception as e:
+                    record_openai_error(self.embeddings.model, "embedding", e)
+                    raise
+                EMBEDDING_BATCH_SIZE.labels(self.embeddings.model, "document").observe(len(texts))
+                # OpenAIEmbeddings doesn't surface usage; the chunker's token counts use the same tokenizer
+                record_openai_usage(self.embeddings.model, "embedding", {"prompt_tokens": sum(chunks[i]["token_count"] for i in missing)})
+                # Upsert by id, so a concurrent retry writing the same ids cannot duplicate chunks
+                with tracer.start_as_current_span("vectorstore.write", attributes={"vectorstore": "chroma", "document.id": doc_id, "chunks": len(missing)}):
+                    collection.upsert(
+                        ids=[ids[i] for i in missing],
+                        embeddings=embeddings,
+                        documents=texts,
+                        metadatas=[chunk_metadata(i) for i in missing]
+                    )
+            if stale:
+                collection.delete(ids=stale)
+            kept = [i for i, chunk_id in enumerate(ids) if chunk_id in existing]
+            if kept:
+                # total_chunks may have changed; metadata-only update, no embedding call
+                collection.update(ids=[ids[i] for i in kept], metadatas=[chunk_metadata(i) for i in kept])
+            
+            self._update_lexical_index(user_id, version_before, lambda index: index.add_document(doc_id, enumerate(chunk_texts)))
             
-            logger.info(f"✅ LangChain added document {doc_id} ({len(meaningful_chunks)} meaningful chunks out of {len(chunks)} total)")
+            logger.info(
+                f"✅ LangChain upserted document {doc_id} ({len(chunk_texts)} chunks, {sum(c['token_count'] for c in chunks)} tokens: "
+                f"{len(missing)} embedded, {len(kept)} reused, {len(stale)} removed)"
+            )
             return True
             
         except Exception as e:
             logger.error(f"❌ LangChain failed to add document {doc_id}: {str(e)}")
+            # The upsert may have landed before the failure
+            self._discard_lexical_index(user_id)
             return False
     
-    def _is_meaningful_chunk(self, chunk: str) -> bool:
-        """Check if a chunk contains meaningful content"""
-        if not chunk or len(chunk.strip()) < 20:
-            return False
-        
-        # Remove common extraction failure patterns
-        cleaned_chunk = chunk.lower()
-        
-        # Patterns that indicate empty/failed content
-        empty_patterns = [
-            "[no extractable text]",
-            "[error extracting text",
-            "--- page",
-            "pdf processing failed",
-            "ocr failed",
-            "error processing",
-            "unsupported file type"
-        ]
-        
-        # If chunk consists mostly of empty patterns, skip it
-        meaningful_content = chunk
-        for pattern in empty_patterns:
-            meaningful_content = meaningful_content.replace(pattern, "")
-        
-        # If after removing patterns, less than 50 characters remain, it's not meaningful
-        if len(meaningful_content.strip()) < 50:
-            return False
-        
-        # Additional check: if chunk is mostly repetitive page markers
-        if chunk.count("--- Page") > len(chunk) / 100:  # Too many page markers relative to content
-            return False
-        
-        return True
-    
     def remove_document_from_vectorstore(self, doc_id: str, user_id: str) -> bool:
         """Remove document from LangChain vector store"""
+        return self.remove_documents_from_vectorstore([doc_id], user_id)
+
+    def remove_documents_from_vectorstore(self, doc_ids: List[str], user_id: str) -> bool:
+        """Delete all chunks of the given documents by metadata filter, in batches, without embedding calls"""
         if not self._is_available or not self.vectorstore:
             logger.error("LangChain vector store not available")
             return False
-            
-        try:
-            # Get all documents with this doc_id and user_id
-            docs = self.vectorstore.similarity_search(
-                query="*",  # Match all documents
-                k=1000,     # Get many results to ensure we find all chunks
-                filter={"doc_id": doc_id, "user_id": user_id}
-            )
-            
-            if not docs:
-                logger.info(f"Document {doc_id} not found in LangChain vector store")
-                return True  # Consider it successful if document wasn't there
-            
-            # Delete documents by their IDs
-            ids_to_delete = []
-            for doc in docs:
-                # Try to get the document ID from metadata
-                chunk_id = doc.metadata.get("chunk_id")
-                if chunk_id:
-                    ids_to_delete.append(chunk_id)
-            
-            if ids_to_delete:
-                # Use Chroma's delete method
-                self.vectorstore.delete(ids=ids_to_delete)
-                logger.info(f"✅ LangChain removed document {doc_id} ({len(ids_to_delete)} chunks) for user {user_id}")
-            else:
-                logger.warning(f"No chunk IDs found for document {doc_id}")
-            
+
+        doc_ids = list(dict.fromkeys(doc_ids))
+        if not doc_ids:
             return True
-            
+
+        started = time.perf_counter()
+        removed = 0
+        batch_size = settings.VECTOR_DELETE_BATCH_SIZE
+        version_before = search_result_cache.current_corpus_version(user_id)
+        try:
+            collection = self.vectorstore._collection
+            for start in range(0, len(doc_ids), batch_size):
+                batch = doc_ids[start:start + batch_size]
+                # Chroma 0.4 needs an explicit $and to combine conditions on two keys
+                where = {"$and": [{"user_id": user_id}, {"doc_id": {"$in": batch}}]}
+                # Fetch ids first to count removed chunks; no documents or embeddings are read
+                chunk_ids = collection.get(where=where, include=[])["ids"]
+                for id_start in range(0, len(chunk_ids), batch_size):
+                    collection.delete(ids=chunk_ids[id_start:id_start + batch_size])
+                removed += len(chunk_ids)
         except Exception as e:
-            logger.error(f"❌ LangChain failed to remove document {doc_id}: {str(e)}")
-            # Try alternative deletion method using collection access
-            try:
-                collection = self.vectorstore._collection
-                collection.delete(where={"doc_id": doc_id, "user_id": user_id})
-                logger.info(f"✅ LangChain removed document {doc_id} using collection.delete() for user {user_id}")
-                return True
-            except Exception as e2:
-                logger.error(f"❌ LangChain alternative deletion also failed: {str(e2)}")
-                return False
+            logger.error(f"❌ LangChain failed to remove documents {doc_ids[:5]}{'...' if len(doc_ids) > 5 else ''}: {str(e)}")
+            # A batch may have been partly deleted
+            self._discard_lexical_index(user_id)
+            return False
+
+        def unindex(index):
+            for doc_id in doc_ids:
+                index.remove_document(doc_id)
+        self._update_lexical_index(user_id, version_before, unindex)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if removed:
+            logger.info(f"✅ LangChain removed {len(doc_ids)} document(s) ({removed} chunks) for user {user_id} in {elapsed_ms:.1f} ms")
+        else:
+            logger.info(f"Document(s) {doc_ids[:5]} not found in LangChain vector store")
+        return True
     
+    def _iter_chunk_metadata(self, where: Optional[Dict[str, Any]] = None):
+        """(chunk id, metadata) for every stored chunk matching where, paged by metadata only"""
+        collection = self.vectorstore._collection
+        page_size = 1000
+        offset = 0
+        while True:
+            page = collection.get(where=where, include=["metadatas"], limit=page_size, offset=offset)
+            for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+                yield chunk_id, metadata or {}
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+
+    def list_stored_documents(self, user_id: Optional[str] = None) -> Optional[Dict[str, Set[str]]]:
+        if not self._is_available or not self.vectorstore:
+            return None
+        listing = defaultdict(set)
+        for _, metadata in self._iter_chunk_metadata({"user_id": user_id} if user_id else None):
+            if metadata.get("user_id") and metadata.get("doc_id"):
+                listing[metadata["user_id"]].add(metadata["doc_id"])
+        return dict(listing)
+
+    def remove_unowned_vectors(self) -> int:
+        """Delete the old initialize() "test" entries and any chunk missing doc_id/user_id"""
+        if not self._is_available or not self.vectorstore:
+            return 0
+        unowned = [
+            chunk_id for chunk_id, metadata in self._iter_chunk_metadata()
+            if metadata.get("test") == "true" or not metadata.get("doc_id") or not metadata.get("user_id")
+        ]
+        batch_size = settings.VECTOR_DELETE_BATCH_SIZE
+        for start in range(0, len(unowned), batch_size):
+            self.vectorstore._collection.delete(ids=unowned[start:start + batch_size])
+        if unowned:
+            self._discard_lexical_index()
+            logger.info(f"🧹 LangChain removed {len(unowned)} unowned chunks")
+        return len(unowned)
+
+    def compact_vectorstore(self) -> Dict[str, int]:
+        """VACUUM Chroma's SQLite file. Chroma 0.4 has no API to shrink its HNSW files, so those are left as is."""
+        import sqlite3
+
+        def dir_bytes():
+            return sum(p.stat().st_size for p in self.vector_db_path.rglob("*") if p.is_file())
+
+        sqlite_file = self.vector_db_path / "chroma.sqlite3"
+        before = dir_bytes()
+        if sqlite_file.exists():
+            conn = sqlite3.connect(str(sqlite_file), timeout=30)
+            try:
+                conn.execute("VACUUM")
+            finally:
+                conn.close()
+        after = dir_bytes()
+        logger.info(f"🗜️ LangChain vector DB compacted: {before - after} bytes reclaimed")
+        return {"bytes_before": before, "bytes_after": after}
+
     def get_engine_info(self) -> Dict[str, Any]:
         return {
             "engine_type": self.engine_type.value,
@@ -476,9 +817,11 @@ Return ONLY the JSON object, no additional text."""),
                 "document_classification": True,
                 "information_extraction": True,
                 "document_search": self.vectorstore is not None,
-                "question_answering": self.qa_chain is not None,
-                "vector_storage": self.vectorstore is not None
+                "question_answering": self.vectorstore is not None,
+                "vector_storage": self.vectorstore is not None,
+                "hybrid_search": self.vectorstore is not None
             },
+            "qa_chain": self._qa_chain_info(),
             "rag_implementation": "langchain_chroma",
             "version": "1.0.0"
         }
@@ -491,5 +834,9 @@ Return ONLY the JSON object, no additional text."""),
     def is_available(self) -> bool:
         return self._is_available
 
+    @property
+    def supported_search_modes(self) -> List[SearchMode]:
+        return [SearchMode.DENSE, SearchMode.LEXICAL, SearchMode.HYBRID]
+
 # Register the engine
 WorkflowEngineFactory.register_engine(WorkflowEngineType.LANGCHAIN, LangChainEngine)
\ No newline at end of file
@@ -0,0 +1,102 @@
+from typing import Dict, List, Tuple, Hashable, Iterable
+import math
+import re
+import threading
+from collections import defaultdict
+
+# Keep identifiers like "PO-2024-0117" or "SKU_88.1" whole, and also index their parts
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./#][a-z0-9]+)*")
+PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """
+    Incrementally maintained Okapi BM25 index over chunks.
+
+    Chunks are keyed by (doc_id, chunk_index) and grouped by document so a whole
+    document can be replaced or removed in one call.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[Tuple[str, int], int]] = defaultdict(dict)  # term -> {chunk_key: tf}
+        self.chunk_terms: Dict[Tuple[str, int], Dict[str, int]] = {}
+        self.chunk_lengths: Dict[Tuple[str, int], int] = {}
+        self.chunk_text: Dict[Tuple[str, int], str] = {}  # references the caller's strings, not copies
+        self.doc_chunks: Dict[str, List[Tuple[str, int]]] = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.chunk_lengths)
+
+    def add_document(self, doc_id: str, chunks: Iterable[Tuple[int, str]]):
+        """Index (or re-index) a document given (chunk_index, text) pairs"""
+        with self._lock:
+            self.remove_document(doc_id)
+            keys = []
+            for chunk_index, text in chunks:
+                key = (doc_id, chunk_index)
+                terms: Dict[str, int] = defaultdict(int)
+                for token in tokenize(text):
+                    terms[token] += 1
+                for term, tf in terms.items():
+                    self.postings[term][key] = tf
+                length = sum(terms.values())
+                self.chunk_terms[key] = dict(terms)
+                self.chunk_lengths[key] = length
+                self.chunk_text[key] = text
+                self.total_length += length
+                keys.append(key)
+            self.doc_chunks[doc_id] = keys
+
+    def remove_document(self, doc_id: str):
+        with self._lock:
+            for key in self.doc_chunks.pop(doc_id, []):
+                for term in self.chunk_terms.pop(key, {}):
+                    postings = self.postings.get(term)
+                    if postings is not None:
+                        postings.pop(key, None)
+                        if not postings:
+                            del self.postings[term]
+                self.total_length -= self.chunk_lengths.pop(key, 0)
+                self.chunk_text.pop(key, None)
+
+    def search(self, query: str, k: int) -> List[Tuple[Tuple[str, int], float]]:
+        """Top-k (chunk_key, score) pairs for the query"""
+        with self._lock:
+            n = len(self.chunk_lengths)
+            if not n:
+                return []
+            avg_length = self.total_length / n
+
+            scores: Dict[Tuple[str, int], float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.chunk_lengths[key] / avg_length)
+                    scores[key] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """Fuse several best-first rankings: score(d) = sum(1 / (k + rank_i(d)))"""
+    scores: Dict[Hashable, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,25 +1,29 @@
-from typing import Dict, Any, Optional, List
-import json
-from openai import OpenAI
+from typing import Dict, Any, AsyncIterator, Optional, List
+import threading
+import time
 from app.core.config import settings
+from app.core.metrics import CLASSIFICATION_SECONDS, QA_SECONDS
+from app.core.tracing import tracer
 import logging
 from app.services.workflow_engine import WorkflowEngine, WorkflowEngineType, WorkflowEngineFactory
+from app.services.local_classifier import local_classifier
+from app.services.field_extraction import extract_key_information
+from app.services.answer_cache import answer_cache
+from app.services.search_cache import query_embedding_cache
 
-from app.services.langchain_engine import LangChainEngine
-from app.services.openai_direct_engine import OpenAIDirectEngine
+# Engine modules are imported by WorkflowEngineFactory on first use, not here
 
 logger = logging.getLogger(__name__)
 
 class LLMService:
-    def __init__(self, preferred_engine: WorkflowEngineType = None):
-        self.current_engine: Optional[WorkflowEngine] = None
-        self.available_engines: Dict[WorkflowEngineType, WorkflowEngine] = {}
-
-        preferred = preferred_engine or self._get_preferred_engine_from_config()
+    ENGINE_TYPES = [WorkflowEngineType.LANGCHAIN, WorkflowEngineType.OPENAI_DIRECT, WorkflowEngineType.PGVECTOR]
 
-        self._initialize_engines()
-
-        self._set_current_engine(preferred)
+    def __init__(self, preferred_engine: WorkflowEngineType = None):
+        # Nothing is built here: engines are created on first access to current_engine
+        self._preferred = preferred_engine
+        self._current_engine: Optional[WorkflowEngine] = None
+        self._resolved = False
+        self._lock = threading.Lock()
     
     def _get_preferred_engine_from_config(self) -> WorkflowEngineType:
         engine_name = getattr(settings, 'WORKFLOW_ENGINE', 'langchain').lower()
@@ -28,46 +32,104 @@ class LLMService:
         except ValueError:
             logger.warning(f"Unknown engine type: '{engine_name}', defaulting to LangChain")
             return WorkflowEngineType.LANGCHAIN
-    
-    def _initialize_engines(self):
-        engine_types = [WorkflowEngineType.LANGCHAIN, WorkflowEngineType.OPENAI_DIRECT]
-
-        for engine_type in engine_types:
-            try:
-                engine = WorkflowEngineFactory.create_engine(engine_type)
-                if engine.is_available:
-                    self.available_engines[engine_type] = engine
-                    logger.info(f"{engine_type.value} engine initialized and available")
-                else:
-                    logger.warning(f"{engine_type.value} engine initialized but not available")
-            except Exception as e:
-                logger.error(f"Failed to initialize {engine_type.value} engine: {str(e)}")
+
+    @property
+    def current_engine(self) -> Optional[WorkflowEngine]:
+        if not self._resolved:
+            with self._lock:
+                if not self._resolved:
+                    self._set_current_engine(self._preferred or self._get_preferred_engine_from_config())
+                    # With no engine up yet, resolve again on a later access (the factory rate-limits rebuilds)
+                    self._resolved = self._current_engine is not None
+        return self._current_engine
+
+    @property
+    def available_engines(self) -> Dict[WorkflowEngineType, WorkflowEngine]:
+        """All engines that initialize successfully; builds any not yet constructed"""
+        engines = {}
+        for engine_type in self.ENGINE_TYPES:
+            engine = WorkflowEngineFactory.get_engine(engine_type)
+            if engine:
+                engines[engine_type] = engine
+        return engines
             
     def _set_current_engine(self, engine_type: WorkflowEngineType):
-        if engine_type in self.available_engines:
-            self.current_engine = self.available_engines[engine_type]
+        engine = WorkflowEngineFactory.get_engine(engine_type)
+        if engine:
+            self._current_engine = engine
             logger.info(f"Active engine set to {engine_type.value}")
-        else:
-            if self.available_engines:
-                fallback_type = next(iter(self.available_engines.keys()))
-                self.current_engine = self.available_engines[fallback_type]
+            return
+
+        for fallback_type in self.ENGINE_TYPES:
+            if fallback_type == engine_type:
+                continue
+            engine = WorkflowEngineFactory.get_engine(fallback_type)
+            if engine:
+                self._current_engine = engine
                 logger.info(f"Requested engine {engine_type.value} not available, using {fallback_type.value} as fallback")
-            else:
-                logger.error("No workflow engines available")
-                self.current_engine = None
+                return
+
+        logger.error("No workflow engines available")
+        self._current_engine = None
     
     def switch_engine(self, engine_type: WorkflowEngineType) -> bool:
-        if engine_type not in self.available_engines:
+        engine = WorkflowEngineFactory.get_engine(engine_type)
+        if not engine:
             logger.error(f"Engine {engine_type.value} not available")
             return False
         
         old_engine = self.current_engine.engine_type if self.current_engine else None
-        self.current_engine = self.available_engines[engine_type]
+        with self._lock:
+            self._current_engine = engine
+            self._resolved = True
         logger.info(f"Switched engine from {old_engine} to {engine_type.value}")
         return True
+
+    def check_readiness(self) -> Dict[str, Any]:
+        """Readiness of the active engine; constructs it if this is the first use"""
+        engine = self.current_engine
+        if not engine:
+            return {"ready": False, "engine": None, "checks": {}}
+        result = engine.check_readiness()
+        result["engine"] = engine.engine_type.value
+        return result
     
     def classify_document(self, text: str) -> Dict[str, Any]:
-        """Classify document using the current workflow engine"""
+        """Classify with the local model when it is confident enough, otherwise escalate to the current workflow engine"""
+        started = time.perf_counter()
+        with tracer.start_as_current_span("classify_document", attributes={"text.characters": len(text)}) as span:
+            result = self._classify(text)
+            span.set_attribute("classification.method", result.get("analysis_method", "unknown"))
+            span.set_attribute("classification.type", result.get("document_type", "unknown"))
+        CLASSIFICATION_SECONDS.labels(result.get("analysis_method", "unknown")).observe(time.perf_counter() - started)
+        return result
+
+    def _classify(self, text: str) -> Dict[str, Any]:
+        local = None
+        try:
+            local = local_classifier.predict(text)
+        except Exception as e:
+            logger.error(f"❌ Local classifier failed, escalating to LLM: {str(e)}")
+
+        if local and local["confidence"] >= local["threshold"]:
+            logger.info(f"⚡ Local classifier: {local['document_type']} ({local['confidence']:.2f}) in {local['latency_ms']:.1f} ms")
+            return {
+                "document_type": local["document_type"],
+                "confidence": local["confidence"],
+                # Rule-based fields; names and free-text fields the LLM would extract are not filled in
+                "key_information": extract_key_information(local["document_type"], text),
+                "analysis_method": "local_classifier",
+                "model_used": f"tfidf-logreg:{local['model_version']}",
+                "engine_used": "local"
+            }
+
+        result = self._classify_with_engine(text)
+        if local:
+            # Kept for threshold tuning: what the local model would have said
+            result["local_prediction"] = {k: local[k] for k in ("document_type", "confidence", "model_version")}
+        return result
+
+    def _classify_with_engine(self, text: str) -> Dict[str, Any]:
         if not self.current_engine:
             return {
                 "document_type": "unknown",
@@ -87,7 +149,7 @@ class LLMService:
             
             # Try fallback to other engines
             for engine_type, engine in self.available_engines.items():
-                if engine != self.current_engine:
+                if engine is not self.current_engine:
                     try:
                         logger.info(f"🔄 Trying fallback engine: {engine_type.value}")
                         result = engine.classify_document(text)
@@ -118,14 +180,83 @@ class LLMService:
             return {"answer": "No engine available", "confidence": 0.0}
         return self.current_engine.answer_question(question, context)
     
+    async def _question_embedding(self, engine: WorkflowEngine, question: str) -> Optional[List[float]]:
+        try:
+            return await engine.aembed_query(question)
+        except Exception as e:
+            logger.warning(f"⚠️ Question embedding for the answer cache failed: {str(e)}")
+            return None
+
+    async def aanswer_question(self, question: str, user_id: str) -> Dict[str, Any]:
+        """Answer with the current engine, reusing a cached answer to a near-identical earlier question"""
+        engine = self.current_engine
+        if not engine:
+            return {"answer": "No engine available", "confidence": 0.0, "sources": [], "method": "no_engine_available"}
+
+        engine_name = engine.engine_type.value
+        received = time.perf_counter()
+        embedding = await self._question_embedding(engine, question)
+        cached = await answer_cache.lookup(user_id, engine_name, embedding)
+        if cached:
+            QA_SECONDS.labels(engine_name, "true", "false").observe(time.perf_counter() - received)
+            return cached
+
+        started = time.perf_counter()
+        result = await engine.aanswer_question(question=question, user_id=user_id, context="")
+        await answer_cache.store(user_id, engine_name, question, embedding, result, (time.perf_counter() - started) * 1000)
+        QA_SECONDS.labels(engine_name, "false", "false").observe(time.perf_counter() - received)
+        return {**result, "cached": False}
+
+    async def astream_answer(self, question: str, user_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming counterpart of aanswer_question; a cache hit is sent as a single token"""
+        engine = self.current_engine
+        if not engine:
+            yield {"event": "error", "data": {"message": "No AI engine available"}}
+            return
+
+        engine_name = engine.engine_type.value
+        received = time.perf_counter()
+        embedding = await self._question_embedding(engine, question)
+        cached = await answer_cache.lookup(user_id, engine_name, embedding)
+        if cached:
+            QA_SECONDS.labels(engine_name, "true", "true").observe(time.perf_counter() - received)
+            yield {"event": "sources", "data": {"sources": cached["sources"]}}
+            yield {"event": "token", "data": {"text": cached["answer"]}}
+            yield {"event": "done", "data": {
+                "confidence": cached["confidence"],
+                "method": cached["method"],
+                "engine": engine_name,
+                "cached": True
+            }}
+            return
+
+        started = time.perf_counter()
+        sources, tokens = [], []
+        async for item in engine.astream_answer(question=question, user_id=user_id):
+            event, data = item["event"], item["data"]
+            if event == "sources":
+                sources = data["sources"]
+            elif event == "token":
+                tokens.append(data["text"])
+            elif event == "done":
+                data = {**data, "cached": False}
+                result = {"answer": "".join(tokens), "sources": sources, **data}
+                await answer_cache.store(user_id, engine_name, question, embedding, result, (time.perf_counter() - started) * 1000)
+                QA_SECONDS.labels(engine_name, "false", "true").observe(time.perf_counter() - received)
+            yield {"event": event, "data": data}
+
     def get_engine_status(self) -> Dict[str, Any]:
         """Get status of all engines"""
+        available_engines = self.available_engines
         return {
             "current_engine": self.current_engine.engine_type.value if self.current_engine else None,
-            "available_engines": [engine_type.value for engine_type in self.available_engines.keys()],
+            "local_classifier": local_classifier.info(),
+            "answer_cache": answer_cache.stats(),
+            "query_embedding_cache": query_embedding_cache.stats(),
+            "available_engines": [engine_type.value for engine_type in available_engines.keys()],
             "engine_details": {
                 engine_type.value: engine.get_engine_info()
-                for engine_type, engine in self.available_engines.items()
+                for engine_type, engine in available_engines.items()
             }
         }
     
@@ -133,4 +264,5 @@ class LLMService:
         """Get list of available engine names"""
         return [engine_type.value for engine_type in self.available_engines.keys()]
     
+# Cheap to construct: engines are resolved lazily
 llm_service = LLMService()
@@ -0,0 +1,162 @@
+from typing import Dict, Any, List, Optional, Tuple
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.core.config import settings
+from app.services.prompt_compression import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Only labels produced by a real LLM classification are trusted for training
+TRAINING_ANALYSIS_METHODS = ("openai_direct", "langchain")
+MAX_INPUT_CHARS = 20000  # the head of a document carries nearly all of the type signal
+
+def prepare_text(text: str) -> str:
+    return normalize_text(text[:MAX_INPUT_CHARS * 2])[:MAX_INPUT_CHARS]
+
+def build_pipeline():
+    """TF-IDF over words and character n-grams (robust to OCR typos) feeding a logistic regression"""
+    from sklearn.pipeline import Pipeline, FeatureUnion
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+
+    features = FeatureUnion([
+        ("words", TfidfVectorizer(ngram_range=(1, 2), min_df=2, max_features=50000, sublinear_tf=True)),
+        ("chars", TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), min_df=2, max_features=50000, sublinear_tf=True)),
+    ])
+    return Pipeline([
+        ("features", features),
+        ("model", LogisticRegression(max_iter=2000, C=4.0, class_weight="balanced")),
+    ])
+
+def save_artifact(pipeline, metadata: Dict[str, Any], activate: bool = True) -> Path:
+    """Write model + metadata under a new version directory and optionally point current.json at it"""
+    import joblib
+
+    root = Path(settings.LOCAL_CLASSIFIER_DIR)
+    version = datetime.now(timezone.utc).strftime("v%Y%m%d%H%M%S")
+    version_dir = root / version
+    version_dir.mkdir(parents=True, exist_ok=False)
+
+    metadata = {**metadata, "version": version}
+    joblib.dump(pipeline, version_dir / "model.joblib")
+    (version_dir / "metadata.json").write_text(json.dumps(metadata, indent=2))
+
+    if activate:
+        pointer = root / "current.json"
+        tmp = root / ".current.json.tmp"
+        tmp.write_text(json.dumps({"version": version}))
+        tmp.replace(pointer)
+    return version_dir
+
+
+class LocalDocumentClassifier:
+    """
+    First tier of the classification cascade: the active artifact from
+    LOCAL_CLASSIFIER_DIR, loaded on first use and reloaded when current.json
+    points at a new version. Disabled (predict returns None) when scikit-learn
+    or an artifact is missing.
+    """
+
+    def __init__(self):
+        self._pipeline = None
+        self._metadata: Dict[str, Any] = {}
+        self._loaded_version: Optional[str] = None
+        self._pointer_mtime = None
+        self._lock = threading.Lock()
+        self._unavailable_logged = False
+
+    def _ensure_loaded(self) -> bool:
+        pointer = Path(settings.LOCAL_CLASSIFIER_DIR) / "current.json"
+        try:
+            mtime = pointer.stat().st_mtime_ns
+        except FileNotFoundError:
+            if not self._unavailable_logged:
+                logger.info(f"ℹ️ No local classifier artifact in {settings.LOCAL_CLASSIFIER_DIR}; every document goes to the LLM")
+                self._unavailable_logged = True
+            return False
+
+        if mtime == self._pointer_mtime and self._pipeline is not None:
+            return True
+
+        with self._lock:
+            if mtime == self._pointer_mtime and self._pipeline is not None:
+                return True
+            try:
+                import joblib
+
+                version = json.loads(pointer.read_text())["version"]
+                version_dir = pointer.parent / version
+                pipeline = joblib.load(version_dir / "model.joblib")
+                metadata = json.loads((version_dir / "metadata.json").read_text())
+            except Exception as e:
+                if not self._unavailable_logged:
+                    logger.error(f"❌ Failed to load local classifier: {str(e)}")
+                    self._unavailable_logged = True
+                return False
+
+            self._pipeline, self._metadata, self._loaded_version = pipeline, metadata, version
+            self._pointer_mtime = mtime
+            self._unavailable_logged = False
+            logger.info(f"✅ Local classifier {version} loaded ({metadata.get('samples', '?')} training samples)")
+            return True
+
+    @property
+    def threshold(self) -> float:
+        if settings.LOCAL_CLASSIFIER_THRESHOLD is not None:
+            return settings.LOCAL_CLASSIFIER_THRESHOLD
+        return self._metadata.get("recommended_threshold", 0.9)
+
+    def predict(self, text: str) -> Optional[Dict[str, Any]]:
+        """Most likely document type and its probability, or None if no model is available"""
+        if not settings.LOCAL_CLASSIFIER_ENABLED or not text or not self._ensure_loaded():
+            return None
+
+        started = time.perf_counter()
+        probabilities = self._pipeline.predict_proba([prepare_text(text)])[0]
+        best = int(probabilities.argmax())
+        return {
+            "document_type": str(self._pipeline.classes_[best]),
+            "confidence": float(probabilities[best]),
+            "threshold": self.threshold,
+            "model_version": self._loaded_version,
+            "latency_ms": (time.perf_counter() - started) * 1000,
+        }
+
+    def info(self) -> Dict[str, Any]:
+        self._ensure_loaded()
+        return {
+            "enabled": settings.LOCAL_CLASSIFIER_ENABLED,
+            "loaded": self._pipeline is not None,
+            "version": self._loaded_version,
+            "threshold": self.threshold if self._pipeline is not None else None,
+            "trained_at": self._metadata.get("trained_at"),
+            "samples": self._metadata.get("samples"),
+        }
+
+
+def load_training_samples(db) -> List[Tuple[str, str]]:
+    """(text, label) from documents classified by an LLM engine"""
+    from sqlalchemy import select
+    from app.models import Document, DocumentType
+    from app.services.document_text import load_texts
+
+    rows = db.execute(
+        select(Document.id, Document.ai_document_type).where(
+            Document.ai_document_type.isnot(None),
+            Document.ai_document_type != DocumentType.UNKNOWN,
+            Document.ai_analysis_method.in_(TRAINING_ANALYSIS_METHODS),
+        )
+    ).all()
+    texts = load_texts(db, [row.id for row in rows])
+    return [
+        (prepare_text(texts[str(row.id)]), row.ai_document_type.value)
+        for row in rows if texts.get(str(row.id), "").strip()
+    ]
+
+
+local_classifier = LocalDocumentClassifier()
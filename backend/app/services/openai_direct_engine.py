@@ -1,31 +1,56 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Set
 import json
 import logging
 import numpy as np
 from pathlib import Path
-import pickle
-from openai import OpenAI
 
 from app.core.config import settings
-from app.services.workflow_engine import WorkflowEngine, WorkflowEngineType, WorkflowEngineFactory
+from app.core.metrics import EMBEDDING_SECONDS, EMBEDDING_BATCH_SIZE, record_openai_usage, record_openai_error
+from app.core.tracing import tracer
+from app.services.workflow_engine import WorkflowEngine, WorkflowEngineType, WorkflowEngineFactory, SearchMode, run_in_engine_pool
+from app.services.vector_store import ShardedVectorStore, normalize_rows
+from app.services.lexical_index import reciprocal_rank_fusion
+from app.services.chunking import make_chunk_id, chunk_document
+from app.services.prompt_compression import compress_for_classification
+from app.services.search_cache import query_embedding_cache
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+CLASSIFICATION_PROMPT = """
+You are an expert document classifier. Analyze this document and return a JSON response with:
+
+1. "document_type": Choose from ["invoice", "contract", "receipt", "form", "letter", "report", "other"]
+2. "confidence": Float between 0.0-1.0 indicating your confidence level
+3. "key_information": Object with extracted details based on document type
+
+Return ONLY valid JSON, no additional text.
+"""
+
 class OpenAIDirectEngine(WorkflowEngine):
     def __init__(self):
         self.client = None
+        self.async_client = None
         self._is_available = False
-        # Custom vector storage for OpenAI Direct
-        self.documents = {}  # doc_id -> {text, chunks, embeddings}
+        self.store = self._create_store()
+
+    def _create_store(self) -> Optional[ShardedVectorStore]:
+        """Custom vector storage for OpenAI Direct: per-user shards shared with other API/Celery processes"""
         self.vector_store_path = Path("./openai_direct_vectors")
         self.vector_store_path.mkdir(exist_ok=True)
-        self.initialize()
+        return ShardedVectorStore(
+            self.vector_store_path,
+            max_resident_bytes=settings.OPENAI_DIRECT_SHARD_CACHE_BYTES
+        )
 
     def initialize(self) -> bool:
         """Initialize OpenAI client and load existing vectors"""
         if settings.OPENAI_API_KEY and settings.OPENAI_API_KEY.strip().startswith('sk-'):
             try:
+                from openai import OpenAI, AsyncOpenAI
                 self.client = OpenAI(api_key=settings.OPENAI_API_KEY.strip())
+                self.async_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY.strip())
                 self._load_vector_store()
                 self._is_available = True
                 logger.info("✅ OpenAI direct engine initialized with custom RAG")
@@ -39,67 +64,95 @@ class OpenAIDirectEngine(WorkflowEngine):
             self._is_available = False
             return False
     
-    def _load_vector_store(self):
-        """Load existing vector store from disk"""
+    def check_readiness(self) -> Dict[str, Any]:
+        """Side-effect-free connectivity check: OpenAI model lookup"""
+        checks = {}
         try:
-            store_file = self.vector_store_path / "documents.pkl"
-            if store_file.exists():
-                with open(store_file, 'rb') as f:
-                    self.documents = pickle.load(f)
-                logger.info(f"📚 Loaded {len(self.documents)} documents from OpenAI Direct vector store")
+            if not self.client:
+                raise RuntimeError("client not initialized")
+            self.client.models.retrieve(settings.OPENAI_MODEL)
+            checks["openai"] = "ok"
         except Exception as e:
-            logger.error(f"❌ Failed to load vector store: {str(e)}")
-            self.documents = {}
-    
-    def _save_vector_store(self):
-        """Save vector store to disk"""
+            checks["openai"] = f"error: {str(e)}"
+        return {
+            "ready": self._is_available and all(v == "ok" for v in checks.values()),
+            "checks": checks
+        }
+
+    def _load_vector_store(self):
+        """Prepare the vector store; user shards themselves are loaded lazily on first search"""
         try:
-            store_file = self.vector_store_path / "documents.pkl"
-            with open(store_file, 'wb') as f:
-                pickle.dump(self.documents, f)
+            self.store.import_legacy()
         except Exception as e:
-            logger.error(f"❌ Failed to save vector store: {str(e)}")
+            logger.error(f"❌ Failed to load vector store: {str(e)}")
     
-    def _create_embedding(self, text: str) -> List[float]:
+    def _create_embedding(self, text: str, kind: str = "document") -> List[float]:
         """Create embedding using OpenAI's embedding API"""
+        return self._create_embeddings([text], kind)[0]
+
+    def _create_embeddings(self, texts: List[str], kind: str = "document") -> List[List[float]]:
+        """
+        Embeddings for many texts, EMBEDDING_BATCH_MAX_TEXTS per API call, in
+        input order. Texts of a failed call get [] like _create_embedding.
+        """
+        embeddings: List[List[float]] = []
+        batch_size = settings.EMBEDDING_BATCH_MAX_TEXTS
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            try:
+                with EMBEDDING_SECONDS.labels(EMBEDDING_MODEL, kind).time(), tracer.start_as_current_span(
+                    "embedding.batch", attributes={
+                        "embedding.model": EMBEDDING_MODEL, "embedding.kind": kind, "embedding.batch_size": len(batch),
+                        "text.characters": sum(len(text) for text in batch),
+                    }
+                ):
+                    response = self.client.embeddings.create(
+                        model=EMBEDDING_MODEL,
+                        input=batch
+                    )
+                EMBEDDING_BATCH_SIZE.labels(EMBEDDING_MODEL, kind).observe(len(batch))
+                record_openai_usage(EMBEDDING_MODEL, "embedding", response.usage)
+                embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+            except Exception as e:
+                record_openai_error(EMBEDDING_MODEL, "embedding", e)
+                logger.error(f"❌ Failed to create {len(batch)} embedding(s): {str(e)}")
+                embeddings.extend([] for _ in batch)
+        return embeddings
+
+    async def aembed_query(self, text: str) -> Optional[List[float]]:
+        return await self._aquery_embedding(text) or None
+
+    def _query_embedding(self, query: str) -> List[float]:
+        """Query embeddings go through the LRU; chunk embeddings use _create_embedding directly"""
+        embedding = query_embedding_cache.get(EMBEDDING_MODEL, query)
+        if embedding is None:
+            embedding = self._create_embedding(query, kind="query")
+            query_embedding_cache.put(EMBEDDING_MODEL, query, embedding)
+        return embedding
+
+    async def _aquery_embedding(self, query: str) -> List[float]:
+        embedding = query_embedding_cache.get(EMBEDDING_MODEL, query)
+        if embedding is None:
+            embedding = await self._acreate_embedding(query)
+            query_embedding_cache.put(EMBEDDING_MODEL, query, embedding)
+        return embedding
+
+    async def _acreate_embedding(self, text: str) -> List[float]:
+        """Query embeddings on the request path"""
         try:
-            response = self.client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=text
-            )
+            with EMBEDDING_SECONDS.labels(EMBEDDING_MODEL, "query").time():
+                response = await self.async_client.embeddings.create(
+                    model=EMBEDDING_MODEL,
+                    input=text
+                )
+            EMBEDDING_BATCH_SIZE.labels(EMBEDDING_MODEL, "query").observe(1)
+            record_openai_usage(EMBEDDING_MODEL, "embedding", response.usage)
             return response.data[0].embedding
         except Exception as e:
+            record_openai_error(EMBEDDING_MODEL, "embedding", e)
             logger.error(f"❌ Failed to create embedding: {str(e)}")
             return []
     
-    def _chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-        """Simple text chunking implementation"""
-        words = text.split()
-        chunks = []
-        
-        for i in range(0, len(words), chunk_size - overlap):
-            chunk_words = words[i:i + chunk_size]
-            chunks.append(' '.join(chunk_words))
-            
-            if i + chunk_size >= len(words):
-                break
-                
-        return chunks
-    
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        try:
-            np_vec1 = np.array(vec1)
-            np_vec2 = np.array(vec2)
-            
-            dot_product = np.dot(np_vec1, np_vec2)
-            norm1 = np.linalg.norm(np_vec1)
-            norm2 = np.linalg.norm(np_vec2)
-            
-            return dot_product / (norm1 * norm2)
-        except:
-            return 0.0
-
     def classify_document(self, text: str) -> Dict[str, Any]:
         """Your existing classification logic"""
         if not self._is_available:
@@ -123,30 +176,23 @@ class OpenAIDirectEngine(WorkflowEngine):
     
     def _call_openai_classification(self, text: str) -> Dict[str, Any]:
         """Your existing OpenAI classification"""
-        max_chars = 8000
-        if len(text) > max_chars:
-            text = text[:max_chars] + "\n\n[Document truncated for analysis...]"
-
-        classification_prompt = """
-You are an expert document classifier. Analyze this document and return a JSON response with:
+        # Whitespace-normalized, noise-free head/tail/keyword windows within the token budget
+        compressed = compress_for_classification(text)
+        text = compressed["text"]
+        logger.info(f"🗜️ Classification input {compressed['original_tokens']} -> {compressed['compressed_tokens']} tokens")
 
-1. "document_type": Choose from ["invoice", "contract", "receipt", "form", "letter", "report", "other"]
-2. "confidence": Float between 0.0-1.0 indicating your confidence level
-3. "key_information": Object with extracted details based on document type
-
-Return ONLY valid JSON, no additional text.
-        """
         try:
             response = self.client.chat.completions.create(
                 model=settings.OPENAI_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a document classification expert that returns only valid JSON."},
-                    {"role": "user", "content": f"{classification_prompt}\n\nDocument text:\n{text}"}
+                    {"role": "user", "content": f"{CLASSIFICATION_PROMPT}\n\nDocument text:\n{text}"}
                 ],
-                max_tokens=settings.OPENAI_MAX_TOKENS,
+                max_tokens=settings.CLASSIFICATION_MAX_OUTPUT_TOKENS,
                 temperature=settings.OPENAI_TEMPERATURE,
                 response_format={"type": "json_object"}
             )
+            record_openai_usage(settings.OPENAI_MODEL, "classification", response.usage)
 
             result = response.choices[0].message.content
             parsed_result = json.loads(result)
@@ -159,6 +205,7 @@ Return ONLY valid JSON, no additional text.
             return parsed_result
 
         except Exception as e:
+            record_openai_error(settings.OPENAI_MODEL, "classification", e)
             logger.error(f"❌ OpenAI API call failed: {str(e)}")
             raise
     
@@ -188,69 +235,173 @@ Return ONLY valid JSON, no additional text.
                 "analysis_method": "openai_direct_mock"
             }
     
-    def search_documents(self, query: str, user_id: str, documents: List[str]) -> List[Dict[str, Any]]:
-        """Search documents using custom vector similarity with user filtering"""
-        if not self._is_available:
-            logger.error("OpenAI Direct engine not available for search")
+    def search_documents(self, query: str, user_id: str, documents: List[str], filters: Optional[Dict[str, Any]] = None, mode: SearchMode = SearchMode.DENSE, k: int = 4) -> List[Dict[str, Any]]:
+        """Search a user's chunks by vector similarity, BM25, or both fused with reciprocal rank fusion"""
+        shard = self._load_shard(user_id)
+        if shard is None:
             return []
         
-        if not self.documents:
-            logger.info("No documents in OpenAI Direct vector store")
+        query_embedding = None
+        if mode in (SearchMode.DENSE, SearchMode.HYBRID):
+            query_embedding = self._query_embedding(query)
+            if not query_embedding:
+                return []
+        return self._rank_chunks(shard, query, query_embedding, user_id, mode, k)
+
+    async def asearch_documents(self, query: str, user_id: str, documents: List[str], filters: Optional[Dict[str, Any]] = None, mode: SearchMode = SearchMode.DENSE, k: int = 4) -> List[Dict[str, Any]]:
+        """search_documents with the embedding awaited and shard loading / ranking in the engine pool"""
+        shard = await run_in_engine_pool(self._load_shard, user_id)
+        if shard is None:
             return []
         
-        try:
-            # Create embedding for query
-            query_embedding = self._create_embedding(query)
+        query_embedding = None
+        if mode in (SearchMode.DENSE, SearchMode.HYBRID):
+            query_embedding = await self._aquery_embedding(query)
             if not query_embedding:
                 return []
+        return await run_in_engine_pool(self._rank_chunks, shard, query, query_embedding, user_id, mode, k)
+
+    def _load_shard(self, user_id: str):
+        """The user's shard, or None if the engine is unavailable or the user has no vectors"""
+        if not self._is_available:
+            logger.error("OpenAI Direct engine not available for search")
+            return None
+        
+        try:
+            # Loads the user's shard on first use and picks up documents embedded by other processes
+            shard = self.store.shard(user_id)
+        except Exception as e:
+            logger.error(f"❌ Failed to load OpenAI Direct vector shard for user {user_id}: {str(e)}")
+            return None
+        
+        if not shard.documents:
+            logger.info(f"No documents in OpenAI Direct vector store for user {user_id}")
+            return None
+        return shard
+
+    def _rank_chunks(self, shard, query: str, query_embedding: Optional[List[float]], user_id: str, mode: SearchMode, k: int) -> List[Dict[str, Any]]:
+        """CPU-bound part of a search: dense scoring, BM25 and fusion over an already loaded shard"""
+        try:
+            # Hybrid fuses two deeper candidate lists; single-mode searches only need k
+            pool = max(k, settings.HYBRID_CANDIDATE_POOL) if mode == SearchMode.HYBRID else k
+            rankings = []
+            scores = {}
             
-            # Search across user's document chunks only
-            results = []
-            for doc_id, doc_data in self.documents.items():
-                # Filter by user_id stored in document metadata
-                if doc_data.get('metadata', {}).get('user_id') != user_id:
-                    continue
-                    
-                for chunk_idx, chunk_data in enumerate(doc_data.get('chunks', [])):
-                    chunk_embedding = chunk_data.get('embedding', [])
-                    if chunk_embedding:
-                        similarity = self._cosine_similarity(query_embedding, chunk_embedding)
-                        results.append({
-                            "content": chunk_data['text'],
-                            "metadata": {
-                                "doc_id": doc_id,
-                                "chunk_id": f"{doc_id}_{chunk_idx}",
-                                "chunk_index": chunk_idx,
-                                "engine": "openai_direct",
-                                "user_id": user_id
-                            },
-                            "doc_id": doc_id,
-                            "chunk_id": f"{doc_id}_{chunk_idx}",
-                            "similarity": similarity,
-                            "engine": "openai_direct"
-                        })
+            if mode in (SearchMode.DENSE, SearchMode.HYBRID):
+                dense = self._dense_search(shard, query_embedding, pool)
+                rankings.append([key for key, _ in dense])
+                for key, similarity in dense:
+                    scores.setdefault(key, {})["similarity"] = similarity
+            
+            if mode in (SearchMode.LEXICAL, SearchMode.HYBRID):
+                lexical = shard.lexical.search(query, pool)
+                rankings.append([key for key, _ in lexical])
+                for key, bm25 in lexical:
+                    scores.setdefault(key, {})["bm25_score"] = bm25
             
-            # Sort by similarity and return top 4
-            results.sort(key=lambda x: x['similarity'], reverse=True)
-            top_results = results[:4]
+            if mode == SearchMode.HYBRID:
+                fused = reciprocal_rank_fusion(rankings)[:k]
+                for key, rrf in fused:
+                    scores[key]["rrf_score"] = rrf
+                top_keys = [key for key, _ in fused]
+            else:
+                top_keys = rankings[0][:k]
             
-            logger.info(f"🔍 OpenAI Direct found {len(top_results)} relevant documents for user {user_id}")
+            top_results = []
+            for doc_id, chunk_idx in top_keys:
+                doc_data = shard.documents.get(doc_id)
+                chunk_data = next((c for c in doc_data['chunks'] if c['chunk_index'] == chunk_idx), None) if doc_data else None
+                if chunk_data is None:
+                    continue
+                chunk_id = chunk_data.get('chunk_id') or make_chunk_id(doc_id, chunk_idx, chunk_data['text'])
+                result = {
+                    "content": chunk_data['text'],
+                    "metadata": {
+                        "doc_id": doc_id,
+                        "chunk_id": chunk_id,
+                        "chunk_index": chunk_idx,
+                        "page_start": chunk_data.get('page_start'),
+                        "page_end": chunk_data.get('page_end'),
+                        "engine": "openai_direct",
+                        "user_id": user_id
+                    },
+                    "doc_id": doc_id,
+                    "chunk_id": chunk_id,
+                    "engine": "openai_direct",
+                    "search_mode": mode.value
+                }
+                result.update(scores[(doc_id, chunk_idx)])
+                top_results.append(result)
+            
+            logger.info(f"🔍 OpenAI Direct {mode.value} search found {len(top_results)} relevant documents for user {user_id}")
             return top_results
             
         except Exception as e:
             logger.error(f"❌ OpenAI Direct search failed: {str(e)}")
             return []
 
+    def _dense_search(self, shard, query_embedding: List[float], k: int) -> List[tuple]:
+        """Top-k ((doc_id, chunk_index), cosine similarity) over a shard"""
+        query_vector = normalize_rows([query_embedding])[0]
+        
+        # One product per shared segment matrix (one in total once compacted), not one per document.
+        # Rows are unit length, so the dot product is the cosine similarity.
+        candidates = []
+        for matrix, rows, keys in shard.dense_index():
+            similarities = (matrix @ query_vector)[rows]
+            top_k = min(k, len(keys))
+            top = np.argpartition(-similarities, top_k - 1)[:top_k]
+            candidates.extend((keys[i], float(similarities[i])) for i in top)
+        candidates.sort(key=lambda item: item[1], reverse=True)
+        return candidates[:k]
+
+    def _prepare_qa(self, question: str, user_id: str):
+        """Retrieve user-filtered context; returns (sources, chat messages) or (None, None) if nothing relevant"""
+        return self._build_qa_messages(question, self.search_documents(question, user_id, []))
+
+    async def _aprepare_qa(self, question: str, user_id: str):
+        return self._build_qa_messages(question, await self.asearch_documents(question, user_id, []))
+
+    def _build_qa_messages(self, question: str, search_results: List[Dict[str, Any]]):
+        if not search_results:
+            return None, None
+
+        context_parts = []
+        sources = []
+        for result in search_results:
+            context_parts.append(result['content'])
+            sources.append({
+                "doc_id": result['doc_id'],
+                "chunk_id": result['chunk_id'],
+                "content": result['content'][:200] + "..." if len(result['content']) > 200 else result['content']
+            })
+
+        combined_context = "\n\n".join(context_parts)
+
+        # Create Q&A prompt
+        qa_prompt = f"""Based on the following context, answer the question. If the answer is not in the context, say so.
+
+Context:
+{combined_context}
+
+Question: {question}
+
+Answer:"""
+        messages = [
+            {"role": "system", "content": "You are a helpful assistant that answers questions based on provided context."},
+            {"role": "user", "content": qa_prompt}
+        ]
+        return sources, messages
+
     def answer_question(self, question: str, user_id: str, context: str) -> Dict[str, Any]:
         """Answer questions using direct OpenAI calls with user-filtered context"""
         if not self._is_available:
             return {"answer": "OpenAI Direct not available", "confidence": 0.0, "sources": []}
         
         try:
-            # First, search for relevant documents (now user-filtered)
-            search_results = self.search_documents(question, user_id, [])  # Pass user_id
+            sources, messages = self._prepare_qa(question, user_id)
             
-            if not search_results:
+            if not sources:
                 return {
                     "answer": "No relevant documents found to answer the question.",
                     "confidence": 0.1,
@@ -259,40 +410,14 @@ Return ONLY valid JSON, no additional text.
                     "engine": "openai_direct"
                 }
             
-            # Prepare context from search results
-            context_parts = []
-            sources = []
-            
-            for result in search_results:
-                context_parts.append(result['content'])
-                sources.append({
-                    "doc_id": result['doc_id'],
-                    "chunk_id": result['chunk_id'],
-                    "content": result['content'][:200] + "..." if len(result['content']) > 200 else result['content']
-                })
-            
-            combined_context = "\n\n".join(context_parts)
-            
-            # Create Q&A prompt
-            qa_prompt = f"""Based on the following context, answer the question. If the answer is not in the context, say so.
-
-Context:
-{combined_context}
-
-Question: {question}
-
-Answer:"""
-            
             # Call OpenAI
             response = self.client.chat.completions.create(
                 model=settings.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that answers questions based on provided context."},
-                    {"role": "user", "content": qa_prompt}
-                ],
+                messages=messages,
                 max_tokens=settings.OPENAI_MAX_TOKENS,
                 temperature=0.1
             )
+            record_openai_usage(settings.OPENAI_MODEL, "qa", response.usage)
             
             answer = response.choices[0].message.content
             confidence = min(1.0, len(sources) * 0.25) if sources else 0.3
@@ -306,6 +431,90 @@ Answer:"""
             }
             
         except Exception as e:
+            record_openai_error(settings.OPENAI_MODEL, "qa", e)
+            logger.error(f"❌ OpenAI Direct Q&A failed: {str(e)}")
+            return {
+                "answer": f"Error: {str(e)}",
+                "confidence": 0.0,
+                "sources": [],
+                "method": "error",
+                "engine": "openai_direct"
+            }
+
+    def stream_answer(self, question: str, user_id: str) -> Iterator[Dict[str, Any]]:
+        """Sources as soon as retrieval finishes, then answer tokens as the model produces them"""
+        engine_name = self.engine_type.value
+        if not self._is_available:
+            yield {"event": "error", "data": {"message": "OpenAI Direct not available"}}
+            return
+
+        sources, messages = self._prepare_qa(question, user_id)
+        if not sources:
+            yield {"event": "sources", "data": {"sources": []}}
+            yield {"event": "token", "data": {"text": "No relevant documents found to answer the question."}}
+            yield {"event": "done", "data": {"confidence": 0.1, "method": "openai_direct_no_context", "engine": engine_name}}
+            return
+
+        yield {"event": "sources", "data": {"sources": sources}}
+
+        try:
+            stream = self.client.chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=messages,
+                max_tokens=settings.OPENAI_MAX_TOKENS,
+                temperature=0.1,
+                stream=True,
+                stream_options={"include_usage": True}  # usage arrives on a final chunk without choices
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield {"event": "token", "data": {"text": chunk.choices[0].delta.content}}
+                record_openai_usage(settings.OPENAI_MODEL, "qa", chunk.usage)
+        except Exception as e:
+            record_openai_error(settings.OPENAI_MODEL, "qa", e)
+            raise
+
+        yield {"event": "done", "data": {
+            "confidence": min(1.0, len(sources) * 0.25),
+            "method": "openai_direct_rag",
+            "engine": engine_name
+        }}
+
+    async def aanswer_question(self, question: str, user_id: str, context: str) -> Dict[str, Any]:
+        """answer_question on the async client: the completion wait holds no thread"""
+        if not self._is_available:
+            return {"answer": "OpenAI Direct not available", "confidence": 0.0, "sources": []}
+        
+        try:
+            sources, messages = await self._aprepare_qa(question, user_id)
+            
+            if not sources:
+                return {
+                    "answer": "No relevant documents found to answer the question.",
+                    "confidence": 0.1,
+                    "sources": [],
+                    "method": "openai_direct_no_context",
+                    "engine": "openai_direct"
+                }
+            
+            response = await self.async_client.chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=messages,
+                max_tokens=settings.OPENAI_MAX_TOKENS,
+                temperature=0.1
+            )
+            record_openai_usage(settings.OPENAI_MODEL, "qa", response.usage)
+            
+            return {
+                "answer": response.choices[0].message.content,
+                "confidence": min(1.0, len(sources) * 0.25),
+                "sources": sources,
+                "method": "openai_direct_rag",
+                "engine": "openai_direct"
+            }
+            
+        except Exception as e:
+            record_openai_error(settings.OPENAI_MODEL, "qa", e)
             logger.error(f"❌ OpenAI Direct Q&A failed: {str(e)}")
             return {
                 "answer": f"Error: {str(e)}",
@@ -314,6 +523,44 @@ Answer:"""
                 "method": "error",
                 "engine": "openai_direct"
             }
+
+    async def astream_answer(self, question: str, user_id: str) -> AsyncIterator[Dict[str, Any]]:
+        engine_name = self.engine_type.value
+        if not self._is_available:
+            yield {"event": "error", "data": {"message": "OpenAI Direct not available"}}
+            return
+
+        sources, messages = await self._aprepare_qa(question, user_id)
+        if not sources:
+            yield {"event": "sources", "data": {"sources": []}}
+            yield {"event": "token", "data": {"text": "No relevant documents found to answer the question."}}
+            yield {"event": "done", "data": {"confidence": 0.1, "method": "openai_direct_no_context", "engine": engine_name}}
+            return
+
+        yield {"event": "sources", "data": {"sources": sources}}
+
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=messages,
+                max_tokens=settings.OPENAI_MAX_TOKENS,
+                temperature=0.1,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield {"event": "token", "data": {"text": chunk.choices[0].delta.content}}
+                record_openai_usage(settings.OPENAI_MODEL, "qa", chunk.usage)
+        except Exception as e:
+            record_openai_error(settings.OPENAI_MODEL, "qa", e)
+            raise
+
+        yield {"event": "done", "data": {
+            "confidence": min(1.0, len(sources) * 0.25),
+            "method": "openai_direct_rag",
+            "engine": engine_name
+        }}
     
     def add_document_to_vectorstore(self, doc_id: str, text: str, user_id: str) -> bool:
         """Add document to custom OpenAI Direct vector store with user isolation"""
@@ -322,35 +569,57 @@ Answer:"""
             return False
             
         try:
-            # Chunk the text
-            chunks = self._chunk_text(text)
+            # Page-aware, token-sized chunks shared with the other engines
+            chunks = chunk_document(text)
+            ids = [make_chunk_id(doc_id, chunk["chunk_index"], chunk["text"]) for chunk in chunks]
+            
+            # Embeddings already stored for this document, keyed by content-derived chunk id
+            shard = self.store.shard(user_id)
+            previous = shard.documents.get(doc_id)
+            existing = {}
+            if previous is not None and previous["embeddings"] is not None:
+                for row, chunk in enumerate(previous["chunks"]):
+                    chunk_id = chunk.get('chunk_id') or make_chunk_id(doc_id, chunk['chunk_index'], chunk['text'])
+                    existing[chunk_id] = row
+                if [c.get('chunk_id') for c in previous["chunks"]] == ids:
+                    logger.info(f"⏭️ OpenAI Direct document {doc_id} unchanged ({len(ids)} chunks), skipping re-embedding")
+                    return True
             
-            # Create embeddings for each chunk
+            # Embed only chunks whose ids are new, in batched calls; reuse stored (already normalized) rows for the rest
+            missing = [i for i in range(len(chunks)) if ids[i] not in existing]
+            new_embeddings = dict(zip(missing, self._create_embeddings([chunks[i]["text"] for i in missing])))
+            failed = [i for i in missing if not new_embeddings[i]]
+            if failed:
+                # Storing the rest would mark the document indexed with holes, and a retry would then see it unchanged
+                logger.error(f"❌ OpenAI Direct could not embed {len(failed)} of {len(chunks)} chunks of document {doc_id}; not stored")
+                return False
             chunk_data = []
+            rows = []
+            embedded = 0
             for i, chunk in enumerate(chunks):
-                embedding = self._create_embedding(chunk)
-                if embedding:
-                    chunk_data.append({
-                        'text': chunk,
-                        'embedding': embedding,
-                        'chunk_index': i
-                    })
-            
-            # Store document with user metadata
-            self.documents[doc_id] = {
-                'text': text,
-                'chunks': chunk_data,
-                'metadata': {
-                    'total_chunks': len(chunk_data),
-                    'engine': 'openai_direct',
-                    'user_id': user_id  # Store user_id for filtering
-                }
-            }
+                if ids[i] in existing:
+                    row = np.array(previous["embeddings"][existing[ids[i]]], dtype=np.float32)
+                else:
+                    row = normalize_rows([new_embeddings[i]])[0]
+                    embedded += 1
+                chunk_data.append({**chunk, 'chunk_id': ids[i]})
+                rows.append(row)
             
-            # Save to disk
-            self._save_vector_store()
+            # Append to the shared store with user metadata; other processes pick it up on refresh
+            with tracer.start_as_current_span("vectorstore.write", attributes={"vectorstore": "sharded_numpy", "document.id": doc_id, "chunks": len(chunk_data)}):
+                self.store.put(
+                    user_id,
+                    doc_id,
+                    chunks=chunk_data,
+                    embeddings=np.vstack(rows) if rows else normalize_rows([]),
+                    metadata={
+                        'total_chunks': len(chunk_data),
+                        'engine': 'openai_direct',
+                        'user_id': user_id  # Store user_id for filtering
+                    }
+                )
             
-            logger.info(f"✅ OpenAI Direct added document {doc_id} for user {user_id} ({len(chunk_data)} chunks)")
+            logger.info(f"✅ OpenAI Direct upserted document {doc_id} for user {user_id} ({len(chunk_data)} chunks, {embedded} embedded, {len(chunk_data) - embedded} reused)")
             return True
             
         except Exception as e:
@@ -364,41 +633,56 @@ Answer:"""
             return False
             
         try:
-            if doc_id in self.documents:
-                # Verify user ownership before deletion
-                doc_user_id = self.documents[doc_id].get('metadata', {}).get('user_id')
-                if doc_user_id != user_id:
-                    logger.warning(f"User {user_id} attempted to delete document {doc_id} owned by {doc_user_id}")
-                    return False
-                
-                # Remove document
-                del self.documents[doc_id]
-                
-                # Save to disk
-                self._save_vector_store()
+            # Shards are per user, so a user can only ever delete from their own documents
+            shard = self.store.shard(user_id)
+            if doc_id in shard.documents:
+                self.store.delete(user_id, doc_id)
                 
                 logger.info(f"✅ OpenAI Direct removed document {doc_id} for user {user_id}")
                 return True
             else:
-                logger.info(f"Document {doc_id} not found in OpenAI Direct vector store")
+                logger.info(f"Document {doc_id} not found in OpenAI Direct vector store for user {user_id}")
                 return True  # Consider it successful if document wasn't there
                 
         except Exception as e:
             logger.error(f"❌ OpenAI Direct failed to remove document {doc_id}: {str(e)}")
             return False
     
+    def remove_documents_from_vectorstore(self, doc_ids: List[str], user_id: str) -> bool:
+        """Remove many documents from the user's shard under one lock acquisition"""
+        if not self._is_available:
+            logger.error("OpenAI Direct engine not available")
+            return False
+        try:
+            self.store.delete_many(user_id, list(dict.fromkeys(doc_ids)))
+            logger.info(f"✅ OpenAI Direct removed {len(doc_ids)} document(s) for user {user_id}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ OpenAI Direct failed to remove documents for user {user_id}: {str(e)}")
+            return False
+
+    def list_stored_documents(self, user_id: Optional[str] = None) -> Optional[Dict[str, Set[str]]]:
+        if not self._is_available:
+            return None
+        return self.store.list_documents(user_id)
+
+    def compact_vectorstore(self) -> Dict[str, int]:
+        return self.store.compact()
+
     def get_engine_info(self) -> Dict[str, Any]:
         return {
             "engine_type": self.engine_type.value,
             "model": settings.OPENAI_MODEL,
             "is_available": self._is_available,
-            "documents_stored": len(self.documents),
+            "documents_stored": self.store.stats()["resident_documents"],
+            "vector_store": self.store.stats(),
             "features": {
                 "document_classification": True,
                 "information_extraction": True,
                 "document_search": True,
                 "question_answering": True,
-                "vector_storage": True
+                "vector_storage": True,
+                "hybrid_search": True
             },
             "rag_implementation": "openai_direct_custom",
             "version": "1.0.0"
@@ -412,5 +696,9 @@ Answer:"""
     def is_available(self) -> bool:
         return self._is_available
 
+    @property
+    def supported_search_modes(self) -> List[SearchMode]:
+        return [SearchMode.DENSE, SearchMode.LEXICAL, SearchMode.HYBRID]
+
 # Register the engine
 WorkflowEngineFactory.register_engine(WorkflowEngineType.OPENAI_DIRECT, OpenAIDirectEngine)
\ No newline at end of file
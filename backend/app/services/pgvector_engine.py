@@ -0,0 +1,330 @@
+from typing import Dict, Any, List, Optional, Set
+import logging
+import uuid
+from datetime import datetime
+from sqlalchemy import select, delete, func, text as sql_text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models import Document, DocumentType, DocumentChunk
+from app.services.workflow_engine import WorkflowEngineType, WorkflowEngineFactory, SearchMode, run_in_engine_pool
+from app.services.openai_direct_engine import OpenAIDirectEngine
+from app.services.chunking import make_chunk_id, chunk_document
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+class PgVectorEngine(OpenAIDirectEngine):
+    """
+    OpenAI Direct classification and Q&A, with chunks and embeddings stored in
+    Postgres (pgvector) next to the documents table instead of on local disk.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._iterative_scan = False  # pgvector >= 0.8 can keep scanning HNSW until enough rows pass the filters
+
+    def _create_store(self):
+        # Chunks live in Postgres; no local shards
+        return None
+
+    def initialize(self) -> bool:
+        """Initialize OpenAI client and check that the pgvector schema is in place"""
+        if not settings.OPENAI_API_KEY or not settings.OPENAI_API_KEY.strip().startswith('sk-'):
+            logger.warning("⚠️ OpenAI API key not found for pgvector engine")
+            self._is_available = False
+            return False
+
+        db = SessionLocal()
+        try:
+            from openai import OpenAI, AsyncOpenAI
+            self.client = OpenAI(api_key=settings.OPENAI_API_KEY.strip())
+            self.async_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY.strip())
+
+            has_extension = db.execute(sql_text("SELECT 1 FROM pg_extension WHERE extname = 'vector'")).first()
+            has_table = db.execute(sql_text("SELECT to_regclass('document_chunks')")).scalar()
+            if not has_extension or not has_table:
+                logger.warning("⚠️ pgvector extension or document_chunks table missing - run alembic upgrade head")
+                self._is_available = False
+                return False
+
+            version = db.execute(sql_text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+            self._iterative_scan = tuple(int(part) for part in version.split(".")[:2]) >= (0, 8)
+            if not self._iterative_scan:
+                logger.info(f"pgvector {version} has no iterative index scans; filtered searches fall back to exact scans when short")
+
+            self._is_available = True
+            logger.info("✅ pgvector engine initialized")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize pgvector engine: {str(e)}")
+            self._is_available = False
+            return False
+        finally:
+            db.close()
+
+    def check_readiness(self) -> Dict[str, Any]:
+        """Side-effect-free connectivity check: OpenAI model lookup and a database round trip"""
+        result = super().check_readiness()
+        db = SessionLocal()
+        try:
+            db.execute(sql_text("SELECT 1"))
+            result["checks"]["postgres"] = "ok"
+        except Exception as e:
+            result["checks"]["postgres"] = f"error: {str(e)}"
+        finally:
+            db.close()
+        result["ready"] = self._is_available and all(v == "ok" for v in result["checks"].values())
+        return result
+
+    def search_documents(self, query: str, user_id: str, documents: List[str], filters: Optional[Dict[str, Any]] = None, mode: SearchMode = SearchMode.DENSE, k: int = 4) -> List[Dict[str, Any]]:
+        """
+        Similarity search in one SQL statement, optionally filtered by
+        document_type / created_after / created_before on the documents table.
+        """
+        if not self._is_available:
+            logger.error("pgvector engine not available for search")
+            return []
+
+        query_embedding = self._query_embedding(query)
+        if not query_embedding:
+            return []
+        return self._query_chunks(query_embedding, user_id, documents, filters or {}, k)
+
+    async def asearch_documents(self, query: str, user_id: str, documents: List[str], filters: Optional[Dict[str, Any]] = None, mode: SearchMode = SearchMode.DENSE, k: int = 4) -> List[Dict[str, Any]]:
+        """Embedding awaited on the async client; the SQL query runs in the engine pool"""
+        if not self._is_available:
+            logger.error("pgvector engine not available for search")
+            return []
+
+        query_embedding = await self._aquery_embedding(query)
+        if not query_embedding:
+            return []
+        return await run_in_engine_pool(self._query_chunks, query_embedding, user_id, documents, filters or {}, k)
+
+    def _query_chunks(self, query_embedding: List[float], user_id: str, documents: List[str], filters: Dict[str, Any], k: int) -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            distance = DocumentChunk.embedding.cosine_distance(query_embedding).label("distance")
+            stmt = (
+                select(
+                    DocumentChunk.document_id, DocumentChunk.chunk_index, DocumentChunk.content,
+                    DocumentChunk.page_start, DocumentChunk.page_end, distance
+                )
+                .join(Document, Document.id == DocumentChunk.document_id)
+                .where(DocumentChunk.user_id == user_id)
+            )
+            if documents:
+                stmt = stmt.where(DocumentChunk.document_id.in_(documents))
+            if filters.get("document_type"):
+                stmt = stmt.where(Document.ai_document_type == DocumentType(filters["document_type"].lower()))
+            if filters.get("created_after"):
+                stmt = stmt.where(Document.created_at >= filters["created_after"])
+            if filters.get("created_before"):
+                stmt = stmt.where(Document.created_at < filters["created_before"])
+            stmt = stmt.order_by(distance).limit(k)
+
+            # HNSW filters after the index scan; a wider candidate list keeps selective filters from starving the top-k
+            db.execute(sql_text(f"SET LOCAL hnsw.ef_search = {int(settings.PGVECTOR_EF_SEARCH)}"))
+            if self._iterative_scan:
+                db.execute(sql_text("SET LOCAL hnsw.iterative_scan = strict_order"))
+            rows = db.execute(stmt).all()
+            if len(rows) < k and not self._iterative_scan:
+                # Short either because fewer than k chunks match (usual for a small tenant: nothing to fix) or
+                # because ef_search candidates ran out before the filters let k through. Iterative scans keep
+                # going in the second case; without them, count the matches to tell the two apart.
+                matching = db.scalar(stmt.with_only_columns(func.count(), maintain_column_froms=True).order_by(None).limit(None))
+                if matching > len(rows):
+                    # Rank the matching chunks exactly instead, through the user_id index
+                    db.execute(sql_text("SET LOCAL enable_indexscan = off"))
+                    rows = db.execute(stmt).all()
+
+            results = []
+            for row in rows:
+                doc_id = str(row.document_id)
+                chunk_id = make_chunk_id(doc_id, row.chunk_index, row.content)
+                results.append({
+                    "content": row.content,
+                    "metadata": {
+                        "doc_id": doc_id,
+                        "chunk_id": chunk_id,
+                        "chunk_index": row.chunk_index,
+                        "page_start": row.page_start,
+                        "page_end": row.page_end,
+                        "engine": "pgvector",
+                        "user_id": user_id
+                    },
+                    "doc_id": doc_id,
+                    "chunk_id": chunk_id,
+                    "similarity": 1.0 - float(row.distance),
+                    "engine": "pgvector"
+                })
+
+            logger.info(f"🔍 pgvector found {len(results)} relevant documents for user {user_id}")
+            return results
+
+        except Exception as e:
+            logger.error(f"❌ pgvector search failed: {str(e)}")
+            return []
+        finally:
+            db.rollback()
+            db.close()
+
+    def add_document_to_vectorstore(self, doc_id: str, text: str, user_id: str) -> bool:
+        """Replace the document's chunks in the document_chunks table"""
+        if not self._is_available:
+            logger.error("pgvector engine not available")
+            return False
+
+        db = SessionLocal()
+        try:
+            chunks = chunk_document(text)
+            ids = [make_chunk_id(doc_id, chunk["chunk_index"], chunk["text"]) for chunk in chunks]
+
+            # Reuse embeddings of rows whose content-derived id is unchanged
+            stored = db.execute(
+                select(DocumentChunk.chunk_index, DocumentChunk.content, DocumentChunk.embedding)
+                .where(DocumentChunk.document_id == doc_id)
+            ).all()
+            existing = {make_chunk_id(doc_id, row.chunk_index, row.content): row.embedding for row in stored}
+            if sorted(existing) == sorted(ids) and len(stored) == len(ids):
+                logger.info(f"⏭️ pgvector document {doc_id} unchanged ({len(ids)} chunks), skipping re-embedding")
+                return True
+
+            missing = [i for i in range(len(chunks)) if ids[i] not in existing]
+            new_embeddings = dict(zip(missing, self._create_embeddings([chunks[i]["text"] for i in missing])))
+            failed = [i for i in missing if not new_embeddings[i]]
+            if failed:
+                # Storing the rest would mark the document indexed with holes, and a retry would then see it unchanged
+                logger.error(f"❌ pgvector could not embed {len(failed)} of {len(chunks)} chunks of document {doc_id}; not stored")
+                return False
+            rows = []
+            for i, chunk in enumerate(chunks):
+                embedding = existing.get(ids[i])
+                if embedding is None:
+                    embedding = new_embeddings[i]
+                rows.append({
+                    "id": uuid.uuid4(),
+                    "document_id": doc_id,
+                    "user_id": user_id,
+                    "chunk_index": chunk["chunk_index"],
+                    "content": chunk["text"],
+                    "page_start": chunk["page_start"],
+                    "page_end": chunk["page_end"],
+                    "token_count": chunk["token_count"],
+                    "embedding": embedding,
+                })
+
+            with tracer.start_as_current_span("vectorstore.write", attributes={"vectorstore": "pgvector", "document.id": doc_id, "chunks": len(rows)}):
+                # Upsert on (document_id, chunk_index): a retry racing another attempt overwrites rows instead of duplicating them
+                if rows:
+                    stmt = pg_insert(DocumentChunk).values(rows)
+                    stmt = stmt.on_conflict_do_update(
+                        constraint="uq_document_chunks_document_chunk",
+                        set_={
+                            column: stmt.excluded[column]
+                            for column in ("user_id", "content", "page_start", "page_end", "token_count", "embedding")
+                        } | {"updated_at": datetime.utcnow()},
+                    )
+                    db.execute(stmt)
+                # Chunks past the new end are stale
+                db.execute(delete(DocumentChunk).where(
+                    DocumentChunk.document_id == doc_id,
+                    DocumentChunk.chunk_index.notin_([row["chunk_index"] for row in rows])
+                ))
+                db.commit()
+
+            logger.info(f"✅ pgvector upserted document {doc_id} for user {user_id} ({len(rows)} chunks, {len(missing)} embedded)")
+            return True
+
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ pgvector failed to add document {doc_id}: {str(e)}")
+            return False
+        finally:
+            db.close()
+
+    def remove_document_from_vectorstore(self, doc_id: str, user_id: str) -> bool:
+        """Remove the document's chunks from the document_chunks table"""
+        return self.remove_documents_from_vectorstore([doc_id], user_id)
+
+    def remove_documents_from_vectorstore(self, doc_ids: List[str], user_id: str) -> bool:
+        """Remove chunks of many documents in one DELETE"""
+        if not self._is_available:
+            logger.error("pgvector engine not available")
+            return False
+
+        doc_ids = list(dict.fromkeys(doc_ids))
+        if not doc_ids:
+            return True
+
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                delete(DocumentChunk).where(
+                    DocumentChunk.document_id.in_(doc_ids),
+                    DocumentChunk.user_id == user_id
+                )
+            )
+            db.commit()
+            logger.info(f"✅ pgvector removed {len(doc_ids)} document(s) ({result.rowcount} chunks) for user {user_id}")
+            return True
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ pgvector failed to remove documents {doc_ids[:5]}: {str(e)}")
+            return False
+        finally:
+            db.close()
+
+    def list_stored_documents(self, user_id: Optional[str] = None) -> Optional[Dict[str, Set[str]]]:
+        if not self._is_available:
+            return None
+        db = SessionLocal()
+        try:
+            stmt = select(DocumentChunk.user_id, DocumentChunk.document_id).distinct()
+            if user_id:
+                stmt = stmt.where(DocumentChunk.user_id == user_id)
+            listing: Dict[str, Set[str]] = {}
+            for row in db.execute(stmt):
+                listing.setdefault(str(row.user_id), set()).add(str(row.document_id))
+            return listing
+        finally:
+            db.close()
+
+    def compact_vectorstore(self) -> Dict[str, int]:
+        # Rows cascade with documents and autovacuum reclaims dead tuples; nothing to rewrite here
+        return {}
+
+    def get_engine_info(self) -> Dict[str, Any]:
+        return {
+            "engine_type": self.engine_type.value,
+            "model": settings.OPENAI_MODEL,
+            "is_available": self._is_available,
+            "features": {
+                "document_classification": True,
+                "information_extraction": True,
+                "document_search": True,
+                "question_answering": True,
+                "vector_storage": True,
+                "search_filters": True
+            },
+            "rag_implementation": "pgvector_hnsw",
+            "version": "1.0.0"
+        }
+
+    @property
+    def engine_type(self) -> WorkflowEngineType:
+        return WorkflowEngineType.PGVECTOR
+
+    @property
+    def supported_search_modes(self) -> List[SearchMode]:
+        # Keyword matching for this engine is served by /keyword-search on the documents table
+        return [SearchMode.DENSE]
+
+    @property
+    def supports_search_filters(self) -> bool:
+        return True
+
+# Register the engine
+WorkflowEngineFactory.register_engine(WorkflowEngineType.PGVECTOR, PgVectorEngine)
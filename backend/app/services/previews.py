@@ -0,0 +1,82 @@
+from typing import Iterable, Optional
+import io
+import logging
+
+from PIL import Image
+
+from app.core.config import settings
+from app.models import Document, FileType
+from app.services.storage import storage
+
+logger = logging.getLogger(__name__)
+
+PREVIEWABLE_TYPES = (FileType.PDF, FileType.PNG, FileType.JPG)
+
+def preview_prefix(document_id) -> str:
+    return f"previews/{document_id}/"
+
+def preview_key(document_id, page_number: int) -> str:
+    # Width is part of the key so changing PREVIEW_MAX_WIDTH never serves stale sizes
+    return f"{preview_prefix(document_id)}page-{page_number}-{settings.PREVIEW_MAX_WIDTH}.webp"
+
+def render_thumbnail(image: Image.Image) -> bytes:
+    """Low-resolution WebP of one page, at most PREVIEW_MAX_WIDTH wide"""
+    thumbnail = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    thumbnail.thumbnail((settings.PREVIEW_MAX_WIDTH, settings.PREVIEW_MAX_WIDTH * 4))
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="WEBP", quality=settings.PREVIEW_QUALITY, method=4)
+    return buffer.getvalue()
+
+def store_previews(document_id, images: Iterable[Image.Image]) -> int:
+    """Thumbnails for pages already rasterized for OCR; a failure here only means a lazy render later"""
+    stored = 0
+    for page_number, image in enumerate(images, start=1):
+        try:
+            storage.save(preview_key(document_id, page_number), io.BytesIO(render_thumbnail(image)))
+            stored += 1
+        except Exception as e:
+            logger.warning(f"⚠️ Preview for page {page_number} of {document_id} failed: {str(e)}")
+    return stored
+
+def _rasterize_page(document: Document, page_number: int) -> Optional[Image.Image]:
+    """Render one page from the original file at PREVIEW_DPI (cheap next to the OCR resolution)"""
+    with storage.local_path(document.file_path) as path:
+        if document.file_type == FileType.PDF:
+            from pdf2image import convert_from_path
+            from app.tasks.document_processing import POPPLER_PATH
+            images = convert_from_path(
+                str(path), dpi=settings.PREVIEW_DPI, first_page=page_number, last_page=page_number,
+                poppler_path=POPPLER_PATH,
+            )
+            return images[0] if images else None
+        if page_number != 1:
+            return None
+        with Image.open(path) as image:
+            image.load()
+            return image.copy()
+
+def get_preview(document: Document, page_number: int) -> Optional[bytes]:
+    """
+    WebP thumbnail of a page: the stored one, or rendered and stored now for
+    documents processed before previews existed (or whose OCR path never
+    rasterized). Blocking; call from a worker thread.
+    """
+    if document.file_type not in PREVIEWABLE_TYPES:
+        return None
+
+    key = preview_key(document.id, page_number)
+    try:
+        return b"".join(storage.iter_range(key))
+    except FileNotFoundError:
+        pass
+
+    image = _rasterize_page(document, page_number)
+    if image is None:
+        return None
+    data = render_thumbnail(image)
+    storage.save(key, io.BytesIO(data))
+    logger.info(f"🖼️ Rendered preview for page {page_number} of {document.id} on demand")
+    return data
+
+def delete_previews(document_id):
+    storage.delete_prefix(preview_prefix(document_id))
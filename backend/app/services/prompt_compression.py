@@ -0,0 +1,102 @@
+from typing import Dict, Any, List
+import re
+
+from app.core.config import settings
+from app.services.chunking import PAGE_MARKER, chunk_document, count_tokens
+
+# Terms that tell document types apart; windows dense in these are worth the classifier's budget
+CLASSIFICATION_KEYWORDS = {
+    "invoice", "bill", "amount", "due", "total", "subtotal", "tax", "vat", "payment", "remit", "balance",
+    "contract", "agreement", "party", "parties", "terms", "effective", "termination", "hereby", "whereas", "signature",
+    "receipt", "purchase", "transaction", "merchant", "change", "cash", "card", "paid",
+    "form", "application", "applicant", "field", "submit", "checkbox",
+    "dear", "sincerely", "regards", "letter",
+    "report", "summary", "findings", "conclusion", "analysis", "quarter",
+}
+WORD = re.compile(r"[a-z]+")
+FIGURE = re.compile(r"[$€£]\s?\d|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}|#\s?\d+")
+
+HORIZONTAL_SPACE = re.compile(r"[ \t\f\v]+")
+BLANK_LINES = re.compile(r"\n{3,}")
+GAP = "\n[...]\n"
+
+def _is_noise_line(line: str) -> bool:
+    """OCR debris: lines that are mostly symbols, or scattered single characters"""
+    stripped = line.strip()
+    if not stripped:
+        return False
+    alnum = sum(ch.isalnum() for ch in stripped)
+    if alnum / len(stripped) < 0.5:
+        return True
+    tokens = stripped.split()
+    return len(tokens) >= 4 and sum(len(token) == 1 for token in tokens) / len(tokens) > 0.6
+
+def normalize_text(text: str) -> str:
+    """Drop page markers and OCR noise lines, collapse whitespace runs"""
+    text = PAGE_MARKER.sub("", text)
+    lines = [HORIZONTAL_SPACE.sub(" ", line).strip() for line in text.splitlines()]
+    text = "\n".join(line for line in lines if not _is_noise_line(line))
+    return BLANK_LINES.sub("\n\n", text).strip()
+
+def _keyword_density(window: str) -> float:
+    words = WORD.findall(window.lower())
+    if not words:
+        return 0.0
+    hits = sum(word in CLASSIFICATION_KEYWORDS for word in words) + len(FIGURE.findall(window))
+    return hits / len(words)
+
+def compress_for_classification(text: str, budget_tokens: int = None) -> Dict[str, Any]:
+    """
+    Fit a document into budget_tokens for the classifier: the head (letterhead,
+    title), the tail (totals, signatures) and the most keyword-dense windows in
+    between, kept in document order. Returns the text and before/after token counts.
+    """
+    budget = budget_tokens or settings.CLASSIFICATION_INPUT_TOKENS
+    normalized = normalize_text(text)
+    original_tokens = count_tokens(text)
+    normalized_tokens = count_tokens(normalized)
+
+    if normalized_tokens <= budget:
+        return {"text": normalized, "original_tokens": original_tokens, "compressed_tokens": normalized_tokens, "windows": None}
+
+    window_tokens = max(32, budget // settings.CLASSIFICATION_WINDOWS)
+    windows: List[str] = [c["text"] for c in chunk_document(normalized, chunk_tokens=window_tokens, overlap_tokens=0)]
+    sizes = [count_tokens(window) for window in windows]
+
+    selected = set()
+    used = 0
+
+    def take(i: int) -> bool:
+        nonlocal used
+        if i in selected or used + sizes[i] > budget:
+            return False
+        selected.add(i)
+        used += sizes[i]
+        return True
+
+    # Head gets ~40% of the budget, the last window is the tail, keyword-dense windows fill the rest
+    for i in range(len(windows)):
+        if used >= budget * 0.4 or not take(i):
+            break
+    if windows:
+        take(len(windows) - 1)
+    for i in sorted(range(len(windows)), key=lambda i: _keyword_density(windows[i]), reverse=True):
+        take(i)
+
+    parts = []
+    previous = -1
+    for i in sorted(selected):
+        if parts and i != previous + 1:
+            parts.append(GAP)
+        elif parts:
+            parts.append("\n\n")
+        parts.append(windows[i])
+        previous = i
+    compressed = "".join(parts)
+
+    return {
+        "text": compressed,
+        "original_tokens": original_tokens,
+        "compressed_tokens": count_tokens(compressed),
+        "windows": f"{len(selected)}/{len(windows)}",
+    }
@@ -0,0 +1,128 @@
+from typing import Dict, Any, List, Optional
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import threading
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split())
+
+
+class QueryEmbeddingCache:
+    """In-process LRU of query embeddings keyed by (model, normalized query)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        key = (model, normalize_query(query))
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, model: str, query: str, embedding: List[float]):
+        if not embedding:
+            return
+        with self._lock:
+            self._entries[(model, normalize_query(query))] = embedding
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class SearchResultCache:
+    """
+    Search results in Redis keyed by (user, engine, corpus version, normalized
+    query, k, mode, filters). Adding or removing any of a user's documents bumps
+    the corpus version, so older entries are never read again and expire by TTL.
+    The key hash doubles as the response ETag. Redis errors degrade to a miss.
+    """
+
+    def __init__(self):
+        self._sync_client = None
+        self._async_client = None
+
+    def _redis(self):
+        if self._sync_client is None:
+            import redis
+            self._sync_client = redis.Redis.from_url(settings.REDIS_URL)
+        return self._sync_client
+
+    def _aredis(self):
+        if self._async_client is None:
+            import redis.asyncio
+            self._async_client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+        return self._async_client
+
+    def bump_corpus_version(self, user_id: str):
+        """Called whenever a user's documents are added to or removed from a vector store"""
+        try:
+            self._redis().incr(f"corpus_version:{user_id}")
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to bump corpus version for user {user_id}: {str(e)}")
+
+    def current_corpus_version(self, user_id: str) -> Optional[int]:
+        """Blocking read of corpus_version, for engine code running in worker threads; None if Redis is unavailable"""
+        try:
+            return int(self._redis().get(f"corpus_version:{user_id}") or 0)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to read corpus version for user {user_id}: {str(e)}")
+            return None
+
+    async def corpus_version(self, user_id: str) -> Optional[int]:
+        try:
+            return int(await self._aredis().get(f"corpus_version:{user_id}") or 0)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to read corpus version for user {user_id}: {str(e)}")
+            return None
+
+    @staticmethod
+    def make_etag(user_id: str, engine: str, version: int, query: str, k: int, mode: str, filters: Dict[str, Any]) -> str:
+        key = json.dumps([user_id, engine, version, normalize_query(query), k, mode, filters], sort_keys=True, default=str)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+    async def get(self, etag: str) -> Optional[List[Dict[str, Any]]]:
+        if not settings.SEARCH_CACHE_ENABLED:
+            return None
+        try:
+            raw = await self._aredis().get(f"search_cache:{etag}")
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"⚠️ Search cache lookup failed: {str(e)}")
+            return None
+
+    async def put(self, etag: str, results: List[Dict[str, Any]]):
+        if not settings.SEARCH_CACHE_ENABLED:
+            return
+        try:
+            await self._aredis().set(f"search_cache:{etag}", json.dumps(results, default=str), ex=settings.SEARCH_CACHE_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"⚠️ Search cache store failed: {str(e)}")
+
+
+query_embedding_cache = QueryEmbeddingCache(settings.QUERY_EMBEDDING_CACHE_SIZE)
+search_result_cache = SearchResultCache()
@@ -0,0 +1,230 @@
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterator, Optional
+from contextlib import contextmanager
+from pathlib import Path
+import logging
+import os
+import shutil
+import tempfile
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class StorageBackend(ABC):
+    """
+    Where uploaded files live. Document.file_path holds the key returned by
+    save(); API and workers only go through this interface, so they need no
+    shared filesystem when the backend is remote.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def save(self, key: str, fileobj: BinaryIO) -> str:
+        """Stream fileobj to key and return the key to store on the document"""
+        pass
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        """Size in bytes; raises FileNotFoundError if the object is missing"""
+        pass
+
+    @abstractmethod
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """Bytes start..end (inclusive) in chunks, never the whole object in memory"""
+        pass
+
+    @abstractmethod
+    def local_path(self, key: str):
+        """Context manager yielding a local file with the object's content, for libraries that need a path (pdf2image, pdfplumber)"""
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete every object whose key starts with prefix (a "directory" such as a document's previews)"""
+        pass
+
+    def relative_path(self, key: str) -> Optional[str]:
+        """Path under UPLOAD_DIR that a front proxy can serve directly, or None if the file isn't on its disk"""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """Files under UPLOAD_DIR on the local disk (or a volume shared by API and workers)"""
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        path = Path(key)
+        # Documents uploaded before the storage layer stored the full upload path, not a key
+        if path.is_absolute() or path.parts[:len(self.root.parts)] == self.root.parts:
+            return path
+        return self.root / path
+
+    def save(self, key: str, fileobj: BinaryIO) -> str:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(fileobj, out, settings.STORAGE_STREAM_CHUNK_BYTES)
+        return key
+
+    def size(self, key: str) -> int:
+        return self._path(key).stat().st_size
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        chunk_size = chunk_size or settings.STORAGE_STREAM_CHUNK_BYTES
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    @contextmanager
+    def local_path(self, key: str) -> Iterator[Path]:
+        path = self._path(key)
+        if not path.exists():
+            raise FileNotFoundError(str(path))
+        yield path
+
+    def delete(self, key: str) -> bool:
+        try:
+            self._path(key).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def delete_prefix(self, prefix: str) -> int:
+        directory = self._path(prefix)
+        if not directory.is_dir():
+            return 0
+        removed = sum(1 for path in directory.rglob("*") if path.is_file())
+        shutil.rmtree(directory, ignore_errors=True)
+        return removed
+
+    def relative_path(self, key: str) -> Optional[str]:
+        try:
+            return self._path(key).resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return None
+
+
+class S3Storage(StorageBackend):
+    """Any S3-compatible object store (AWS S3, MinIO); uploads are multipart and downloads ranged GETs"""
+
+    name = "s3"
+
+    def __init__(self):
+        self.bucket = settings.S3_BUCKET
+        self._s3 = None
+
+    def _client(self):
+        if self._s3 is None:
+            import boto3
+            self._s3 = boto3.client(
+                "s3",
+                endpoint_url=settings.S3_ENDPOINT_URL,
+                aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+                aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+                region_name=settings.S3_REGION,
+            )
+            self._ensure_bucket()
+        return self._s3
+
+    def _ensure_bucket(self):
+        from botocore.exceptions import ClientError
+        try:
+            self._s3.head_bucket(Bucket=self.bucket)
+        except ClientError:
+            # Convenient for a fresh MinIO; on AWS the bucket is normally provisioned up front
+            self._s3.create_bucket(Bucket=self.bucket)
+            logger.info(f"🪣 Created storage bucket {self.bucket}")
+
+    def save(self, key: str, fileobj: BinaryIO) -> str:
+        from boto3.s3.transfer import TransferConfig
+        config = TransferConfig(
+            multipart_threshold=settings.STORAGE_MULTIPART_CHUNK_BYTES,
+            multipart_chunksize=settings.STORAGE_MULTIPART_CHUNK_BYTES,
+        )
+        self._client().upload_fileobj(fileobj, self.bucket, key, Config=config)
+        return key
+
+    @staticmethod
+    def _is_missing(error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def size(self, key: str) -> int:
+        from botocore.exceptions import ClientError
+        try:
+            return self._client().head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except ClientError as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(key)
+            raise
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        from botocore.exceptions import ClientError
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        try:
+            body = self._client().get_object(Bucket=self.bucket, Key=key, Range=byte_range)["Body"]
+        except ClientError as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(key)
+            raise
+        try:
+            yield from body.iter_chunks(chunk_size or settings.STORAGE_STREAM_CHUNK_BYTES)
+        finally:
+            body.close()
+
+    @contextmanager
+    def local_path(self, key: str) -> Iterator[Path]:
+        # Streamed to a temp file in chunks; removed as soon as the caller is done with it
+        fd, tmp = tempfile.mkstemp(suffix=Path(key).suffix or None, prefix="docproc_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                self._client().download_fileobj(self.bucket, key, f)
+            yield Path(tmp)
+        finally:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+
+    def delete(self, key: str) -> bool:
+        self._client().delete_object(Bucket=self.bucket, Key=key)
+        return True
+
+    def delete_prefix(self, prefix: str) -> int:
+        client = self._client()
+        removed = 0
+        for page in client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix):
+            keys = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            if keys:
+                client.delete_objects(Bucket=self.bucket, Delete={"Objects": keys, "Quiet": True})
+                removed += len(keys)
+        return removed
+
+
+def create_storage() -> StorageBackend:
+    backend = settings.STORAGE_BACKEND.lower()
+    if backend == "s3":
+        return S3Storage()
+    if backend != "local":
+        logger.warning(f"⚠️ Unknown STORAGE_BACKEND {settings.STORAGE_BACKEND!r}, using local disk")
+    return LocalStorage(settings.UPLOAD_DIR)
+
+
+storage = create_storage()
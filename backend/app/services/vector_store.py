@@ -0,0 +1,543 @@
+from typing import Dict, Any, List, Optional, Set, Tuple
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from app.services.lexical_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock_file(fh):
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(fh):
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(fh):
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(fh):
+        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def _atomic_write(path: Path, data: bytes):
+    """Write a file so readers see either the old or the new content, never a partial one"""
+    _atomic_write_with(path, lambda f: f.write(data))
+
+
+def _atomic_write_with(path: Path, writer):
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        writer(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SegmentedVectorStore:
+    """
+    Append-only vector store shared by every process that mounts the same directory.
+
+    Each write (put/delete of one document) is an immutable segment: a small
+    pickle with chunk metadata plus, for puts, a float32 ``.npy`` matrix. The
+    manifest lists segments in order and carries a monotonically increasing
+    version. Writers serialize on a file lock; readers never take the lock and
+    only read the segments appended since their last refresh.
+
+    Embedding matrices are memory-mapped read-only rather than loaded, so every
+    worker on a host searches the same page-cache pages instead of holding its
+    own copy of the index.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+    LOCK_FILE = ".write.lock"
+    SEGMENT_DIR = "segments"
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.segment_path = self.root / self.SEGMENT_DIR
+        self.segment_path.mkdir(parents=True, exist_ok=True)
+
+        self.documents: Dict[str, Dict[str, Any]] = {}  # doc_id -> {chunks, embeddings, metadata}
+        self.version = 0
+        self.nbytes = 0  # embedding + chunk text bytes of the documents currently applied
+        self.lexical = BM25Index()  # kept in step with self.documents for keyword/hybrid search
+        self._applied_segments = 0
+        self._generation = 0  # bumped by compact(); a change means the segment list was rewritten
+        self._manifest_stamp = None
+        self._mutex = threading.RLock()
+        self._dense = None  # per-matrix row keys for dense search; dropped whenever documents change
+
+    # ---- locking / manifest -------------------------------------------------
+
+    @contextmanager
+    def _write_lock(self):
+        with open(self.root / self.LOCK_FILE, "a+b") as fh:
+            _lock_file(fh)
+            try:
+                yield
+            finally:
+                _unlock_file(fh)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        manifest_file = self.root / self.MANIFEST_FILE
+        if not manifest_file.exists():
+            return {"version": 0, "segments": []}
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        _atomic_write(self.root / self.MANIFEST_FILE, json.dumps(manifest).encode("utf-8"))
+
+    def _stat_manifest(self):
+        try:
+            stat = (self.root / self.MANIFEST_FILE).stat()
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    # ---- reading ------------------------------------------------------------
+
+    def refresh(self) -> bool:
+        """Apply segments written by other processes. Returns True if anything changed."""
+        for attempt in range(3):
+            stamp = self._stat_manifest()
+            if stamp is None or stamp == self._manifest_stamp:
+                return False
+            try:
+                return self._refresh(stamp)
+            except FileNotFoundError:
+                # A compaction swapped the segment set between our manifest read and segment load;
+                # the next manifest read sees the new generation and reloads from the compacted segment
+                logger.info(f"🔁 Vector store at {self.root} changed during refresh, retrying ({attempt + 1})")
+                self._manifest_stamp = None
+        return self._refresh(self._stat_manifest())
+
+    def _refresh(self, stamp) -> bool:
+        with self._mutex:
+            manifest = self._read_manifest()
+            segments = manifest.get("segments", [])
+
+            if manifest.get("generation", 0) != self._generation:
+                # Compacted since we last looked: rebuild off to the side, then swap in
+                fresh = SegmentedVectorStore.__new__(SegmentedVectorStore)
+                fresh.documents, fresh.nbytes, fresh.lexical = {}, 0, BM25Index()
+                for segment_name in segments:
+                    fresh._apply(self._load_segment(segment_name))
+                self.documents, self.nbytes, self.lexical = fresh.documents, fresh.nbytes, fresh.lexical
+                self._dense = None
+                new_segments = segments
+                self._generation = manifest.get("generation", 0)
+            else:
+                new_segments = segments[self._applied_segments:]
+                for segment_name in new_segments:
+                    self._apply(self._load_segment(segment_name))
+
+            self._applied_segments = len(segments)
+            self.version = manifest.get("version", 0)
+            self._manifest_stamp = stamp
+
+            if new_segments:
+                logger.info(f"📚 Vector store at {self.root} refreshed to version {self.version} ({len(new_segments)} new segments)")
+            return bool(new_segments)
+
+    def _load_segment(self, segment_name: str) -> Dict[str, Any]:
+        with open(self.segment_path / segment_name, "rb") as f:
+            record = pickle.load(f)
+        matrix_name = record.get("matrix")
+        if matrix_name:
+            # Zero-copy, read-only view backed by the shared page cache
+            record["embeddings"] = np.load(self.segment_path / matrix_name, mmap_mode="r")
+        return record
+
+    def dense_index(self) -> List[Tuple[np.ndarray, np.ndarray, List[Tuple[str, int]]]]:
+        """
+        The segment matrices holding live embeddings, each as (matrix, live row
+        numbers, (doc_id, chunk_index) per live row). Matrices are the shared
+        memmaps themselves, never copies: a compacted shard is one matrix, so a
+        search is one product, plus one per segment written since. Rows of
+        replaced or deleted documents are skipped via the row numbers.
+        """
+        with self._mutex:
+            if self._dense is None:
+                blocks: Dict[int, Tuple[np.ndarray, List[int], List[Tuple[str, int]]]] = {}
+                for doc_id, doc in self.documents.items():
+                    source = doc.get("source")
+                    if source is None:
+                        continue
+                    start, end = doc["rows"]
+                    count = min(end - start, len(doc["chunks"]))
+                    _, rows, keys = blocks.setdefault(id(source), (source, [], []))
+                    rows.extend(range(start, start + count))
+                    keys.extend((doc_id, chunk["chunk_index"]) for chunk in doc["chunks"][:count])
+                self._dense = [(matrix, np.asarray(rows, dtype=np.intp), keys) for matrix, rows, keys in blocks.values() if keys]
+            return self._dense
+
+    @property
+    def mapped_bytes(self) -> int:
+        """Size of the embedding matrices this process can see (shared, not per-process RSS)"""
+        return sum(doc["embeddings"].nbytes for doc in self.documents.values() if doc.get("embeddings") is not None)
+
+    @staticmethod
+    def _doc_nbytes(doc: Dict[str, Any]) -> int:
+        embeddings = doc.get("embeddings")
+        text_bytes = sum(len(chunk.get("text", "")) for chunk in doc.get("chunks", []))
+        return text_bytes + (embeddings.nbytes if embeddings is not None else 0)
+
+    def _apply(self, record: Dict[str, Any]):
+        self._dense = None
+        previous = self.documents.pop(record["doc_id"], None) if "doc_id" in record else None
+        if previous is not None:
+            self.nbytes -= self._doc_nbytes(previous)
+            self.lexical.remove_document(record["doc_id"])
+
+        if record["op"] == "batch":
+            # Compacted segment: many puts sharing one matrix, each owning a row range
+            matrix = record.get("embeddings")
+            for sub in record["records"]:
+                start, end = sub.pop("rows")
+                if matrix is not None and end > start:
+                    sub["embeddings"], sub["source"], sub["rows"] = matrix[start:end], matrix, (start, end)
+                else:
+                    sub["embeddings"] = None
+                self._apply(sub)
+            return
+
+        if record["op"] == "put":
+            embeddings = record.get("embeddings")
+            has_rows = embeddings is not None and len(embeddings) > 0
+            doc = {
+                "chunks": record["chunks"],
+                "embeddings": embeddings,
+                "metadata": record["metadata"],
+                # The segment matrix this document's rows live in, for dense_index
+                "source": record.get("source", embeddings) if has_rows else None,
+                "rows": record.get("rows", (0, len(embeddings) if has_rows else 0)),
+            }
+            self.documents[record["doc_id"]] = doc
+            self.nbytes += self._doc_nbytes(doc)
+            self.lexical.add_document(record["doc_id"], ((c["chunk_index"], c["text"]) for c in doc["chunks"]))
+
+    # ---- writing ------------------------------------------------------------
+
+    def _append_locked(self, record: Dict[str, Any]):
+        """Write one segment and publish it in the manifest. Caller must hold the write lock."""
+        manifest = self._read_manifest()
+        version = manifest.get("version", 0) + 1
+        segment_name = f"seg-{version:010d}.pkl"
+
+        embeddings = record.pop("embeddings", None)
+        if embeddings is not None and len(embeddings):
+            matrix_name = f"seg-{version:010d}.npy"
+            matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+            _atomic_write_with(self.segment_path / matrix_name, lambda f: np.save(f, matrix))
+            record["matrix"] = matrix_name
+
+        # Matrix first, then metadata, then manifest: a published segment is always complete
+        _atomic_write(self.segment_path / segment_name, pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+
+        manifest["version"] = version
+        manifest.setdefault("segments", []).append(segment_name)
+        self._write_manifest(manifest)
+
+    def _append(self, record: Dict[str, Any], refresh: bool):
+        with self._write_lock():
+            self._append_locked(record)
+
+        if refresh:
+            # Pick up our own segment plus anything other writers appended before it
+            self.refresh()
+
+    def put(self, doc_id: str, chunks: List[Dict[str, Any]], embeddings: np.ndarray, metadata: Dict[str, Any], refresh: bool = True):
+        """Store (or replace) a document. Embeddings are L2-normalized float32 rows, one per chunk."""
+        self._append({
+            "op": "put",
+            "doc_id": doc_id,
+            "chunks": chunks,
+            "embeddings": embeddings,
+            "metadata": metadata,
+        }, refresh)
+
+    def delete(self, doc_id: str, refresh: bool = True):
+        self._append({"op": "delete", "doc_id": doc_id}, refresh)
+
+    def disk_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.segment_path.iterdir() if p.is_file())
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Rewrite the live documents into one segment with one matrix, dropping
+        superseded puts and deletes. Readers notice the new generation and reload.
+        """
+        with self._write_lock():
+            manifest = self._read_manifest()
+            segments = manifest.get("segments", [])
+            before = self.disk_bytes()
+            if len(segments) <= 1:
+                return {"segments_before": len(segments), "segments_after": len(segments), "bytes_before": before, "bytes_after": before}
+
+            live = SegmentedVectorStore(self.root)
+            live.refresh()
+
+            records, rows, offset = [], [], 0
+            for doc_id, doc in live.documents.items():
+                count = len(doc["embeddings"]) if doc["embeddings"] is not None else 0
+                if count:
+                    rows.append(np.asarray(doc["embeddings"], dtype=np.float32))
+                records.append({
+                    "op": "put",
+                    "doc_id": doc_id,
+                    "chunks": doc["chunks"],
+                    "metadata": doc["metadata"],
+                    "rows": (offset, offset + count),
+                })
+                offset += count
+
+            version = manifest.get("version", 0) + 1
+            segment_name = f"seg-{version:010d}.pkl"
+            record = {"op": "batch", "records": records}
+            if rows:
+                matrix_name = f"seg-{version:010d}.npy"
+                matrix = np.ascontiguousarray(np.vstack(rows), dtype=np.float32)
+                _atomic_write_with(self.segment_path / matrix_name, lambda f: np.save(f, matrix))
+                record["matrix"] = matrix_name
+            _atomic_write(self.segment_path / segment_name, pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+
+            new_segments = [segment_name] if records else []
+            self._write_manifest({
+                "version": version,
+                "generation": manifest.get("generation", 0) + 1,
+                "segments": new_segments,
+            })
+
+            # Old files go after the manifest switch. Open memmaps keep working on POSIX;
+            # on Windows a mapped file can't be removed yet and is retried by the next compaction.
+            keep = set(new_segments) | {record.get("matrix")}
+            for path in self.segment_path.iterdir():
+                if path.name not in keep:
+                    try:
+                        path.unlink()
+                    except OSError as e:
+                        logger.warning(f"⚠️ Could not remove compacted segment {path}: {str(e)}")
+
+            after = self.disk_bytes()
+            logger.info(f"🗜️ Compacted vector store at {self.root}: {len(segments)} -> {len(new_segments)} segments, {before - after} bytes reclaimed")
+            return {"segments_before": len(segments), "segments_after": len(new_segments), "bytes_before": before, "bytes_after": after}
+
+
+
+class ShardedVectorStore:
+    """
+    Per-user SegmentedVectorStores under ``root/shards/<user_id>``.
+
+    Nothing is read at start-up. A user's shard is loaded the first time it is
+    searched and kept in an LRU bounded by resident bytes, so memory tracks the
+    set of active users rather than the total corpus. The engine is shared by
+    the engine thread pool, so the LRU and its byte accounting change only
+    under _lock. _lock is never held for disk I/O: loads, writes and refreshes
+    run on the shard itself (its file lock and mutex), so one user's write
+    never stalls another user's search.
+    """
+
+    SHARD_DIR = "shards"
+
+    def __init__(self, root: Path, max_resident_bytes: int):
+        self.root = Path(root)
+        self.shard_root = self.root / self.SHARD_DIR
+        self.shard_root.mkdir(parents=True, exist_ok=True)
+        self.max_resident_bytes = max_resident_bytes
+
+        self._shards: "OrderedDict[str, SegmentedVectorStore]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._cold_loads = 0
+        self._cold_load_seconds = 0.0
+        self._last_cold_load_ms = 0.0
+        self._evictions = 0
+        self._evicted_bytes = 0
+
+    def _shard_path(self, user_id: str) -> Path:
+        if not user_id or any(sep in user_id for sep in ("/", "\\")) or user_id.startswith("."):
+            raise ValueError(f"Invalid shard key: {user_id!r}")
+        return self.shard_root / user_id
+
+    def _resident(self, user_id: str) -> Optional[SegmentedVectorStore]:
+        with self._lock:
+            return self._shards.get(user_id)
+
+    def shard(self, user_id: str) -> SegmentedVectorStore:
+        """Return the user's shard, loading it on first use and refreshing it otherwise"""
+        with self._lock:
+            shard = self._shards.get(user_id)
+            if shard is not None:
+                self._shards.move_to_end(user_id)
+
+        if shard is None:
+            started = time.perf_counter()
+            loaded = SegmentedVectorStore(self._shard_path(user_id))
+            loaded.refresh()
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                # Another thread may have loaded it meanwhile; keep the first one published
+                shard = self._shards.setdefault(user_id, loaded)
+                self._shards.move_to_end(user_id)
+                if shard is loaded:
+                    self._cold_loads += 1
+                    self._cold_load_seconds += elapsed
+                    self._last_cold_load_ms = elapsed * 1000
+            if shard is loaded:
+                logger.info(f"📂 Cold-loaded vector shard for user {user_id}: {len(shard.documents)} documents, {shard.nbytes} bytes in {elapsed * 1000:.1f} ms")
+
+        shard.refresh()
+        self._evict(keep=user_id)
+        return shard
+
+    def _evict(self, keep: str):
+        with self._lock:
+            while self.resident_bytes > self.max_resident_bytes and len(self._shards) > 1:
+                user_id = next(iter(self._shards))
+                if user_id == keep:
+                    self._shards.move_to_end(user_id)
+                    continue
+                shard = self._shards.pop(user_id)
+                self._evictions += 1
+                self._evicted_bytes += shard.nbytes
+                logger.info(f"♻️ Evicted vector shard for user {user_id} ({shard.nbytes} bytes)")
+
+    @property
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(shard.nbytes for shard in self._shards.values())
+
+    def put(self, user_id: str, doc_id: str, chunks: List[Dict[str, Any]], embeddings: np.ndarray, metadata: Dict[str, Any]):
+        """Append to the user's shard without loading it unless it is already resident"""
+        # If the shard is evicted mid-write, the write still lands on disk and the next load reads it
+        resident = self._resident(user_id)
+        target = resident or SegmentedVectorStore(self._shard_path(user_id))
+        target.put(doc_id, chunks, embeddings, metadata, refresh=resident is not None)
+        if resident is not None:
+            self._evict(keep=user_id)
+
+    def delete(self, user_id: str, doc_id: str):
+        resident = self._resident(user_id)
+        target = resident or SegmentedVectorStore(self._shard_path(user_id))
+        target.delete(doc_id, refresh=resident is not None)
+
+    def list_documents(self, user_id: Optional[str] = None) -> Dict[str, Set[str]]:
+        """user_id -> stored doc_ids, read from disk (non-resident shards are not cached)"""
+        user_ids = [user_id] if user_id else [p.name for p in self.shard_root.iterdir() if p.is_dir()]
+        listing = {}
+        for shard_user in user_ids:
+            resident = self._resident(shard_user)
+            shard = resident or SegmentedVectorStore(self._shard_path(shard_user))
+            shard.refresh()
+            listing[shard_user] = set(shard.documents)
+        return listing
+
+    def delete_many(self, user_id: str, doc_ids: List[str]):
+        resident = self._resident(user_id)
+        target = resident or SegmentedVectorStore(self._shard_path(user_id))
+        with target._write_lock():
+            for doc_id in doc_ids:
+                target._append_locked({"op": "delete", "doc_id": doc_id})
+        if resident is not None:
+            resident.refresh()
+
+    def compact(self, user_id: Optional[str] = None) -> Dict[str, int]:
+        """Compact one or every shard; returns totals across shards"""
+        user_ids = [user_id] if user_id else [p.name for p in self.shard_root.iterdir() if p.is_dir()]
+        totals = {"shards": 0, "segments_before": 0, "segments_after": 0, "bytes_before": 0, "bytes_after": 0}
+        for shard_user in user_ids:
+            result = SegmentedVectorStore(self._shard_path(shard_user)).compact()
+            totals["shards"] += 1
+            for key, value in result.items():
+                totals[key] += value
+        with self._lock:
+            resident = list(self._shards.values())
+        for shard in resident:
+            shard.refresh()
+        return totals
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "shards_on_disk": sum(1 for p in self.shard_root.iterdir() if p.is_dir()),
+                "resident_shards": len(self._shards),
+                "resident_documents": sum(len(shard.documents) for shard in self._shards.values()),
+                "resident_bytes": self.resident_bytes,
+                "max_resident_bytes": self.max_resident_bytes,
+                "cold_loads": self._cold_loads,
+                "cold_load_avg_ms": (self._cold_load_seconds / self._cold_loads * 1000) if self._cold_loads else 0.0,
+                "last_cold_load_ms": self._last_cold_load_ms,
+                "evictions": self._evictions,
+                "evicted_bytes": self._evicted_bytes,
+            }
+
+    def import_legacy(self) -> int:
+        """
+        One-time split of older single-store layouts into per-user shards:
+        the original documents.pkl and the unsharded segment store at ``root``.
+        """
+        legacy_pickle = self.root / "documents.pkl"
+        legacy_manifest = self.root / SegmentedVectorStore.MANIFEST_FILE
+        if not legacy_pickle.exists() and not legacy_manifest.exists():
+            return 0
+
+        imported = 0
+        legacy_store = SegmentedVectorStore(self.root)
+        with legacy_store._write_lock():
+            if legacy_pickle.exists():
+                with open(legacy_pickle, "rb") as f:
+                    for doc_id, doc_data in pickle.load(f).items():
+                        embedded = [c for c in doc_data.get("chunks", []) if c.get("embedding")]
+                        self.put(
+                            doc_data.get("metadata", {}).get("user_id") or "_unowned",
+                            doc_id,
+                            [{"text": c["text"], "chunk_index": c.get("chunk_index", i)} for i, c in enumerate(embedded)],
+                            normalize_rows([c["embedding"] for c in embedded]),
+                            doc_data.get("metadata", {}),
+                        )
+                        imported += 1
+                legacy_pickle.rename(legacy_pickle.with_suffix(".pkl.migrated"))
+
+            if legacy_manifest.exists():
+                legacy_store.refresh()
+                for doc_id, doc in legacy_store.documents.items():
+                    self.put(
+                        doc["metadata"].get("user_id") or "_unowned",
+                        doc_id,
+                        doc["chunks"],
+                        doc["embeddings"] if doc["embeddings"] is not None else normalize_rows([]),
+                        doc["metadata"],
+                    )
+                    imported += 1
+                legacy_manifest.rename(legacy_manifest.with_suffix(".json.migrated"))
+
+        logger.info(f"📦 Split {imported} legacy documents into per-user vector shards")
+        return imported
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Stack embeddings into a float32 matrix with unit-length rows so dot product == cosine"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.size == 0:
+        return matrix.reshape(0, 0)
+    matrix = np.atleast_2d(matrix)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
@@ -1,12 +1,46 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, Callable, Iterator, List, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+import asyncio
+import functools
+import importlib
+import logging
+import threading
+import time
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
 
 class WorkflowEngineType(Enum):
     LANGCHAIN = "langchain"
     LLAMAINDEX = "llamaindex"
     HAYSTACK = "haystack"
     OPENAI_DIRECT = "openai_direct"
+    PGVECTOR = "pgvector"
+
+class SearchMode(Enum):
+    DENSE = "dense"      # embedding similarity only
+    LEXICAL = "lexical"  # BM25 over chunk text, no embedding call
+    HYBRID = "hybrid"    # dense + lexical fused with reciprocal rank fusion
+
+_engine_pool: Optional[ThreadPoolExecutor] = None
+_engine_pool_lock = threading.Lock()
+
+async def run_in_engine_pool(func: Callable, *args, **kwargs):
+    """
+    Run blocking engine work (vector math, Chroma, SQL) off the event loop.
+    The pool is bounded so a burst of requests can't spawn unlimited threads
+    or starve the default executor FastAPI uses for sync endpoints.
+    """
+    global _engine_pool
+    if _engine_pool is None:
+        with _engine_pool_lock:
+            if _engine_pool is None:
+                _engine_pool = ThreadPoolExecutor(max_workers=settings.ENGINE_THREAD_POOL_SIZE, thread_name_prefix="engine")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_engine_pool, functools.partial(func, *args, **kwargs))
 
 class WorkflowEngine(ABC):
     
@@ -19,7 +53,7 @@ class WorkflowEngine(ABC):
         pass
 
     @abstractmethod
-    def search_documents(self, query: str, user_id: str, documents: List[str]) -> List[Dict[str, Any]]:
+    def search_documents(self, query: str, user_id: str, documents: List[str], filters: Optional[Dict[str, Any]] = None, mode: SearchMode = SearchMode.DENSE, k: int = 4) -> List[Dict[str, Any]]:
         pass
     
     @abstractmethod
@@ -44,43 +78,159 @@ class WorkflowEngine(ABC):
     def is_available(self) -> bool:
         pass
 
+    @property
+    def supported_search_modes(self) -> List[SearchMode]:
+        return [SearchMode.DENSE]
+
+    @property
+    def supports_search_filters(self) -> bool:
+        """Whether search_documents honours document_type / created_after / created_before filters"""
+        return False
+
+    def remove_documents_from_vectorstore(self, doc_ids: List[str], user_id: str) -> bool:
+        """Bulk removal; engines with a native batch delete override this"""
+        remove = getattr(self, "remove_document_from_vectorstore", None)
+        if remove is None:
+            return False
+        results = [remove(doc_id, user_id) for doc_id in dict.fromkeys(doc_ids)]
+        return all(results)
+
+    def list_stored_documents(self, user_id: Optional[str] = None) -> Optional[Dict[str, Set[str]]]:
+        """user_id -> doc_ids held in the vector store, enumerated by metadata; None if unsupported"""
+        return None
+
+    def remove_unowned_vectors(self) -> int:
+        """Delete vectors that belong to no document (e.g. test entries); returns how many"""
+        return 0
+
+    def compact_vectorstore(self) -> Dict[str, int]:
+        """Reclaim space left by deletes; returns at least bytes_before / bytes_after when supported"""
+        return {}
+
+    def check_readiness(self) -> Dict[str, Any]:
+        """Connectivity check without side effects; engines override with real probes"""
+        return {"ready": self.is_available, "checks": {}}
+
+    def stream_answer(self, question: str, user_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Q&A as events: {"event": "sources"}, then "token" events, then "done".
+        Engines without native streaming emit the whole answer as one token.
+        """
+        result = self.answer_question(question=question, user_id=user_id, context="")
+        yield {"event": "sources", "data": {"sources": result.get("sources", [])}}
+        yield {"event": "token", "data": {"text": result.get("answer", "")}}
+        yield {"event": "done", "data": {
+            "confidence": result.get("confidence", 0.0),
+            "method": result.get("method"),
+            "engine": result.get("engine", self.engine_type.value)
+        }}
+
+    async def aembed_query(self, text: str) -> Optional[List[float]]:
+        """Query embedding in the engine's vector space; None if the engine can't provide one"""
+        return None
+
+    # Async variants used by the API. The defaults run the sync methods in the
+    # engine pool; engines with async clients override them so network waits
+    # don't hold a thread at all.
+
+    async def asearch_documents(self, query: str, user_id: str, documents: List[str], filters: Optional[Dict[str, Any]] = None, mode: SearchMode = SearchMode.DENSE, k: int = 4) -> List[Dict[str, Any]]:
+        return await run_in_engine_pool(self.search_documents, query, user_id, documents, filters=filters, mode=mode, k=k)
+
+    async def aanswer_question(self, question: str, user_id: str, context: str) -> Dict[str, Any]:
+        return await run_in_engine_pool(self.answer_question, question, user_id, context)
+
+    async def astream_answer(self, question: str, user_id: str) -> AsyncIterator[Dict[str, Any]]:
+        iterator = iter(self.stream_answer(question, user_id))
+        finished = object()
+        while True:
+            item = await run_in_engine_pool(next, iterator, finished)
+            if item is finished:
+                break
+            yield item
+
 class WorkflowEngineFactory:
 
     _engines = {}
     _engine_instances = {}
+    _engine_failures = {}  # engine type -> monotonic time of the last failed build
+    _build_locks = {}  # engine type -> lock held while that engine is built
+    _lock = threading.Lock()  # guards the dicts above; never held while an engine is built
+
+    # Engines are registered by module path so their heavy imports happen on first use
+    _engine_modules = {
+        WorkflowEngineType.LANGCHAIN: "app.services.langchain_engine",
+        WorkflowEngineType.OPENAI_DIRECT: "app.services.openai_direct_engine",
+        WorkflowEngineType.PGVECTOR: "app.services.pgvector_engine",
+    }
 
     @classmethod
     def register_engine(cls, engine_type: WorkflowEngineType, engine_class):
         cls._engines[engine_type] = engine_class
-    
+
     @classmethod
-    def create_engine(cls, engine_type: WorkflowEngineType, **kwargs) -> WorkflowEngine:
+    def _resolve(cls, engine_type: WorkflowEngineType):
+        if engine_type not in cls._engines and engine_type in cls._engine_modules:
+            # Importing the module runs its register_engine call
+            importlib.import_module(cls._engine_modules[engine_type])
         if engine_type not in cls._engines:
             raise ValueError(f"engine type {engine_type} not registered")
-        
-        return cls._engines[engine_type](**kwargs)
+        return cls._engines[engine_type]
+    
+    @classmethod
+    def create_engine(cls, engine_type: WorkflowEngineType, **kwargs) -> WorkflowEngine:
+        engine = cls._resolve(engine_type)(**kwargs)
+        engine.initialize()
+        return engine
     
     @classmethod
     def get_engine(cls, engine_type: WorkflowEngineType) -> Optional[WorkflowEngine]:
-        """Get an engine instance, creating it if it doesn't exist"""
-        try:
-            if engine_type not in cls._engine_instances:
-                if engine_type not in cls._engines:
+        """
+        Shared engine instance, built and initialized once on first use; None if
+        unavailable. A failed build is retried after ENGINE_RETRY_SECONDS, so a
+        dependency that wasn't up yet (Chroma, Postgres, a key) doesn't disable
+        the engine until restart, and a misconfigured one isn't rebuilt per request.
+        Builds are serialized per engine type, so a slow or failing build
+        never blocks lookups of other engines.
+        """
+        if engine_type not in cls._engines and engine_type not in cls._engine_modules:
+            return None
+
+        with cls._lock:
+            engine = cls._engine_instances.get(engine_type)
+            if engine is not None:
+                return engine
+            build_lock = cls._build_locks.setdefault(engine_type, threading.Lock())
+
+        with build_lock:
+            with cls._lock:
+                # Another thread may have finished (or failed) the build while we waited
+                engine = cls._engine_instances.get(engine_type)
+                if engine is not None:
+                    return engine
+                failed_at = cls._engine_failures.get(engine_type)
+                if failed_at is not None and time.monotonic() - failed_at < settings.ENGINE_RETRY_SECONDS:
                     return None
-                
-                engine_instance = cls._engines[engine_type]()
-                if engine_instance.initialize():
-                    cls._engine_instances[engine_type] = engine_instance
-                else:
+
+            try:
+                engine = cls.create_engine(engine_type)
+            except Exception as e:
+                logger.error(f"❌ Failed to create {engine_type.value} engine: {str(e)}")
+                engine = None
+
+            with cls._lock:
+                if engine is None or not engine.is_available:
+                    cls._engine_failures[engine_type] = time.monotonic()
                     return None
-            
-            return cls._engine_instances[engine_type]
-        except Exception:
-            return None
+                cls._engine_failures.pop(engine_type, None)
+                cls._engine_instances[engine_type] = engine
+                return engine
     
     @classmethod
-    def get_available_engines(cls) -> List[WorkflowEngineType]:
-        return list(cls._engines.keys())
-
+    def initialized_engines(cls) -> Dict[WorkflowEngineType, WorkflowEngine]:
+        """Engines already built in this process; builds nothing"""
+        with cls._lock:
+            return dict(cls._engine_instances)
 
-    
\ No newline at end of file
+    @classmethod
+    def get_available_engines(cls) -> List[WorkflowEngineType]:
+        return list(set(cls._engines) | set(cls._engine_modules))
@@ -1,4 +1,5 @@
 import os
+from contextlib import ExitStack
 from pathlib import Path
 from sqlalchemy.orm import sessionmaker
 from app.celery_config import celery_app
@@ -8,6 +9,14 @@ import pytesseract
 from pdf2image import convert_from_path
 from PIL import Image
 from app.services.llm_service import llm_service
+from app.services.document_text import pages_from_text, replace_pages
+from app.services.answer_cache import answer_cache
+from app.services.search_cache import search_result_cache
+from app.services.storage import storage
+from app.services.previews import store_previews
+from app.core.metrics import OCR_PAGE_SECONDS, TEXT_EXTRACTIONS
+from app.core.tracing import tracer
+from opentelemetry import trace
 import platform
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -26,6 +35,7 @@ else:
 def process_document(document_id: str, user_id: str):
     db = SessionLocal()
     job = None
+    local_files = ExitStack()
 
     try:
         # Get document from db
@@ -33,6 +43,11 @@ def process_document(document_id: str, user_id: str):
         if not document:
             return {"error": "Document not found"}
 
+        task_span = trace.get_current_span()
+        task_span.set_attribute("document.id", document_id)
+        task_span.set_attribute("document.bytes", document.file_size or 0)
+        task_span.set_attribute("document.file_type", document.file_type.value)
+
         # Update job status to PROCESSING
         job = db.query(ProcessingJob).filter(ProcessingJob.document_id == document_id).first()
         if job:
@@ -40,7 +55,9 @@ def process_document(document_id: str, user_id: str):
             db.commit()
         
         extracted_text = ""
-        file_path = Path(document.file_path)
+        extraction_method = None
+        # A local copy only when storage is remote; streamed down in chunks and removed after extraction
+        file_path = local_files.enter_context(storage.local_path(document.file_path))
 
         if document.file_type == FileType.PDF:
             # Try multiple PDF processing methods
@@ -48,81 +65,94 @@ def process_document(document_id: str, user_id: str):
             
             # Method 1: Try pdf2image + OCR (best for scanned PDFs)
             try:
-                print("📄 Attempting PDF processing with pdf2image + OCR...")
+                with tracer.start_as_current_span("extract.pdf2image_ocr") as extract_span:
+                    print("📄 Attempting PDF processing with pdf2image + OCR...")
                 
-                if POPPLER_PATH:
-                    # Windows - use specified path
-                    poppler_bin = Path(POPPLER_PATH)
-                    print(f"Poppler path exists: {poppler_bin.exists()}")
-                    if poppler_bin.exists():
-                        executables = list(poppler_bin.glob("*.exe"))
-                        print(f"Found executables: {[exe.name for exe in executables]}")
+                    if POPPLER_PATH:
+                        # Windows - use specified path
+                        poppler_bin = Path(POPPLER_PATH)
+                        print(f"Poppler path exists: {poppler_bin.exists()}")
+                        if poppler_bin.exists():
+                            executables = list(poppler_bin.glob("*.exe"))
+                            print(f"Found executables: {[exe.name for exe in executables]}")
                     
-                    images = convert_from_path(str(file_path), poppler_path=POPPLER_PATH)
-                else:
-                    # Linux/Docker - use system PATH
-                    print("Using system Poppler installation...")
-                    images = convert_from_path(str(file_path))
-                page_texts = []
+                        images = convert_from_path(str(file_path), poppler_path=POPPLER_PATH)
+                    else:
+                        # Linux/Docker - use system PATH
+                        print("Using system Poppler installation...")
+                        images = convert_from_path(str(file_path))
+                    extract_span.set_attribute("document.pages", len(images))
+                    page_texts = []
 
-                for i, image in enumerate(images):
-                    page_text = pytesseract.image_to_string(image)
-                    page_texts.append(f"--- Page {i+1} --- \n{page_text}")
+                    for i, image in enumerate(images):
+                        with OCR_PAGE_SECONDS.time(), tracer.start_as_current_span("tesseract", attributes={"page": i + 1}):
+                            page_text = pytesseract.image_to_string(image)
+                        page_texts.append(f"--- Page {i+1} --- \n{page_text}")
                 
-                extracted_text = "\n\n".join(page_texts)
-                pdf_processing_success = True
-                print("✅ PDF processed successfully with pdf2image + OCR")
+                    extracted_text = "\n\n".join(page_texts)
+                    extraction_method = "ocr"
+                    pdf_processing_success = True
+                    print("✅ PDF processed successfully with pdf2image + OCR")
+
+                    # Thumbnails from the pages already rasterized for OCR
+                    print(f"🖼️ Stored {store_previews(document.id, images)} page previews")
                 
             except Exception as e:
                 print(f"❌ pdf2image method failed: {str(e)}")
                 
                 # Method 2: Try PyPDF2 for text extraction (good for text-based PDFs)
                 try:
-                    print("📄 Attempting PDF processing with PyPDF2...")
-                    import PyPDF2
+                    with tracer.start_as_current_span("extract.pypdf2") as extract_span:
+                        print("📄 Attempting PDF processing with PyPDF2...")
+                        import PyPDF2
                     
-                    with open(file_path, 'rb') as file:
-                        pdf_reader = PyPDF2.PdfReader(file)
-                        page_texts = []
+                        with open(file_path, 'rb') as file:
+                            pdf_reader = PyPDF2.PdfReader(file)
+                            extract_span.set_attribute("document.pages", len(pdf_reader.pages))
+                            page_texts = []
                         
-                        for i, page in enumerate(pdf_reader.pages):
-                            try:
-                                page_text = page.extract_text()
-                                if page_text.strip():
-                                    page_texts.append(f"--- Page {i+1} --- \n{page_text}")
-                                else:
-                                    page_texts.append(f"--- Page {i+1} --- \n[No extractable text]")
-                            except Exception as page_error:
-                                page_texts.append(f"--- Page {i+1} --- \n[Error extracting text: {str(page_error)}]")
+                            for i, page in enumerate(pdf_reader.pages):
+                                try:
+                                    page_text = page.extract_text()
+                                    if page_text.strip():
+                                        page_texts.append(f"--- Page {i+1} --- \n{page_text}")
+                                    else:
+                                        page_texts.append(f"--- Page {i+1} --- \n[No extractable text]")
+                                except Exception as page_error:
+                                    page_texts.append(f"--- Page {i+1} --- \n[Error extracting text: {str(page_error)}]")
                         
-                        extracted_text = "\n\n".join(page_texts)
-                        pdf_processing_success = True
-                        print("✅ PDF processed successfully with PyPDF2")
+                            extracted_text = "\n\n".join(page_texts)
+                            extraction_method = "pypdf2"
+                            pdf_processing_success = True
+                            print("✅ PDF processed successfully with PyPDF2")
                         
                 except Exception as pypdf_error:
                     print(f"❌ PyPDF2 method also failed: {str(pypdf_error)}")
                     
                     # Method 3: Try pdfplumber as final fallback
                     try:
-                        print("📄 Attempting PDF processing with pdfplumber...")
-                        import pdfplumber
+                        with tracer.start_as_current_span("extract.pdfplumber") as extract_span:
+                            print("📄 Attempting PDF processing with pdfplumber...")
+                            import pdfplumber
                         
-                        with pdfplumber.open(file_path) as pdf:
-                            page_texts = []
+                            with pdfplumber.open(file_path) as pdf:
+                                extract_span.set_attribute("document.pages", len(pdf.pages))
+                                page_texts = []
                             
-                            for i, page in enumerate(pdf.pages):
-                                try:
-                                    page_text = page.extract_text()
-                                    if page_text and page_text.strip():
-                                        page_texts.append(f"--- Page {i+1} --- \n{page_text}")
-                                    else:
-                                        page_texts.append(f"--- Page {i+1} --- \n[No extractable text]")
-                                except Exception as page_error:
-                                    page_texts.append(f"--- Page {i+1} --- \n[Error extracting text: {str(page_error)}]")
+                                for i, page in enumerate(pdf.pages):
+                                    try:
+                                        page_text = page.extract_text()
+                                        if page_text and page_text.strip():
+                                            page_texts.append(f"--- Page {i+1} --- \n{page_text}")
+                                        else:
+                                            page_texts.append(f"--- Page {i+1} --- \n[No extractable text]")
+                                    except Exception as page_error:
+                                        page_texts.append(f"--- Page {i+1} --- \n[Error extracting text: {str(page_error)}]")
                             
-                            extracted_text = "\n\n".join(page_texts)
-                            pdf_processing_success = True
-                            print("✅ PDF processed successfully with pdfplumber")
+                                extracted_text = "\n\n".join(page_texts)
+                                extraction_method = "pdfplumber"
+                                pdf_processing_success = True
+                                print("✅ PDF processed successfully with pdfplumber")
                             
                     except Exception as plumber_error:
                         print(f"❌ pdfplumber method also failed: {str(plumber_error)}")
@@ -131,46 +161,62 @@ def process_document(document_id: str, user_id: str):
         elif document.file_type in [FileType.PNG, FileType.JPG]:
             # OCR for images
             try:
-                image = Image.open(str(file_path))
-                print(f"Image size: {image.size}")
-                print(f"Image format: {image.format}")
-                print(f"Image mode: {image.mode}")
+                with tracer.start_as_current_span("extract.image_ocr") as extract_span:
+                    image = Image.open(str(file_path))
+                    print(f"Image size: {image.size}")
+                    print(f"Image format: {image.format}")
+                    print(f"Image mode: {image.mode}")
+
+                    extract_span.set_attribute("image.size", f"{image.size[0]}x{image.size[1]}")
+                    with OCR_PAGE_SECONDS.time(), tracer.start_as_current_span("tesseract", attributes={"page": 1}):
+                        extracted_text = pytesseract.image_to_string(image)
+                    extraction_method = "ocr"
+                    print(f"Raw OCR result: {extracted_text}")
 
-                extracted_text = pytesseract.image_to_string(image)
-                print(f"Raw OCR result: {extracted_text}")
+                    if len(extracted_text.strip()) < 5:
+                        configs = [
+                            '--psm 6', # PSM 6: Assumes a single text block
+                            '--psm 8', # PSM 8: Assumes a single word
+                            '--psm 13', # PSM 13: Raw line
+                        ]
 
-                if len(extracted_text.strip()) < 5:
-                    configs = [
-                        '--psm 6', # PSM 6: Assumes a single text block
-                        '--psm 8', # PSM 8: Assumes a single word
-                        '--psm 13', # PSM 13: Raw line
-                    ]
+                        for config in configs:
+                            try:
+                                with tracer.start_as_current_span("tesseract", attributes={"page": 1, "tesseract.config": config}):
+                                    extracted_text = pytesseract.image_to_string(image, config=config)
+                                if len(extracted_text.strip()) > 5:
+                                    break
+                            except Exception as e:
+                                print(f"Error with config {config}: {str(e)}")
 
-                    for config in configs:
-                        try:
-                            extracted_text = pytesseract.image_to_string(image, config=config)
-                            if len(extracted_text.strip()) > 5:
-                                break
-                        except Exception as e:
-                            print(f"Error with config {config}: {str(e)}")
+                    if len(extracted_text.strip()) < 5:
+                        extracted_text = "OCR failed to extract text"
 
-                if len(extracted_text.strip()) < 5:
-                    extracted_text = "OCR failed to extract text"
+                    store_previews(document.id, [image])
 
             except Exception as e:
                 extracted_text = f"Error processing image: {str(e)}"
         elif document.file_type == FileType.TXT:
             # Read text file
             try:
-                with open(file_path, "r", encoding="utf-8") as file:
-                    extracted_text = file.read()
+                with tracer.start_as_current_span("extract.text"):
+                    with open(file_path, "r", encoding="utf-8") as file:
+                        extracted_text = file.read()
+                    extraction_method = "text"
             except Exception as e:
                 extracted_text = f"Error reading text file: {str(e)}"
         else:
             extracted_text = f"Unsupported file type: {document.file_type}"
         
-        # Store extracted text
-        document.extracted_text = extracted_text
+        # Store extracted text page by page, outside the documents row
+        pages = pages_from_text(extracted_text)
+        task_span.set_attribute("extraction.method", extraction_method or "failed")
+        task_span.set_attribute("document.pages", len(pages))
+        task_span.set_attribute("document.characters", len(extracted_text))
+        with tracer.start_as_current_span("store_pages", attributes={"document.pages": len(pages)}):
+            replace_pages(db, document, pages, extraction_method)
+        local_files.close()
+        TEXT_EXTRACTIONS.labels(extraction_method or "failed", document.file_type.value).inc()
 
         # 🆕 NEW: AI Analysis and Storage
         if len(extracted_text.strip()) > 5:
@@ -205,11 +251,18 @@ def process_document(document_id: str, user_id: str):
                     print("🔍 Adding document to vector store...")
                     
                     if hasattr(llm_service.current_engine, 'add_document_to_vectorstore'):
-                        vector_added = llm_service.current_engine.add_document_to_vectorstore(
-                            doc_id=document_id,
-                            text=extracted_text,
-                            user_id=user_id
-                        )
+                        # Cached answers citing the previous version of this document are now stale
+                        answer_cache.invalidate_documents(user_id, [document_id])
+                        with tracer.start_as_current_span("vectorstore.add_document", attributes={
+                            "document.id": document_id,
+                            "engine": llm_service.current_engine.engine_type.value,
+                        }):
+                            vector_added = llm_service.current_engine.add_document_to_vectorstore(
+                                doc_id=document_id,
+                                text=extracted_text,
+                                user_id=user_id
+                            )
+                        search_result_cache.bump_corpus_version(user_id)
 
                         if vector_added:
                             print(f"✅ Document added to {llm_service.current_engine.engine_type.value} vector store")
@@ -285,5 +338,6 @@ def process_document(document_id: str, user_id: str):
         return {"error": str(e)}
 
     finally:
+        local_files.close()
         db.close()
         
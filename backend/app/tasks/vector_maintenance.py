@@ -0,0 +1,106 @@
+import uuid
+from typing import Dict, Optional, Set
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+from app.celery_config import celery_app
+from app.core.config import settings
+from app.database import engine
+from app.models import Document
+from app.services.llm_service import LLMService
+from app.services.answer_cache import answer_cache
+from app.services.search_cache import search_result_cache
+from app.services.workflow_engine import WorkflowEngineFactory
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _find_orphans(db, stored: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+    """Stored (user_id, doc_id) pairs with no matching row in documents, checked in bulk"""
+    candidates = {}
+    orphans: Dict[str, Set[str]] = {}
+    for user_id, doc_ids in stored.items():
+        for doc_id in doc_ids:
+            try:
+                candidates[(user_id, doc_id)] = uuid.UUID(doc_id)
+            except ValueError:
+                orphans.setdefault(user_id, set()).add(doc_id)  # not a document id at all
+
+    valid = set()
+    keys = list(candidates)
+    batch_size = settings.VECTOR_RECONCILE_SQL_BATCH_SIZE
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        rows = db.execute(
+            select(Document.id, Document.user_id).where(Document.id.in_({candidates[key] for key in batch}))
+        ).all()
+        valid.update((str(row.user_id), str(row.id)) for row in rows)
+
+    for user_id, doc_id in keys:
+        # A vector filed under the wrong user is as unreachable as one whose document is gone
+        if (user_id, doc_id) not in valid:
+            orphans.setdefault(user_id, set()).add(doc_id)
+    return orphans
+
+@celery_app.task(bind=True)
+def reconcile_vector_stores(self, user_id: Optional[str] = None, compact: bool = True):
+    """Delete vectors whose documents are gone, purge unowned entries and compact every engine's store"""
+    db = SessionLocal()
+    engine_types = LLMService.ENGINE_TYPES
+    summary = {"user_id": user_id, "engines": {}, "orphans_removed": 0, "unowned_removed": 0, "bytes_reclaimed": 0}
+
+    try:
+        for step, engine_type in enumerate(engine_types, start=1):
+            self.update_state(state="PROGRESS", meta={
+                "current_engine": engine_type.value,
+                "step": step,
+                "total_steps": len(engine_types),
+                **summary
+            })
+
+            engine = WorkflowEngineFactory.get_engine(engine_type)
+            if not engine:
+                summary["engines"][engine_type.value] = {"skipped": "engine not available"}
+                continue
+
+            result = {}
+            try:
+                stored = engine.list_stored_documents(user_id)
+                if stored is None:
+                    summary["engines"][engine_type.value] = {"skipped": "engine cannot enumerate stored documents"}
+                    continue
+
+                result["stored_documents"] = sum(len(doc_ids) for doc_ids in stored.values())
+                orphans = _find_orphans(db, stored)
+                removed = 0
+                for orphan_user, doc_ids in orphans.items():
+                    answer_cache.invalidate_documents(orphan_user, doc_ids)
+                    if engine.remove_documents_from_vectorstore(sorted(doc_ids), orphan_user):
+                        removed += len(doc_ids)
+                    search_result_cache.bump_corpus_version(orphan_user)
+                result["orphans_found"] = sum(len(doc_ids) for doc_ids in orphans.values())
+                result["orphans_removed"] = removed
+                summary["orphans_removed"] += removed
+
+                # Unowned entries have no user, so only the global (scheduled) run touches them
+                if user_id is None:
+                    result["unowned_removed"] = engine.remove_unowned_vectors()
+                    summary["unowned_removed"] += result["unowned_removed"]
+
+                if compact:
+                    compaction = engine.compact_vectorstore()
+                    if compaction:
+                        result["compaction"] = compaction
+                        reclaimed = compaction["bytes_before"] - compaction["bytes_after"]
+                        result["bytes_reclaimed"] = reclaimed
+                        summary["bytes_reclaimed"] += reclaimed
+
+                print(f"🧹 {engine_type.value}: {result}")
+            except Exception as e:
+                print(f"❌ Vector reconciliation failed for {engine_type.value}: {str(e)}")
+                result["error"] = str(e)
+
+            summary["engines"][engine_type.value] = result
+
+        print(f"✅ Vector reconciliation complete: {summary['orphans_removed']} orphans, {summary['unowned_removed']} unowned, {summary['bytes_reclaimed']} bytes reclaimed")
+        return summary
+    finally:
+        db.close()
@@ -0,0 +1,137 @@
+import sys
+import os
+import argparse
+import random
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sqlalchemy import select
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models import Document
+from app.services.chunking import chunk_document, count_tokens, split_pages
+from app.services.document_text import load_texts
+
+# ---- chunkers as they were before the shared chunking module ------------------
+
+def legacy_word_chunks(text, chunk_size=1000, overlap=200):
+    """Former OpenAIDirectEngine._chunk_text: 1000-word windows, 200-word overlap"""
+    words = text.split()
+    chunks = []
+    for i in range(0, len(words), chunk_size - overlap):
+        chunks.append(" ".join(words[i:i + chunk_size]))
+        if i + chunk_size >= len(words):
+            break
+    return chunks
+
+def legacy_char_chunks(text):
+    """Former LangChainEngine splitting: 1000-char recursive splitter, then the "--- page" filter"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len)
+    kept = []
+    for chunk in splitter.split_text(text):
+        if len(chunk.strip()) < 20 or chunk.count("--- Page") > len(chunk) / 100:
+            continue
+        kept.append(chunk)
+    return kept
+
+STRATEGIES = {
+    "words_1000": legacy_word_chunks,
+    "chars_1000": legacy_char_chunks,
+    "tokens_shared": lambda text: [c["text"] for c in chunk_document(text)],
+}
+
+def load_documents(user_id, limit):
+    db = SessionLocal()
+    try:
+        stmt = select(Document.id).where(Document.pages.any())
+        if user_id:
+            stmt = stmt.where(Document.user_id == user_id)
+        return list(load_texts(db, db.scalars(stmt.limit(limit)).all()).items())
+    finally:
+        db.close()
+
+def build_queries(documents, samples, seed):
+    """Eight consecutive words from a random page; the answer is that document and any chunk containing them"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(samples * 3):
+        if len(queries) >= samples:
+            break
+        doc_id, text = rng.choice(documents)
+        _, page_text = rng.choice(split_pages(text))
+        words = page_text.split()
+        if len(words) < 12:
+            continue
+        start = rng.randrange(0, len(words) - 8)
+        queries.append((" ".join(words[start:start + 8]), doc_id))
+    return queries
+
+def embed(client, texts, batch_size=64):
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        response = client.embeddings.create(model="text-embedding-ada-002", input=texts[start:start + batch_size])
+        vectors.extend(item.embedding for item in response.data)
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+def run_benchmark(user_id, limit, samples, ks, seed, with_embeddings):
+    documents = load_documents(user_id, limit)
+    if not documents:
+        print("❌ No documents with extracted text found")
+        return
+    print(f"🧪 {len(documents)} documents, chunk size {settings.CHUNK_SIZE_TOKENS} tokens, overlap {settings.CHUNK_OVERLAP_TOKENS}")
+
+    corpora = {}
+    print(f"\n{'strategy':<15}{'chunks':>8}{'tokens':>10}{'mean tok':>10}{'max tok':>9}{'>1000 tok':>11}")
+    for name, chunker in STRATEGIES.items():
+        try:
+            chunks = [(doc_id, chunk) for doc_id, text in documents for chunk in chunker(text)]
+        except ImportError as e:
+            print(f"{name:<15} skipped ({str(e)})")
+            continue
+        tokens = [count_tokens(chunk) for _, chunk in chunks]
+        corpora[name] = chunks
+        print(f"{name:<15}{len(chunks):>8}{sum(tokens):>10}{statistics.mean(tokens) if tokens else 0:>10.1f}"
+              f"{max(tokens, default=0):>9}{sum(1 for t in tokens if t > 1000):>11}")
+
+    if not with_embeddings:
+        print("\nℹ️ Pass --embed to measure retrieval quality (embeds every chunk; costs API tokens)")
+        return
+
+    from openai import OpenAI
+    client = OpenAI(api_key=settings.OPENAI_API_KEY.strip())
+    queries = build_queries(documents, samples, seed)
+    query_vectors = embed(client, [query for query, _ in queries])
+
+    max_k = max(ks)
+    print(f"\n{len(queries)} phrase queries")
+    print(f"{'strategy':<15}" + "".join(f"{'doc@' + str(k):>9}" for k in ks) + f"{'chunk@1':>9}")
+    for name, chunks in corpora.items():
+        matrix = embed(client, [chunk for _, chunk in chunks])
+        doc_hits = {k: 0 for k in ks}
+        chunk_hits = 0
+        for (query, relevant_doc), query_vector in zip(queries, query_vectors):
+            top = np.argsort(-(matrix @ query_vector))[:max_k]
+            ranked_docs = list(dict.fromkeys(chunks[i][0] for i in top))
+            for k in ks:
+                if relevant_doc in ranked_docs[:k]:
+                    doc_hits[k] += 1
+            # Whitespace-normalized: did the best chunk actually contain the passage?
+            if " ".join(query.split()) in " ".join(chunks[top[0]][1].split()):
+                chunk_hits += 1
+        print(f"{name:<15}" + "".join(f"{doc_hits[k] / len(queries):>9.3f}" for k in ks) + f"{chunk_hits / len(queries):>9.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding token spend and retrieval quality of the old chunkers vs the shared token chunker")
+    parser.add_argument("--user-id", help="Only this user's documents (default: all)")
+    parser.add_argument("--limit", type=int, default=50, help="Documents to sample")
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--embed", action="store_true", help="Embed chunks and queries to measure recall")
+    args = parser.parse_args()
+
+    run_benchmark(args.user_id, args.limit, args.samples, args.k, args.seed, args.embed)
@@ -0,0 +1,84 @@
+import sys
+import os
+import argparse
+import random
+import re
+import statistics
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.workflow_engine import WorkflowEngineFactory, WorkflowEngineType, SearchMode
+
+IDENTIFIER = re.compile(r"\b(?=[A-Za-z0-9-]*\d)[A-Za-z0-9][A-Za-z0-9-]{3,}\b")
+
+def load_chunks(engine, user_id):
+    """(doc_id, chunk_index) -> text for every chunk the engine holds for the user"""
+    if engine.engine_type == WorkflowEngineType.OPENAI_DIRECT:
+        return dict(engine.store.shard(user_id).lexical.chunk_text)
+    return dict(engine._lexical_index(user_id).chunk_text)
+
+def build_queries(chunks, samples, seed):
+    """
+    Synthetic lookups with a known answer document: an identifier from the chunk
+    (PO/invoice/SKU style) plus context words when there is one, otherwise a
+    short run of consecutive words.
+    """
+    rng = random.Random(seed)
+    keys = rng.sample(sorted(chunks), min(samples, len(chunks)))
+    queries = []
+    for key in keys:
+        words = chunks[key].split()
+        if len(words) < 8:
+            continue
+        identifiers = IDENTIFIER.findall(chunks[key])
+        start = rng.randrange(0, len(words) - 6)
+        if identifiers:
+            query = f"{rng.choice(identifiers)} {' '.join(words[start:start + 2])}"
+            kind = "identifier"
+        else:
+            query = " ".join(words[start:start + 6])
+            kind = "phrase"
+        queries.append((query, key[0], kind))
+    return queries
+
+def run_benchmark(engine_name, user_id, samples, ks, seed):
+    engine = WorkflowEngineFactory.get_engine(WorkflowEngineType(engine_name))
+    if not engine:
+        print(f"❌ Engine {engine_name} not available")
+        return
+
+    chunks = load_chunks(engine, user_id)
+    queries = build_queries(chunks, samples, seed)
+    print(f"🧪 {engine_name}: {len(chunks)} chunks, {len(queries)} queries "
+          f"({sum(1 for q in queries if q[2] == 'identifier')} identifier, {sum(1 for q in queries if q[2] == 'phrase')} phrase)")
+
+    max_k = max(ks)
+    print(f"\n{'mode':<10}" + "".join(f"{'recall@' + str(k):>11}" for k in ks) + f"{'p50 ms':>10}{'p95 ms':>10}")
+    for mode in SearchMode:
+        hits = {k: 0 for k in ks}
+        latencies = []
+        for query, relevant_doc, _ in queries:
+            started = time.perf_counter()
+            results = engine.search_documents(query, user_id, [], mode=mode, k=max_k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            ranked_docs = [r["doc_id"] for r in results]
+            for k in ks:
+                if relevant_doc in ranked_docs[:k]:
+                    hits[k] += 1
+
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+        print(f"{mode.value:<10}" + "".join(f"{hits[k] / max(1, len(queries)):>11.3f}" for k in ks)
+              + f"{statistics.median(latencies) if latencies else 0.0:>10.1f}{p95:>10.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k and latency of dense vs lexical vs hybrid search")
+    parser.add_argument("--engine", default="openai_direct", choices=["openai_direct", "langchain"])
+    parser.add_argument("--user-id", required=True)
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    run_benchmark(args.engine, args.user_id, args.samples, args.k, args.seed)
@@ -0,0 +1,116 @@
+import sys
+import os
+import argparse
+import csv
+import json
+import statistics
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI
+from sqlalchemy import select
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models import Document
+from app.services.document_text import load_texts
+from app.services.openai_direct_engine import CLASSIFICATION_PROMPT
+from app.services.prompt_compression import compress_for_classification
+
+def baseline_input(text):
+    """What the classifiers sent before compression: the raw first 8000 characters"""
+    return text[:8000] + "\n\n[Document truncated for analysis...]" if len(text) > 8000 else text
+
+def compressed_input(text):
+    return compress_for_classification(text)["text"]
+
+VARIANTS = {
+    "baseline_8000_chars": (baseline_input, lambda: settings.OPENAI_MAX_TOKENS),
+    "compressed": (compressed_input, lambda: settings.CLASSIFICATION_MAX_OUTPUT_TOKENS),
+}
+
+def load_samples(labels_file, limit):
+    """(doc_id, text, label): human labels from a CSV (doc_id,label) if given, else stored classifications"""
+    db = SessionLocal()
+    try:
+        if labels_file:
+            with open(labels_file, newline="") as f:
+                labels = {row["doc_id"]: row["label"].lower() for row in csv.DictReader(f)}
+            texts = load_texts(db, list(labels))
+            return [(doc_id, texts[doc_id], label) for doc_id, label in labels.items() if texts.get(doc_id)][:limit]
+
+        rows = db.execute(
+            select(Document.id, Document.ai_document_type)
+            .where(Document.pages.any(), Document.ai_document_type.isnot(None))
+            .limit(limit)
+        ).all()
+        texts = load_texts(db, [r.id for r in rows])
+        return [(str(r.id), texts[str(r.id)], r.ai_document_type.value) for r in rows if str(r.id) in texts]
+    finally:
+        db.close()
+
+def classify(client, document_text, max_tokens):
+    started = time.perf_counter()
+    response = client.chat.completions.create(
+        model=settings.OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a document classification expert that returns only valid JSON."},
+            {"role": "user", "content": f"{CLASSIFICATION_PROMPT}\n\nDocument text:\n{document_text}"}
+        ],
+        max_tokens=max_tokens,
+        temperature=settings.OPENAI_TEMPERATURE,
+        response_format={"type": "json_object"}
+    )
+    latency = (time.perf_counter() - started) * 1000
+    try:
+        predicted = json.loads(response.choices[0].message.content).get("document_type", "unknown").lower()
+    except (json.JSONDecodeError, AttributeError):
+        predicted = "invalid_json"
+    return predicted, response.usage.prompt_tokens, response.usage.completion_tokens, latency
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+def run_evaluation(labels_file, limit, input_price, output_price):
+    samples = load_samples(labels_file, limit)
+    if not samples:
+        print("❌ No labelled documents found")
+        return
+    print(f"🧪 {len(samples)} documents, model {settings.OPENAI_MODEL}, "
+          f"budget {settings.CLASSIFICATION_INPUT_TOKENS} input / {settings.CLASSIFICATION_MAX_OUTPUT_TOKENS} output tokens")
+
+    client = OpenAI(api_key=settings.OPENAI_API_KEY.strip())
+    predictions = {}
+    print(f"\n{'variant':<22}{'accuracy':>9}{'in tok':>9}{'out tok':>9}{'p50 ms':>9}{'p95 ms':>9}{'$/1k docs':>11}")
+    for name, (prepare, max_tokens) in VARIANTS.items():
+        correct, prompt_tokens, completion_tokens, latencies = 0, [], [], []
+        predictions[name] = []
+        for _, text, label in samples:
+            predicted, prompt, completion, latency = classify(client, prepare(text), max_tokens())
+            predictions[name].append(predicted)
+            correct += predicted == label
+            prompt_tokens.append(prompt)
+            completion_tokens.append(completion)
+            latencies.append(latency)
+
+        cost = (sum(prompt_tokens) * input_price + sum(completion_tokens) * output_price) / 1_000_000 / len(samples) * 1000
+        print(f"{name:<22}{correct / len(samples):>9.3f}{statistics.mean(prompt_tokens):>9.0f}{statistics.mean(completion_tokens):>9.0f}"
+              f"{statistics.median(latencies):>9.0f}{percentile(latencies, 0.95):>9.0f}{cost:>11.3f}")
+
+    baseline, compressed = predictions["baseline_8000_chars"], predictions["compressed"]
+    agreement = sum(a == b for a, b in zip(baseline, compressed)) / len(samples)
+    print(f"\n🔁 Baseline/compressed agreement: {agreement:.3f}")
+    for (doc_id, _, label), a, b in zip(samples, baseline, compressed):
+        if a != b:
+            print(f"   {doc_id}: label={label} baseline={a} compressed={b}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline accuracy / token / latency comparison of raw vs compressed classifier input")
+    parser.add_argument("--labels", help="CSV with doc_id,label columns (default: use stored ai_document_type as the label)")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--input-price", type=float, default=0.15, help="USD per 1M input tokens")
+    parser.add_argument("--output-price", type=float, default=0.60, help="USD per 1M output tokens")
+    args = parser.parse_args()
+
+    run_evaluation(args.labels, args.limit, args.input_price, args.output_price)
@@ -4,6 +4,7 @@
 -- Create extensions if they don't exist
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 CREATE EXTENSION IF NOT EXISTS "pg_trgm";
+CREATE EXTENSION IF NOT EXISTS "vector";
 
 -- Create indexes for better performance (will be created by Alembic, but good to have as backup)
 -- These are just examples - actual indexes are managed by Alembic migrations
@@ -0,0 +1,98 @@
+import sys
+import os
+import argparse
+import asyncio
+import statistics
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+QUESTIONS = [
+    "What is the total amount due?",
+    "Who are the parties to the agreement?",
+    "When does the contract terminate?",
+    "What was purchased and for how much?",
+    "Summarize the main findings.",
+]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+async def login(client, username, password):
+    response = await client.post("/api/v1/auth/login", json={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+async def ask(client, token, question):
+    started = time.perf_counter()
+    response = await client.post(
+        "/api/v1/documents/question",
+        params={"question": question},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    return time.perf_counter() - started, response.status_code
+
+async def probe_health(client, stop, latencies):
+    """Hit the health endpoint while questions are in flight; a blocked event loop shows up here first"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/api/v1/health/")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.05)
+
+async def run_load_test(base_url, username, password, requests, concurrency):
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        token = await login(client, username, password)
+
+        # One warm-up question builds the engine, loads the user's vectors and gives the single-request latency
+        single, status = await ask(client, token, QUESTIONS[0])
+        print(f"🧪 Single question: {single:.2f}s (HTTP {status})")
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(i):
+            async with semaphore:
+                return await ask(client, token, QUESTIONS[i % len(QUESTIONS)])
+
+        stop = asyncio.Event()
+        health_latencies = []
+        prober = asyncio.create_task(probe_health(client, stop, health_latencies))
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(limited(i) for i in range(requests)))
+        wall = time.perf_counter() - started
+        stop.set()
+        await prober
+
+    latencies = [latency for latency, _ in results]
+    errors = sum(1 for _, status in results if status != 200)
+    waves = -(-requests // concurrency)
+    # If /question serialized on the event loop, wall time would approach the sum of latencies
+    serialized_estimate = single * requests
+    overlapped_estimate = single * waves
+
+    print(f"\n{requests} questions, concurrency {concurrency}, {errors} errors")
+    print(f"   wall time      {wall:.2f}s   (fully serialized ≈ {serialized_estimate:.2f}s, fully overlapped ≈ {overlapped_estimate:.2f}s)")
+    print(f"   latency p50    {statistics.median(latencies):.2f}s   p95 {percentile(latencies, 0.95):.2f}s   max {max(latencies):.2f}s")
+    print(f"   throughput     {requests / wall:.2f} questions/s")
+    if health_latencies:
+        print(f"   /health during load: p50 {statistics.median(health_latencies) * 1000:.0f} ms, "
+              f"max {max(health_latencies) * 1000:.0f} ms over {len(health_latencies)} probes")
+
+    speedup = serialized_estimate / wall if wall else 0.0
+    print(f"\n{'✅' if speedup > concurrency / 2 else '❌'} {speedup:.1f}x faster than serialized "
+          f"(ideal {min(concurrency, requests)}x at this concurrency)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent /question load test: do answers overlap or serialize on the event loop?")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", default="demo")
+    parser.add_argument("--password", default="demo123")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    asyncio.run(run_load_test(args.base_url, args.username, args.password, args.requests, args.concurrency))
@@ -0,0 +1,73 @@
+import sys
+import os
+import argparse
+import json
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+
+def load_spans(path):
+    """Spans written by the file exporter (TRACING_EXPORTER=file), one JSON object per line"""
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                spans.append(json.loads(line))
+    return spans
+
+def _time(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+def duration_ms(span):
+    return (_time(span["end_time"]) - _time(span["start_time"])).total_seconds() * 1000
+
+def find_trace_ids(spans, document_id=None):
+    """Trace ids in start order, optionally only those with a span tagged with document_id"""
+    traces = {}
+    for span in sorted(spans, key=lambda s: s["start_time"]):
+        if document_id and span["attributes"].get("document.id") != document_id:
+            continue
+        traces.setdefault(span["context"]["trace_id"], span["start_time"])
+    return list(traces)
+
+def print_trace(spans, trace_id):
+    in_trace = [s for s in spans if s["context"]["trace_id"] == trace_id]
+    ids = {s["context"]["span_id"] for s in in_trace}
+    children = defaultdict(list)
+    for span in sorted(in_trace, key=lambda s: s["start_time"]):
+        # Parents may be missing when a process died before flushing; show such spans as roots
+        parent = span.get("parent_id") if span.get("parent_id") in ids else None
+        children[parent].append(span)
+
+    print(f"\n🔭 Trace {trace_id}")
+
+    def walk(parent, depth):
+        for span in children[parent]:
+            service = span["resource"]["attributes"].get("service.name", "?")
+            attributes = ", ".join(f"{k}={v}" for k, v in span["attributes"].items())
+            error = " ❌" if span["status"]["status_code"] == "ERROR" else ""
+            print(f"{'  ' * depth}{span['name']:<{40 - 2 * depth}} {duration_ms(span):>10.1f} ms  [{service}]{error}  {attributes}")
+            walk(span["context"]["span_id"], depth + 1)
+
+    walk(None, 0)
+
+def main():
+    parser = argparse.ArgumentParser(description="Print traces from the local span file as trees with durations")
+    parser.add_argument("--file", default=settings.TRACING_FILE_PATH)
+    parser.add_argument("--document-id", help="Only traces that touched this document")
+    parser.add_argument("--last", type=int, default=1, help="Number of most recent traces to show")
+    args = parser.parse_args()
+
+    spans = load_spans(args.file)
+    trace_ids = find_trace_ids(spans, args.document_id)
+    if not trace_ids:
+        print("No matching traces")
+        return
+    for trace_id in trace_ids[-args.last:]:
+        print_trace(spans, trace_id)
+
+if __name__ == "__main__":
+    main()
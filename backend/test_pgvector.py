@@ -0,0 +1,86 @@
+import sys
+import os
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.models import User, Document, DocumentChunk, FileType, DocumentType
+from app.models.document_chunk import EMBEDDING_DIMENSIONS
+
+def random_unit_vector():
+    vector = [random.gauss(0, 1) for _ in range(EMBEDDING_DIMENSIONS)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+def test_pgvector():
+    # Run against a local Postgres container with the pgvector image and `alembic upgrade head` applied
+    engine = create_engine(settings.DATABASE_URL)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+
+    try:
+        print("🧪 Testing pgvector document_chunks...")
+
+        version = session.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+        print(f"✅ pgvector extension version: {version}")
+
+        test_user = User(username="pgvector_test", email="pgvector_test@example.com", password="hashed_password_here")
+        session.add(test_user)
+        session.commit()
+
+        invoice = Document(user_id=test_user.id, file_name="invoice.pdf", file_type=FileType.PDF, ai_document_type=DocumentType.INVOICE)
+        contract = Document(user_id=test_user.id, file_name="contract.pdf", file_type=FileType.PDF, ai_document_type=DocumentType.CONTRACT)
+        session.add_all([invoice, contract])
+        session.commit()
+
+        query_vector = random_unit_vector()
+        session.add_all([
+            DocumentChunk(document_id=invoice.id, user_id=test_user.id, chunk_index=0, content="invoice chunk", embedding=query_vector),
+            DocumentChunk(document_id=contract.id, user_id=test_user.id, chunk_index=0, content="contract chunk", embedding=random_unit_vector()),
+        ])
+        session.commit()
+        print("✅ Inserted 2 chunks")
+
+        distance = DocumentChunk.embedding.cosine_distance(query_vector).label("distance")
+        rows = session.execute(
+            select(DocumentChunk.content, distance)
+            .join(Document, Document.id == DocumentChunk.document_id)
+            .where(DocumentChunk.user_id == test_user.id, Document.ai_document_type == DocumentType.INVOICE)
+            .order_by(distance)
+            .limit(4)
+        ).all()
+        assert [row.content for row in rows] == ["invoice chunk"], rows
+        assert rows[0].distance < 1e-6
+        print(f"✅ Filtered similarity search returned: {[row.content for row in rows]}")
+
+        plan = session.execute(text(
+            "EXPLAIN SELECT id FROM document_chunks ORDER BY embedding <=> CAST(:q AS vector) LIMIT 4"
+        ), {"q": str(query_vector)}).scalars().all()
+        print("🔍 Query plan:\n   " + "\n   ".join(plan))
+
+        # Deleting the document cascades to its chunks
+        session.delete(contract)
+        session.commit()
+        remaining = session.execute(select(DocumentChunk).where(DocumentChunk.user_id == test_user.id)).scalars().all()
+        assert len(remaining) == 1
+        print("✅ Chunks cascade-deleted with their document")
+
+        print("\n🎉 pgvector test passed!")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        session.rollback()
+        raise
+    finally:
+        # Clean up
+        session.execute(text("DELETE FROM document_chunks WHERE user_id IN (SELECT id FROM users WHERE username = 'pgvector_test')"))
+        session.execute(text("DELETE FROM documents WHERE user_id IN (SELECT id FROM users WHERE username = 'pgvector_test')"))
+        session.execute(text("DELETE FROM users WHERE username = 'pgvector_test'"))
+        session.commit()
+        session.close()
+
+if __name__ == "__main__":
+    test_pgvector()
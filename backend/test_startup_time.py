@@ -0,0 +1,51 @@
+import sys
+import os
+import json
+import subprocess
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app must not build engines, touch the network or pull in langchain/chromadb
+MAX_IMPORT_SECONDS = float(os.environ.get("MAX_IMPORT_SECONDS", "3.0"))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+import app.tasks.document_processing
+elapsed = time.perf_counter() - start
+
+from app.services.workflow_engine import WorkflowEngineFactory
+from app.services.llm_service import llm_service
+print(json.dumps({
+    "import_seconds": elapsed,
+    "engines_built": [t.value for t in WorkflowEngineFactory._engine_instances],
+    "engine_resolved": llm_service._resolved,
+    "heavy_modules": sorted(m for m in ("langchain", "langchain_openai", "langchain_chroma", "chromadb", "openai") if m in sys.modules),
+}))
+"""
+
+def test_startup_time():
+    print("🧪 Measuring cold import time of the API and Celery entry points...")
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    # Fresh interpreter so nothing is already cached in sys.modules
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=backend_dir,
+        capture_output=True,
+        text=True
+    )
+    assert proc.returncode == 0, f"Import failed:\n{proc.stderr}"
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    print(f"⏱️ Import time: {result['import_seconds']:.2f}s (limit {MAX_IMPORT_SECONDS:.1f}s)")
+
+    assert not result["engines_built"] and not result["engine_resolved"], f"Engines were built at import: {result['engines_built']}"
+    assert not result["heavy_modules"], f"Heavy modules imported at start-up: {result['heavy_modules']}"
+    assert result["import_seconds"] <= MAX_IMPORT_SECONDS, "Start-up slower than the limit"
+
+    print("🎉 Start-up is lazy: no engines built, no heavy imports")
+
+if __name__ == "__main__":
+    test_startup_time()
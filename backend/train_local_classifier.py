@@ -0,0 +1,113 @@
+import sys
+import os
+import argparse
+import time
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from app.core.config import settings
+from app.database import SessionLocal
+from app.services.local_classifier import build_pipeline, save_artifact, load_training_samples, TRAINING_ANALYSIS_METHODS
+
+THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98]
+
+def threshold_report(probabilities, classes, labels, llm_accuracy, cost_per_call):
+    """Coverage / accuracy / spend at each confidence threshold on held-out documents"""
+    predicted = classes[probabilities.argmax(axis=1)]
+    confidence = probabilities.max(axis=1)
+    correct = predicted == labels
+    n = len(labels)
+
+    rows = []
+    for threshold in THRESHOLDS:
+        local = confidence >= threshold
+        covered = int(local.sum())
+        local_accuracy = float(correct[local].mean()) if covered else 1.0
+        # Escalated documents are assumed to be classified at the LLM's accuracy
+        overall = (correct[local].sum() + llm_accuracy * (n - covered)) / n
+        rows.append({
+            "threshold": threshold,
+            "coverage": covered / n,
+            "local_accuracy": local_accuracy,
+            "overall_accuracy": float(overall),
+            "llm_calls_per_1k": (n - covered) / n * 1000,
+            "cost_per_1k": (n - covered) / n * 1000 * cost_per_call,
+        })
+    return rows
+
+def train(test_fraction, target_accuracy, llm_accuracy, cost_per_call, activate, seed):
+    from sklearn.model_selection import train_test_split
+
+    db = SessionLocal()
+    try:
+        samples = load_training_samples(db)
+    finally:
+        db.close()
+
+    counts = Counter(label for _, label in samples)
+    print(f"🧪 {len(samples)} LLM-labelled documents ({', '.join(TRAINING_ANALYSIS_METHODS)}): {dict(counts)}")
+    # Stratified split needs at least two examples per class
+    samples = [(text, label) for text, label in samples if counts[label] >= 2]
+    if len(set(label for _, label in samples)) < 2:
+        print("❌ Need at least two document types with two or more examples each")
+        return False
+
+    texts = [text for text, _ in samples]
+    labels = np.array([label for _, label in samples])
+    train_texts, test_texts, train_labels, test_labels = train_test_split(
+        texts, labels, test_size=test_fraction, stratify=labels, random_state=seed
+    )
+
+    pipeline = build_pipeline()
+    started = time.perf_counter()
+    pipeline.fit(train_texts, train_labels)
+    print(f"✅ Trained on {len(train_texts)} documents in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    probabilities = pipeline.predict_proba(test_texts)
+    per_document_ms = (time.perf_counter() - started) * 1000 / max(1, len(test_texts))
+    classes = pipeline.classes_
+
+    report = threshold_report(probabilities, classes, test_labels, llm_accuracy, cost_per_call)
+    print(f"\nHeld-out: {len(test_texts)} documents, {per_document_ms:.2f} ms/document")
+    print(f"{'threshold':>10}{'coverage':>10}{'local acc':>11}{'overall acc':>13}{'LLM calls/1k':>14}{'$/1k':>9}")
+    for row in report:
+        print(f"{row['threshold']:>10.2f}{row['coverage']:>10.3f}{row['local_accuracy']:>11.3f}"
+              f"{row['overall_accuracy']:>13.3f}{row['llm_calls_per_1k']:>14.0f}{row['cost_per_1k']:>9.2f}")
+
+    # Lowest threshold whose locally handled documents meet the accuracy target
+    qualifying = [row for row in report if row["local_accuracy"] >= target_accuracy and row["coverage"] > 0]
+    recommended = qualifying[0]["threshold"] if qualifying else 1.01  # 1.01 = never trust the local model
+    print(f"\n🎯 Recommended threshold for local accuracy >= {target_accuracy:.2f}: {recommended}")
+
+    # Refit on everything for the shipped artifact; the report above stays the held-out estimate
+    pipeline.fit(texts, labels)
+    version_dir = save_artifact(pipeline, {
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "samples": len(texts),
+        "classes": [str(c) for c in classes],
+        "label_counts": {str(k): v for k, v in Counter(labels.tolist()).items()},
+        "held_out": len(test_texts),
+        "threshold_report": report,
+        "target_accuracy": target_accuracy,
+        "recommended_threshold": recommended,
+        "predict_ms_per_document": per_document_ms,
+    }, activate=activate)
+    print(f"📦 Saved {version_dir}{' (active)' if activate else ''}")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the local TF-IDF document classifier from LLM-labelled documents")
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--target-accuracy", type=float, default=0.97, help="Required accuracy on locally handled documents")
+    parser.add_argument("--llm-accuracy", type=float, default=0.95, help="Assumed accuracy of escalated documents in the report")
+    parser.add_argument("--cost-per-call", type=float, default=0.0004, help="USD per LLM classification call")
+    parser.add_argument("--no-activate", action="store_true", help="Save the artifact without switching current.json to it")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"Artifacts directory: {settings.LOCAL_CLASSIFIER_DIR}")
+    ok = train(args.test_fraction, args.target_accuracy, args.llm_accuracy, args.cost_per_call, not args.no_activate, args.seed)
+    sys.exit(0 if ok else 1)
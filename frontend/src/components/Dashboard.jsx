@@ -7,9 +7,14 @@ import SearchInterface from './SearchInterface'
 import QuestionInterface from './QuestionInterface'
 import EngineStatus from './EngineStatus'
 
+// Only what DocumentCard renders; the modal fetches the full document
+const LIST_FIELDS = 'id,file_name,file_size,file_type,created_at,ai_document_type,ai_confidence'
+
 const Dashboard = () => {
     const [user, setUser] = useState(null)
     const [documents, setDocuments] = useState([])
+    const [nextCursor, setNextCursor] = useState(null)
+    const [loadingMore, setLoadingMore] = useState(false)
     const [loading, setLoading] = useState(true)
     const [error, setError] = useState('')
     const [selectedDocument, setSelectedDocument] = useState(null)
@@ -35,11 +40,12 @@ const Dashboard = () => {
 
             const [userResponse, documentsResponse] = await Promise.all([
                 axios.get('http://localhost:8000/api/v1/auth/me', { headers }),
-                axios.get('http://localhost:8000/api/v1/documents/list', { headers })
+                axios.get('http://localhost:8000/api/v1/documents/list', { headers, params: { fields: LIST_FIELDS } })
             ])
 
             setUser(userResponse.data)
             setDocuments(documentsResponse.data)
+            setNextCursor(documentsResponse.headers['x-next-cursor'] || null)
             setError('')
         } catch (error) {
             console.error('Failed to fetch user and documents:', error)
@@ -54,6 +60,23 @@ const Dashboard = () => {
         }
     }
 
+    const loadMoreDocuments = async () => {
+        if (!nextCursor) return
+        setLoadingMore(true)
+        try {
+            const response = await axios.get('http://localhost:8000/api/v1/documents/list', {
+                headers: getAuthHeaders(),
+                params: { fields: LIST_FIELDS, cursor: nextCursor }
+            })
+            setDocuments(prev => [...prev, ...response.data])
+            setNextCursor(response.headers['x-next-cursor'] || null)
+        } catch (error) {
+            console.error('Failed to load more documents:', error)
+        } finally {
+            setLoadingMore(false)
+        }
+    }
+
     const getAuthHeaders = () => {
         const token = localStorage.getItem('jwt_token')
         return {
@@ -67,8 +90,9 @@ const Dashboard = () => {
 
     const handleView = async (documentId) => {
         try {
+            // The modal shows the full text, which the API only assembles when asked
             const response = await axios.get(
-                `http://localhost:8000/api/v1/documents/${documentId}`,
+                `http://localhost:8000/api/v1/documents/${documentId}?include_text=true`,
                 { headers: getAuthHeaders() }
             )
             setSelectedDocument(response.data)
@@ -99,13 +123,18 @@ const Dashboard = () => {
                     { headers: getAuthHeaders() }
                 )
                 
+                // Polls skip the text; page_count shows extraction has finished
                 const hasAIAnalysis = response.data.ai_document_type && 
                                     response.data.ai_document_type !== 'unknown' &&
-                                    response.data.extracted_text
+                                    response.data.page_count > 0
 
                 if (hasAIAnalysis) {
                     console.log('✅ AI analysis completed, updating document view')
-                    setSelectedDocument(response.data)
+                    const fullResponse = await axios.get(
+                        `http://localhost:8000/api/v1/documents/${documentId}?include_text=true`,
+                        { headers: getAuthHeaders() }
+                    )
+                    setSelectedDocument(fullResponse.data)
                     // Also refresh the documents list to show updated info
                     fetchUserAndDocuments()
                     return
@@ -186,9 +215,23 @@ const Dashboard = () => {
                 { headers: getAuthHeaders() }
             )
 
-            const results = response.data.cleanup_results || []
-            const summary = results.map(r => 
-                `${r.engine}: ${r.orphaned_found || 0} found, ${r.orphaned_removed || 0} removed`
+            // Cleanup runs as a background task; poll until it finishes
+            let status = { state: 'PENDING' }
+            while (!['SUCCESS', 'FAILURE'].includes(status.state)) {
+                await new Promise(resolve => setTimeout(resolve, 1000))
+                const statusResponse = await axios.get(
+                    `http://localhost:8000/api/v1/documents/cleanup-vectors/${response.data.task_id}`,
+                    { headers: getAuthHeaders() }
+                )
+                status = statusResponse.data
+            }
+            if (status.state === 'FAILURE') {
+                throw new Error(status.error)
+            }
+
+            const results = Object.entries(status.engines || {})
+            const summary = results.map(([engine, r]) =>
+                `${engine}: ${r.skipped ? 'skipped' : `${r.orphans_found || 0} found, ${r.orphans_removed || 0} removed`}`
             ).join('\n')
             
             alert(`Vector cleanup completed!\n\n${summary}`)
@@ -272,7 +315,7 @@ const Dashboard = () => {
                             <h2>Your Documents</h2>
                             <div className="section-actions">
                                 <div className="document-count">
-                                    {documents.length} document{documents.length !== 1 ? 's' : ''}
+                                    {documents.length}{nextCursor ? '+' : ''} document{documents.length !== 1 ? 's' : ''}
                                 </div>
                                 <button 
                                     onClick={handleVectorCleanup}
@@ -302,6 +345,11 @@ const Dashboard = () => {
                                         onDelete={handleDelete}
                                     />
                                 ))}
+                                {nextCursor && (
+                                    <button onClick={loadMoreDocuments} className="cleanup-btn" disabled={loadingMore}>
+                                        {loadingMore ? 'Loading...' : 'Load more'}
+                                    </button>
+                                )}
                             </div>
                         )}
                     </div>
@@ -52,6 +52,10 @@ const DocumentModal = ({ document, isOpen, onClose, onDownload }) => {
           {document.ai_model_used && (
             <p><strong>Model:</strong> {document.ai_model_used}</p>
           )}
+          {document.ai_analysis_method === 'local_classifier' && (
+            // The local model only pattern-matches fields; names and free text need the LLM
+            <p><em>Classified locally: only amounts, dates and reference numbers are extracted.</em></p>
+          )}
         </div>
         
         {document.ai_key_information && Object.keys(document.ai_key_information).length > 0 && (
@@ -1,5 +1,4 @@
 import { useState } from 'react'
-import axios from 'axios'
 
 const QuestionInterface = () => {
   const [question, setQuestion] = useState('')
@@ -21,20 +20,47 @@ const QuestionInterface = () => {
     setLoading(true)
     setError('')
 
+    // Streamed: sources arrive first, then the answer grows token by token
+    setAnswer({ question: question.trim(), answer: '', sources: [], confidence: null, engine_used: '', method: '' })
+
     try {
-      const response = await axios.post(
-        'http://localhost:8000/api/v1/documents/question',
-        null,
-        {
-          params: { question: question.trim() },
-          headers: getAuthHeaders()
-        }
+      const response = await fetch(
+        `http://localhost:8000/api/v1/documents/question/stream?question=${encodeURIComponent(question.trim())}`,
+        { method: 'POST', headers: getAuthHeaders() }
       )
-
-      setAnswer(response.data)
+      if (!response.ok) {
+        const body = await response.json().catch(() => ({}))
+        throw new Error(body.detail || 'Question answering failed')
+      }
+
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+
+        const events = buffer.split('\n\n')
+        buffer = events.pop()
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1]
+          const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}')
+          if (event === 'sources') {
+            setAnswer(prev => ({ ...prev, sources: data.sources }))
+          } else if (event === 'token') {
+            setAnswer(prev => ({ ...prev, answer: prev.answer + data.text }))
+          } else if (event === 'done') {
+            setAnswer(prev => ({ ...prev, confidence: data.confidence, method: data.method, engine_used: data.engine, cached: data.cached }))
+          } else if (event === 'error') {
+            throw new Error(data.message)
+          }
+        }
+      }
     } catch (error) {
       console.error('Question failed:', error)
-      setError(error.response?.data?.detail || 'Question answering failed')
+      setError(error.message || 'Question answering failed')
     } finally {
       setLoading(false)
     }
@@ -92,15 +118,22 @@ const QuestionInterface = () => {
           <div className="answer-header">
             <h4>💡 Answer</h4>
             <div className="answer-meta">
-              <span 
-                className="confidence-badge"
-                style={{ backgroundColor: getConfidenceColor(answer.confidence) }}
-              >
-                {Math.round(answer.confidence * 100)}% confidence
-              </span>
+              {answer.confidence !== null && (
+                <span 
+                  className="confidence-badge"
+                  style={{ backgroundColor: getConfidenceColor(answer.confidence) }}
+                >
+                  {Math.round(answer.confidence * 100)}% confidence
+                </span>
+              )}
               <span className="engine-badge">
                 {answer.engine_used}
               </span>
+              {answer.cached && (
+                <span className="engine-badge">
+                  ♻️ cached
+                </span>
+              )}
             </div>
           </div>
 
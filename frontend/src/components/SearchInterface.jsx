@@ -1,6 +1,9 @@
 import { useState } from 'react'
 import axios from 'axios'
 
+// Last response and ETag per query; the API answers 304 while the user's corpus is unchanged
+const searchCache = new Map()
+
 const SearchInterface = () => {
   const [query, setQuery] = useState('')
   const [results, setResults] = useState(null)
@@ -22,15 +25,24 @@ const SearchInterface = () => {
     setError('')
 
     try {
+      const cached = searchCache.get(query.trim())
       const response = await axios.post(
         'http://localhost:8000/api/v1/documents/search',
         null,
         {
           params: { query: query.trim() },
-          headers: getAuthHeaders()
+          headers: cached ? { ...getAuthHeaders(), 'If-None-Match': cached.etag } : getAuthHeaders(),
+          validateStatus: (status) => (status >= 200 && status < 300) || status === 304
         }
       )
 
+      if (response.status === 304 && cached) {
+        setResults(cached.data)
+        return
+      }
+      if (response.headers.etag) {
+        searchCache.set(query.trim(), { etag: response.headers.etag, data: response.data })
+      }
       setResults(response.data)
     } catch (error) {
       console.error('Search failed:', error)